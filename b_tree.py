@@ -0,0 +1,476 @@
+import time
+from bisect import bisect_left, bisect_right
+
+from binary_search_tree import BinarySearchTree
+
+
+class Employee:
+    """Employee data stored in a leaf page of BTree (no links, pages hold the structure)"""
+    __slots__ = ("id", "name", "dob", "pob")
+
+    def __init__(self, id, name, dob, pob, parent=None):
+        self.id = id
+        self.name = name
+        # Date of Birth
+        self.dob = dob
+        # Place of Birth
+        self.pob = pob
+
+
+class Page:
+    """
+    Page of BTree. Leaf page: keys are IDs of its employees, children are the employees in the same order,
+    prev/next are the previous/next leaf. Inner page: children are pages, keys[i] separates children[i] (IDs < keys[i])
+    from children[i + 1] (IDs >= keys[i]). size is the number of employees under the page
+    """
+    __slots__ = ("leaf", "keys", "children", "size", "prev", "next")
+
+    def __init__(self, leaf, keys=None, children=None, size=0):
+        self.leaf = leaf
+        self.keys = keys if keys is not None else []
+        self.children = children if children is not None else []
+        self.size = size
+        self.prev = None
+        self.next = None
+
+
+class BTree(BinarySearchTree):
+    """
+    Employee tree as a B+-tree: all employees sit in wide leaf pages (up to page_size each, linked in ID order),
+    inner pages only route searches. A search touches about log(n) / log(page_size) pages and each page is
+    a short sorted list searched by bisect, so there are far fewer pointer hops than in a binary tree.
+    Same public API as BinarySearchTree: nodes returned by search and traversals are Employee objects,
+    tree.root is the root page. Every page except root is at least half full
+    """
+    engine = "btree"
+    # Maximum number of employees in a leaf / children of an inner page
+    page_size = 64
+
+    def __init__(self, compact=False, page_size=None, **kwargs):
+        super().__init__(compact=compact, **kwargs)
+        self.node_type = Employee
+        if page_size is not None:
+            if page_size < 4:
+                raise ValueError("Page size must be at least 4")
+            self.page_size = page_size
+
+    def build_balanced(self, rows, start, end, parent):
+        """Build pages from ID sorted rows[start..end] bottom up (about 3/4 full) and return root page"""
+        if start > end:
+            return None
+
+        # Leaves, then one level of inner pages at a time until one page is left
+        pages = []
+        for chunk in self.split_evenly(range(start, end + 1)):
+            employees = [self.create_node(*rows[i]) for i in chunk]
+            pages.append(Page(True, [employee.id for employee in employees], employees, len(employees)))
+
+        while len(pages) > 1:
+            level = []
+            for chunk in self.split_evenly(pages):
+                # Separator of a child is the smallest ID under it
+                keys = [self.min_node(child).id for child in chunk[1:]]
+                level.append(Page(False, keys, list(chunk), sum(child.size for child in chunk)))
+            pages = level
+        return pages[0]
+
+    def link_nodes(self):
+        """Set prev/next links of all leaves (after the tree is built at once)"""
+        leaves = [page for page in self.iter_pages() if page.leaf]
+        for page, next_page in zip([None] + leaves, leaves + [None]):
+            if page is not None:
+                page.next = next_page
+            if next_page is not None:
+                next_page.prev = page
+
+    def iter_pages(self):
+        """Yield all pages, each page before its children (children from left to right)"""
+        stack = [self.root] if self.root else []
+        while stack:
+            page = stack.pop()
+            yield page
+            if not page.leaf:
+                stack.extend(reversed(page.children))
+
+    def split_evenly(self, items):
+        """Split items into chunks of equal length, between half and all of page_size (3/4 when possible)"""
+        count = len(items)
+        pages = max(-(-count // self.page_size), count // (self.page_size * 3 // 4), 1)
+        return [items[count * i // pages:count * (i + 1) // pages] for i in range(pages)]
+
+    def min_node(self, root):
+        """Return employee with the smallest ID under a page"""
+        if root is None:
+            return None
+        while not root.leaf:
+            root = root.children[0]
+        return root.children[0]
+
+    def insert(self, root, id, name, dob, pob, quiet=False):
+        """
+        Insert employee into its leaf, split full pages on the way back up (root is always self.root).
+        Return True if inserted, False if ID existed (notify unless quiet)
+        """
+        if self.root is None:
+            self.root = Page(True)
+
+        # Walk down to the leaf, remember inner pages and the child taken in each
+        path = []
+        page = self.root
+        while not page.leaf:
+            position = bisect_right(page.keys, id)
+            path.append((page, position))
+            page = page.children[position]
+
+        position = bisect_left(page.keys, id)
+        if position < len(page.keys) and page.keys[position] == id:
+            if not quiet:
+                print("Invalid ID.")
+            return False
+
+        employee = self.create_node(id, name, dob, pob)
+        page.keys.insert(position, id)
+        page.children.insert(position, employee)
+        page.size += 1
+        for ancestor, _ in path:
+            ancestor.size += 1
+        self.employee_added(employee)
+
+        # Split pages which became too big, the new right half goes next to them in their parent
+        while len(page.children) > self.page_size:
+            sibling, separator = self.split(page)
+            if self.metrics is not None:
+                self.metrics.count("page_splits")
+            if path:
+                parent, position = path.pop()
+                parent.keys.insert(position, separator)
+                parent.children.insert(position + 1, sibling)
+                page = parent
+            else:
+                self.root = Page(False, [separator], [page, sibling], page.size + sibling.size)
+                break
+        return True
+
+    def split(self, page):
+        """Move the right half of page to a new page, return (new page, smallest ID under new page)"""
+        half = len(page.children) // 2
+        if page.leaf:
+            sibling = Page(True, page.keys[half:], page.children[half:], len(page.children) - half)
+            separator = sibling.keys[0]
+            del page.keys[half:]
+            sibling.prev, sibling.next = page, page.next
+            if page.next is not None:
+                page.next.prev = sibling
+            page.next = sibling
+        else:
+            # Key between the halves moves up to parent
+            separator = page.keys[half - 1]
+            sibling = Page(False, page.keys[half:], page.children[half:])
+            sibling.size = sum(child.size for child in sibling.children)
+            del page.keys[half - 1:]
+        del page.children[half:]
+        page.size -= sibling.size
+        return sibling, separator
+
+    def unlink_node(self, node):
+        """Take employee out of its leaf, refill or merge pages which became less than half full"""
+        path = []
+        page = self.root
+        while not page.leaf:
+            position = bisect_right(page.keys, node.id)
+            path.append((page, position))
+            page = page.children[position]
+
+        position = bisect_left(page.keys, node.id)
+        del page.keys[position]
+        del page.children[position]
+        page.size -= 1
+        for ancestor, _ in path:
+            ancestor.size -= 1
+
+        # Keys of inner pages may still name the removed ID, they still separate the children correctly
+        while path and len(page.children) < self.page_size // 2:
+            parent, position = path.pop()
+            self.refill(parent, position)
+            page = parent
+
+        # Root with 1 child is not needed, empty tree has no root
+        if not self.root.leaf and len(self.root.children) == 1:
+            self.root = self.root.children[0]
+        elif self.root.leaf and not self.root.children:
+            self.root = None
+
+    def refill(self, parent, position):
+        """Child of parent at position is less than half full: borrow 1 item from a sibling or merge with it"""
+        page = parent.children[position]
+        minimum = self.page_size // 2
+        left = parent.children[position - 1] if position > 0 else None
+        right = parent.children[position + 1] if position + 1 < len(parent.children) else None
+
+        # Borrow the last item of left sibling
+        if left is not None and len(left.children) > minimum:
+            child = left.children.pop()
+            page.children.insert(0, child)
+            if page.leaf:
+                page.keys.insert(0, left.keys.pop())
+                parent.keys[position - 1] = page.keys[0]
+            else:
+                page.keys.insert(0, parent.keys[position - 1])
+                parent.keys[position - 1] = left.keys.pop()
+            moved = 1 if page.leaf else child.size
+            left.size -= moved
+            page.size += moved
+            if self.metrics is not None:
+                self.metrics.count("page_borrows")
+
+        # Borrow the first item of right sibling
+        elif right is not None and len(right.children) > minimum:
+            child = right.children.pop(0)
+            page.children.append(child)
+            if page.leaf:
+                page.keys.append(right.keys.pop(0))
+                parent.keys[position] = right.keys[0]
+            else:
+                page.keys.append(parent.keys[position])
+                parent.keys[position] = right.keys.pop(0)
+            moved = 1 if page.leaf else child.size
+            right.size -= moved
+            page.size += moved
+            if self.metrics is not None:
+                self.metrics.count("page_borrows")
+
+        # Both siblings are at minimum: merge with one of them
+        elif left is not None:
+            self.merge(parent, position - 1)
+        else:
+            self.merge(parent, position)
+
+    def merge(self, parent, position):
+        """Move all items of parent's child at position + 1 into child at position, drop the emptied child"""
+        if self.metrics is not None:
+            self.metrics.count("page_merges")
+        page = parent.children[position]
+        right = parent.children[position + 1]
+        if page.leaf:
+            page.keys.extend(right.keys)
+            page.next = right.next
+            if right.next is not None:
+                right.next.prev = page
+        else:
+            page.keys.append(parent.keys[position])
+            page.keys.extend(right.keys)
+        page.children.extend(right.children)
+        page.size += right.size
+        del parent.keys[position]
+        del parent.children[position + 1]
+
+    def search(self, id, root):
+        """Search for an employee by ID under a page (i.e. start from root: self.root), False if it does not exist"""
+        if self.root is None or root is None:
+            return False
+
+        cache = self.cache
+        if cache is not None and root is self.root:
+            employee = cache.get(id)
+            if employee is not None:
+                return employee
+
+        page = root
+        while not page.leaf:
+            page = page.children[bisect_right(page.keys, id)]
+        position = bisect_left(page.keys, id)
+        if position < len(page.keys) and page.keys[position] == id:
+            employee = page.children[position]
+            if cache is not None and root is self.root:
+                cache.put(id, employee)
+            return employee
+        return False
+
+    def measured_search(self, id, root):
+        """search which also records visited pages and latency into metrics"""
+        start = time.perf_counter()
+        found = False
+        visits = 0
+        cache = self.cache if root is self.root else None
+        if self.root is not None and root is not None:
+            cached = cache.get(id) if cache is not None else None
+            if cached is not None:
+                found = cached
+            else:
+                page = root
+                while not page.leaf:
+                    visits += 1
+                    page = page.children[bisect_right(page.keys, id)]
+                visits += 1
+                position = bisect_left(page.keys, id)
+                if position < len(page.keys) and page.keys[position] == id:
+                    found = page.children[position]
+                    if cache is not None:
+                        cache.put(id, found)
+        self.metrics.observe_search(visits, time.perf_counter() - start, found is not False)
+        return found
+
+    def find_leaf(self, id):
+        """Return (leaf page where ID is or would be, position of ID in leaf)"""
+        page = self.root
+        while not page.leaf:
+            page = page.children[bisect_right(page.keys, id)]
+        return page, bisect_left(page.keys, id)
+
+    def find_node(self, id):
+        """Return employee of ID found without cache or metrics, False if ID does not exist"""
+        if self.root is None:
+            return False
+        page, position = self.find_leaf(id)
+        if position < len(page.keys) and page.keys[position] == id:
+            return page.children[position]
+        return False
+
+    def find_ceiling(self, id=None, inclusive=True):
+        """Return employee with the smallest ID >= input ID (> if not inclusive, smallest of tree if None), or None"""
+        return next(self.iter_range(id, None, inclusive), None)
+
+    def find_floor(self, id=None, inclusive=True):
+        """Return employee with the largest ID <= input ID (< if not inclusive, largest of tree if None), or None"""
+        return next(self.iter_range_reverse(id, None, inclusive), None)
+
+    def next_node(self, node):
+        """Return employee with the next larger ID (O(log n): its leaf is searched first), None if it is the last"""
+        return self.find_ceiling(node.id, inclusive=False)
+
+    def previous_node(self, node):
+        """Return employee with the next smaller ID (O(log n): its leaf is searched first), None if it is the first"""
+        return self.find_floor(node.id, inclusive=False)
+
+    def iter_inorder(self, node):
+        """Yield employees under a page in ID order one by one"""
+        stack = [node] if node else []
+        while stack:
+            page = stack.pop()
+            if page.leaf:
+                yield from page.children
+            else:
+                stack.extend(reversed(page.children))
+
+    def iter_bfs(self, node):
+        """All employees are in leaves (which are all on the last level), so level order is ID order"""
+        return self.iter_inorder(node)
+
+    # Pages have no employee of their own, every traversal order visits leaves left to right
+    iter_preorder = iter_bfs
+    iter_postorder = iter_bfs
+
+    def iter_range(self, low=None, high=None, include_low=True):
+        """Yield employees whose ID is from low to high (None means no limit) in ID order, following leaf links"""
+        page = self.root
+        if page is None:
+            return
+        while not page.leaf:
+            page = page.children[0 if low is None else bisect_right(page.keys, low)]
+        if low is None:
+            position = 0
+        elif include_low:
+            position = bisect_left(page.keys, low)
+        else:
+            position = bisect_right(page.keys, low)
+
+        while page is not None:
+            for employee in page.children[position:]:
+                if high is not None and employee.id > high:
+                    return
+                yield employee
+            page = page.next
+            position = 0
+
+    def iter_range_reverse(self, high=None, low=None, include_high=True):
+        """Yield employees whose ID is from high down to low (None means no limit), following leaf links back"""
+        if self.root is None:
+            return
+        if high is None:
+            page = self.root
+            while not page.leaf:
+                page = page.children[-1]
+            position = len(page.keys)
+        else:
+            page, position = self.find_leaf(high)
+            if include_high and position < len(page.keys) and page.keys[position] == high:
+                position += 1
+
+        while page is not None:
+            for employee in reversed(page.children[:position]):
+                if low is not None and employee.id < low:
+                    return
+                yield employee
+            page = page.prev
+            if page is not None:
+                position = len(page.children)
+
+    def rank(self, id, inclusive=False):
+        """Return number of employees whose ID is smaller than input ID (or smaller or equal if inclusive)"""
+        count = 0
+        page = self.root
+        if page is None:
+            return 0
+        while not page.leaf:
+            position = bisect_right(page.keys, id)
+            # All pages left of the path are counted
+            count += sum(child.size for child in page.children[:position])
+            page = page.children[position]
+        return count + (bisect_right(page.keys, id) if inclusive else bisect_left(page.keys, id))
+
+    def select(self, k):
+        """Return employee with the k-th smallest ID (k starts from 1), False if k is out of range"""
+        if k < 1 or k > self.get_size(self.root):
+            return False
+        page = self.root
+        while not page.leaf:
+            for child in page.children:
+                if k <= child.size:
+                    page = child
+                    break
+                k -= child.size
+        return page.children[k - 1]
+
+    def read_tree(self, traversal_result):
+        """Print ID of employees and the ID range of the leaf page holding each of them"""
+        for employee in traversal_result:
+            page = self.root
+            while not page.leaf:
+                page = page.children[bisect_right(page.keys, employee.id)]
+            print(f"ID: {employee.id:<5} | Leaf: {page.keys[0]}..{page.keys[-1]} ({len(page.keys)} employees)")
+
+    def verify(self):
+        """
+        Check structure of tree: key order, separators, sizes, page fill, leaves on one level and leaf links.
+        Return number of employees, raise AssertionError if something is broken
+        """
+        if self.root is None:
+            return 0
+        leaves = []
+        leaf_depths = set()
+        # (page, depth, smallest allowed ID, ID limit) of pages to check
+        stack = [(self.root, 0, None, None)]
+        while stack:
+            page, depth, low, high = stack.pop()
+            assert page.keys == sorted(set(page.keys)), "Keys of a page are not in order"
+            assert all((low is None or key >= low) and (high is None or key < high) for key in page.keys), \
+                f"Key out of separator range in page {page.keys[:3]}"
+            assert len(page.children) <= self.page_size, "Page is too big"
+            if page is not self.root:
+                assert len(page.children) >= self.page_size // 2, "Page is less than half full"
+            if page.leaf:
+                assert page.keys == [employee.id for employee in page.children], "Leaf keys do not match employees"
+                assert page.size == len(page.children), "Wrong size of leaf"
+                leaves.append(page)
+                leaf_depths.add(depth)
+                continue
+            assert len(page.children) == len(page.keys) + 1 >= 2, "Inner page has wrong number of keys"
+            assert page.size == sum(child.size for child in page.children), "Wrong size of inner page"
+            bounds = [low] + page.keys + [high]
+            for i in reversed(range(len(page.children))):
+                stack.append((page.children[i], depth + 1, bounds[i], bounds[i + 1]))
+
+        assert len(leaf_depths) == 1, "Leaves are not on the same level"
+        for previous_leaf, leaf, next_leaf in zip([None] + leaves, leaves, leaves[1:] + [None]):
+            assert leaf.prev is previous_leaf and leaf.next is next_leaf, "Wrong leaf link"
+        return self.root.size
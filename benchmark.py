@@ -0,0 +1,701 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest import mock
+
+from binary_search_tree import BinarySearchTree
+from concurrent_tree import ConcurrentEmployeeTree
+from disk_tree import DiskTree
+from durable_tree import DurableEmployeeTree
+from employee_record import record_row
+from parallel_io import export_parallel, load_parallel
+from sharded_store import ShardedEmployeeStore
+from read_write_file import load_file, read_records, read_snapshot, write_file, write_records, write_snapshot
+
+PLACES = ["VT", "USA", "UK", "HCM", "JP", "HN"]
+
+
+def generate_records(n, order="random", seed=0):
+    """Return a list of n synthetic employee records in file format, IDs in random/sorted/reverse order"""
+    rng = random.Random(seed)
+    ids = list(range(1, n + 1))
+    if order == "random":
+        rng.shuffle(ids)
+    elif order == "reverse":
+        ids.reverse()
+
+    records = []
+    for id in ids:
+        records.append({"ID": str(id),
+                        "Name": f"Employee {id}",
+                        "Date of Birth": f"{rng.randint(1, 28):02}/{rng.randint(1, 12):02}/{rng.randint(1950, 2005)}",
+                        "Place of Birth": rng.choice(PLACES)})
+    return records
+
+
+def timed(function, *args, **kwargs):
+    """Run function once, return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def build_by_insert(records):
+    """Build tree the old way: one add_employee per record"""
+    tree = BinarySearchTree()
+    for i in records:
+        tree.add_employee(int(i["ID"]), i["Name"], i["Date of Birth"], i["Place of Birth"])
+    return tree
+
+
+def bench_bulk_load(sizes, order):
+    """Compare add_employee loop with BinarySearchTree.from_records"""
+    print(f"== Bulk load ({order} IDs) ==")
+    print(f"{'records':>10} | {'add_employee (s)':>16} | {'from_records (s)':>16} | {'speedup':>7}")
+    for n in sizes:
+        records = generate_records(n, order)
+        _, insert_time = timed(build_by_insert, records)
+        _, bulk_time = timed(BinarySearchTree.from_records, records)
+        print(f"{n:>10} | {insert_time:>16.3f} | {bulk_time:>16.3f} | {insert_time / bulk_time:>6.1f}x")
+
+
+def recursive_search(root, id):
+    """Baseline: search as it was before it was made iterative (one call per level)"""
+    if root is None:
+        return False
+    if id == root.id:
+        return root
+    return recursive_search(root.right if id > root.id else root.left, id)
+
+
+def recursive_inorder(node, result):
+    """Baseline: inorder_traverse as it was before it was made iterative (one call per node)"""
+    if node:
+        recursive_inorder(node.left, result)
+        result.append(node)
+        recursive_inorder(node.right, result)
+    return result
+
+
+def bench_operations(sizes, ops):
+    """
+    Per-operation latency of add_employee, search, remove_employee and inorder_traverse.
+    Search and inorder are compared with the recursive versions they replaced (kept above as baselines);
+    the recursive insert and delete are gone, so insert and remove have no baseline
+    """
+    print(f"== Operation latency ({ops} operations per size) ==")
+    print(f"{'records':>10} | {'insert (us)':>11} | {'search (us)':>11} | {'recursive':>9} | {'remove (us)':>11} | "
+          f"{'inorder (us/node)':>17} | {'recursive':>9}")
+    rng = random.Random(1)
+    for n in sizes:
+        tree = BinarySearchTree.from_records(generate_records(n, "sorted"), presorted=True)
+        # New IDs are above the existing range, searched and removed IDs are random existing IDs
+        new_ids = list(range(n + 1, n + ops + 1))
+        rng.shuffle(new_ids)
+        search_ids = [rng.randint(1, n) for _ in range(ops)]
+        remove_ids = rng.sample(range(1, n + 1), min(ops, n))
+
+        _, insert_time = timed(lambda: [tree.add_employee(id, "New", "01/01/2000", "VT") for id in new_ids])
+        _, search_time = timed(lambda: [tree.search(id, tree.root) for id in search_ids])
+        _, recursive_search_time = timed(lambda: [recursive_search(tree.root, id) for id in search_ids])
+        _, remove_time = timed(lambda: [tree.remove_employee(id) for id in remove_ids])
+        nodes, inorder_time = timed(tree.inorder_traverse, tree.root)
+        _, recursive_inorder_time = timed(recursive_inorder, tree.root, [])
+
+        print(f"{n:>10} | {insert_time / ops * 1e6:>11.2f} | {search_time / ops * 1e6:>11.2f} | "
+              f"{recursive_search_time / ops * 1e6:>9.2f} | {remove_time / len(remove_ids) * 1e6:>11.2f} | "
+              f"{inorder_time / len(nodes) * 1e6:>17.3f} | {recursive_inorder_time / len(nodes) * 1e6:>9.3f}")
+
+
+def bench_memory(sizes):
+    """Bytes per employee of default nodes and compact (__slots__ + shared strings) nodes"""
+    print("== Memory per employee ==")
+    print(f"{'records':>10} | {'default (B)':>11} | {'compact (B)':>11} | {'saved':>6}")
+    for n in sizes:
+        result = []
+        for compact in (False, True):
+            gc.collect()
+            tracemalloc.start()
+            # Records are generated while tracing so the strings kept by nodes are counted,
+            # then records are dropped and only the tree is left
+            records = generate_records(n, "random")
+            tree = BinarySearchTree.from_records(records, compact=compact)
+            del records
+            gc.collect()
+            result.append(tracemalloc.get_traced_memory()[0] / n)
+            tracemalloc.stop()
+            del tree
+        print(f"{n:>10} | {result[0]:>11.1f} | {result[1]:>11.1f} | {1 - result[1] / result[0]:>6.1%}")
+
+
+def traced(function, *args):
+    """Run function once with tracemalloc, return (result, peak traced memory in bytes)"""
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+
+def load_whole(file_path):
+    """Old load path: read whole file then json.loads, then build tree"""
+    with open(file_path) as f:
+        return BinarySearchTree.from_records(json.loads(f.read()))
+
+
+def load_streaming(file_path):
+    """Streaming load path: records go from file to tree builder one by one"""
+    return BinarySearchTree.from_records(read_records(open(file_path)))
+
+
+def write_whole(tree, file_path, compact=False):
+    """Old write path: build the whole list and json.dumps string, then write"""
+    data = list(tree.iter_records(tree.root))
+    with open(file_path, "w") as f:
+        f.write(json.dumps(data, separators=(",", ":")) if compact else json.dumps(data, indent=4))
+
+
+def write_streaming(tree, file_path, compact=False):
+    """Streaming write path: records are serialized while walking the tree"""
+    with open(file_path, "w") as f:
+        write_records(f, tree.iter_records(tree.root), compact)
+
+
+def bench_json(sizes):
+    """Time, peak memory and file size of whole-file and streaming JSON load/write"""
+    print("== JSON file load/write ==")
+    print(f"{'records':>10} | {'path':<18} | {'time (s)':>8} | {'peak (MB)':>9} | {'file (MB)':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "employees.json")
+        for n in sizes:
+            tree = BinarySearchTree.from_records(generate_records(n, "sorted"), presorted=True)
+            rows = [("write indent", write_whole, (tree, file_path)),
+                    ("write stream", write_streaming, (tree, file_path)),
+                    ("load whole", load_whole, (file_path,)),
+                    ("load stream", load_streaming, (file_path,)),
+                    ("write compact", write_whole, (tree, file_path, True)),
+                    ("write stream comp.", write_streaming, (tree, file_path, True)),
+                    ("load compact", load_whole, (file_path,)),
+                    ("load stream comp.", load_streaming, (file_path,))]
+            for label, function, args in rows:
+                # Time is measured without tracemalloc, which slows down allocation a lot
+                _, elapsed = timed(function, *args)
+                _, peak = traced(function, *args)
+                size = os.path.getsize(file_path) / 2 ** 20
+                print(f"{n:>10} | {label:<18} | {elapsed:>8.3f} | {peak / 2 ** 20:>9.1f} | {size:>9.1f}")
+
+
+def bench_snapshot(sizes):
+    """Save/restore time and file size of binary snapshot against indented JSON file (data.json format)"""
+    print("== Binary snapshot vs JSON ==")
+    print(f"{'records':>10} | {'format':<8} | {'save (s)':>8} | {'load (s)':>8} | {'file (MB)':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "employees.json")
+        snapshot_path = os.path.join(directory, "employees.snapshot")
+        for n in sizes:
+            tree = BinarySearchTree.from_records(generate_records(n, "sorted"), presorted=True)
+
+            _, save_time = timed(write_streaming, tree, json_path)
+            _, load_time = timed(load_streaming, json_path)
+            size = os.path.getsize(json_path) / 2 ** 20
+            print(f"{n:>10} | {'json':<8} | {save_time:>8.3f} | {load_time:>8.3f} | {size:>9.1f}")
+
+            rows = ((node.id, node.name, node.dob, node.pob) for node in tree.iter_inorder(tree.root))
+            _, save_time = timed(write_snapshot, snapshot_path, rows)
+            _, load_time = timed(lambda: BinarySearchTree.from_rows(read_snapshot(snapshot_path), presorted=True))
+            size = os.path.getsize(snapshot_path) / 2 ** 20
+            print(f"{n:>10} | {'snapshot':<8} | {save_time:>8.3f} | {load_time:>8.3f} | {size:>9.1f}")
+
+
+def bench_batch(sizes):
+    """Batch add_employees/remove_employees against add_employee/remove_employee loops"""
+    print("== Batch insert/delete (batch of new IDs interleaved with existing IDs) ==")
+    print(f"{'records':>10} | {'batch':>8} | {'loop add (s)':>12} | {'batch add (s)':>13} | "
+          f"{'loop remove (s)':>15} | {'batch remove (s)':>16}")
+    rng = random.Random(2)
+    for n in sizes:
+        # Tree holds even IDs, batches add odd IDs and remove even IDs
+        rows = [(2 * i, f"Employee {2 * i}", "01/01/2000", "VT") for i in range(1, n + 1)]
+        for k in (n // 100, n // 10, n):
+            new_ids = rng.sample(range(1, n + 1), k)
+            batch = [{"ID": 2 * i - 1, "Name": f"Employee {2 * i - 1}", "Date of Birth": "01/01/2000",
+                      "Place of Birth": "HCM"} for i in new_ids]
+            remove_ids = [2 * i for i in rng.sample(range(1, n + 1), k)]
+
+            tree = BinarySearchTree.from_rows(rows, presorted=True)
+            _, loop_add = timed(lambda: [tree.add_employee(i["ID"], i["Name"], i["Date of Birth"],
+                                                           i["Place of Birth"]) for i in batch])
+            _, loop_remove = timed(lambda: [tree.remove_employee(id) for id in remove_ids])
+
+            tree = BinarySearchTree.from_rows(rows, presorted=True)
+            _, batch_add = timed(tree.add_employees, batch)
+            _, batch_remove = timed(tree.remove_employees, remove_ids)
+            print(f"{n:>10} | {k:>8} | {loop_add:>12.3f} | {batch_add:>13.3f} | "
+                  f"{loop_remove:>15.3f} | {batch_remove:>16.3f}")
+
+
+def bench_concurrency(sizes, seconds=2.0):
+    """Search throughput of reader threads while 1 writer thread adds/removes employees"""
+    print(f"== Concurrent access ({seconds:.0f} s per run, 1 writer) ==")
+    print(f"{'records':>10} | {'readers':>7} | {'reads/s':>10} | {'writes/s':>10} | {'snapshot scans/s':>16}")
+    for n in sizes:
+        for readers in (1, 2, 4, 8):
+            store = ConcurrentEmployeeTree(BinarySearchTree.from_records(generate_records(n, "sorted"),
+                                                                         presorted=True))
+            stop = threading.Event()
+            counts = {"reads": 0, "writes": 0, "scans": 0}
+
+            def read(seed):
+                rng = random.Random(seed)
+                done = 0
+                while not stop.is_set():
+                    store.search(rng.randint(1, n))
+                    done += 1
+                counts["reads"] += done
+
+            def write():
+                rng = random.Random(0)
+                done = 0
+                while not stop.is_set():
+                    id = rng.randint(n + 1, 2 * n)
+                    store.add_employee(id, "New", "01/01/2000", "VT")
+                    store.remove_employee(id)
+                    done += 2
+                counts["writes"] += done
+
+            def scan():
+                done = 0
+                while not stop.is_set():
+                    for _ in store.snapshot():
+                        pass
+                    done += 1
+                counts["scans"] += done
+
+            threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+            threads += [threading.Thread(target=write), threading.Thread(target=scan)]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            print(f"{n:>10} | {readers:>7} | {counts['reads'] / seconds:>10.0f} | "
+                  f"{counts['writes'] / seconds:>10.0f} | {counts['scans'] / seconds:>16.1f}")
+
+
+def bench_wal(sizes):
+    """Write throughput of durable mode by fsync batch size, recovery time from log and from snapshot"""
+    print("== Write-ahead log ==")
+    print(f"{'records':>10} | {'fsync every':>11} | {'writes/s':>10} | {'recover log (s)':>15} | "
+          f"{'recover snapshot (s)':>20}")
+    for n in sizes:
+        records = generate_records(n, "random")
+        for sync_every in (1, 64, 1024):
+            # fsync of every record is slow, time at most 2000 records for it
+            count = min(n, 2000) if sync_every == 1 else n
+            with tempfile.TemporaryDirectory() as directory:
+                store = DurableEmployeeTree(directory, sync_every=sync_every, compact_bytes=None)
+                _, elapsed = timed(lambda: [store.add_employee(i["ID"], i["Name"], i["Date of Birth"],
+                                                              i["Place of Birth"]) for i in records[:count]])
+                store.close()
+                # Recover by replaying the whole log, then compact and recover from snapshot
+                recovered, log_time = timed(DurableEmployeeTree, directory)
+                recovered.compact(wait=True)
+                recovered.close()
+                recovered, snapshot_time = timed(DurableEmployeeTree, directory)
+                recovered.close()
+            print(f"{count:>10} | {sync_every:>11} | {count / elapsed:>10.0f} | {log_time:>15.3f} | "
+                  f"{snapshot_time:>20.3f}")
+
+
+def bench_search_many(sizes, ops):
+    """search_many (one np.searchsorted over a sorted ID array) against a loop of search calls"""
+    print("== Batch search (half of IDs exist) ==")
+    print(f"{'records':>10} | {'batch':>8} | {'loop (s)':>10} | {'search_many (s)':>15} | "
+          f"{'with array build (s)':>20} | {'maintained insert (ms)':>22}")
+    rng = random.Random(3)
+    for n in sizes:
+        tree = BinarySearchTree.from_rows([(2 * i, f"Employee {2 * i}", "01/01/2000", "VT") for i in range(1, n + 1)],
+                                          presorted=True)
+        for k in (100, ops):
+            ids = [rng.randint(1, 2 * n) for _ in range(k)]
+            _, loop = timed(lambda: [tree.search(id, tree.root) for id in ids])
+            # First call after a change builds the array, next calls reuse it
+            tree.id_array = tree.id_nodes = None
+            _, first = timed(tree.search_many, ids)
+            _, batch = timed(tree.search_many, ids)
+            print(f"{n:>10} | {k:>8} | {loop:>10.4f} | {batch:>15.4f} | {first:>20.4f} | ", end="")
+
+            # Cost of keeping the array up to date on every insert instead of building it again
+            tree.maintain_id_array = True
+            new_ids = [2 * rng.randint(1, n) - 1 for _ in range(100)]
+            _, elapsed = timed(lambda: [tree.insert(tree.root, id, "New", "01/01/2000", "VT", quiet=True)
+                                        for id in new_ids])
+            tree.remove_employees(new_ids)
+            tree.maintain_id_array = False
+            print(f"{elapsed / len(new_ids) * 1000:>22.4f}")
+
+
+def bench_cache(sizes, ops):
+    """search with LRU/LFU cache against plain search on skewed traffic (Zipf-like: few IDs are searched most)"""
+    print("== Search cache (skewed searches) ==")
+    print(f"{'records':>10} | {'cache':>10} | {'search (s)':>10} | {'hit rate':>8}")
+    for n in sizes:
+        rows = [(i, f"Employee {i}", "01/01/2000", "VT") for i in range(1, n + 1)]
+        rng = random.Random(4)
+        # Popular IDs are spread over the tree, ID of rank r is searched with weight 1/r
+        popular = rng.sample(range(1, n + 1), min(n, 10000))
+        ids = rng.choices(popular, weights=[1 / r for r in range(1, len(popular) + 1)], k=ops)
+        for cache_size, policy in ((0, None), (256, "lru"), (256, "lfu")):
+            tree = BinarySearchTree.from_rows(rows, presorted=True, cache_size=cache_size,
+                                              cache_policy=policy or "lru")
+            _, elapsed = timed(lambda: [tree.search(id, tree.root) for id in ids])
+            label = f"{policy} {cache_size}" if policy else "none"
+            hit_rate = f"{tree.cache.stats()['hit_rate']:.0%}" if policy else "-"
+            print(f"{n:>10} | {label:>10} | {elapsed:>10.4f} | {hit_rate:>8}")
+
+
+def bench_engines(sizes, ops):
+    """Balancing engines (AVL, red-black, B+-tree) on insert-, delete- and search-heavy operation mixes"""
+    print("== Engines (operations/s, same operations for every engine) ==")
+    engines = ["avl", "rbtree", "btree"]
+    # Fraction of insert, remove, search
+    mixes = {"insert-heavy": (0.7, 0.1), "delete-heavy": (0.1, 0.7), "search-heavy": (0.05, 0.05)}
+    print(f"{'records':>10} | {'mix':>12} | " + " | ".join(f"{engine:>10}" for engine in engines))
+    rng = random.Random(5)
+    for n in sizes:
+        # Tree holds even IDs, inserts add odd IDs and removes/searches pick any ID
+        rows = [(2 * i, f"Employee {2 * i}", "01/01/2000", "VT") for i in range(1, n + 1)]
+        for mix, (insert_part, remove_part) in mixes.items():
+            operations = []
+            for _ in range(ops):
+                choice = rng.random()
+                id = rng.randint(1, 2 * n)
+                if choice < insert_part:
+                    operations.append(("insert", id | 1))
+                elif choice < insert_part + remove_part:
+                    operations.append(("remove", id))
+                else:
+                    operations.append(("search", id))
+
+            rates = []
+            for engine in engines:
+                tree = BinarySearchTree.from_rows(rows, presorted=True, engine=engine)
+
+                def run():
+                    for kind, id in operations:
+                        if kind == "insert":
+                            tree.insert(tree.root, id, "New", "01/01/2000", "VT", quiet=True)
+                        elif kind == "remove":
+                            tree.remove_employee(id)
+                        else:
+                            tree.search(id, tree.root)
+                _, elapsed = timed(run)
+                rates.append(ops / elapsed)
+            print(f"{n:>10} | {mix:>12} | " + " | ".join(f"{rate:>10.0f}" for rate in rates))
+
+
+def bench_parallel(sizes, workers_list):
+    """Scaling of parallel load (JSON Lines, snapshot) and export (json, JSON Lines) by number of worker processes"""
+    print(f"== Parallel load/export (seconds, {os.cpu_count()} CPUs) ==")
+    print(f"{'records':>10} | {'workers':>7} | {'load jsonl':>10} | {'load snap.':>10} | {'export json':>11} | "
+          f"{'export jsonl':>12} | {'load speedup':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        lines_path = os.path.join(directory, "employees.jsonl")
+        snapshot_path = os.path.join(directory, "employees.snapshot")
+        json_path = os.path.join(directory, "employees.json")
+        for n in sizes:
+            tree = BinarySearchTree.from_records(generate_records(n, "random"))
+            export_parallel(tree, lines_path, 1, json_lines=True)
+            write_snapshot(snapshot_path, ((node.id, node.name, node.dob, node.pob)
+                                           for node in tree.iter_inorder(tree.root)))
+            base = None
+            for workers in workers_list:
+                _, load_lines = timed(load_parallel, lines_path, workers)
+                _, load_snapshot = timed(load_parallel, snapshot_path, workers)
+                _, export_json = timed(export_parallel, tree, json_path, workers)
+                _, export_lines = timed(export_parallel, tree, json_path, workers, json_lines=True)
+                base = base or load_lines
+                print(f"{n:>10} | {workers:>7} | {load_lines:>10.3f} | {load_snapshot:>10.3f} | {export_json:>11.3f} | "
+                      f"{export_lines:>12.3f} | {base / load_lines:>11.2f}x")
+
+
+def bench_sharded(sizes, ops, shards=4):
+    """Single tree against sharded stores (range/hash, in process/worker processes): searches, batches, scans"""
+    print(f"== Sharded store ({shards} shards, operations/s) ==")
+    print(f"{'records':>10} | {'store':<15} | {'search':>9} | {'search_many':>11} | {'add batch':>9} | "
+          f"{'inorder':>9}")
+    rng = random.Random(9)
+    for n in sizes:
+        records = generate_records(n, "random")
+        ids = [rng.randint(1, n) for _ in range(ops)]
+        batch = [{"ID": n + i, "Name": "New", "Date of Birth": "01/01/2000", "Place of Birth": "VT"}
+                 for i in range(1, ops + 1)]
+        stores = [("concurrent tree", None, None)] + [(f"{partition} {'proc.' if processes else 'local'}",
+                                                   partition, processes)
+                                                  for partition in ("range", "hash") for processes in (False, True)]
+        for label, partition, processes in stores:
+            if partition is None:
+                store = ConcurrentEmployeeTree(BinarySearchTree.from_records(records))
+                search_many = lambda: [store.search(id) for id in ids]
+            else:
+                store = ShardedEmployeeStore.from_records(records, shards, partition, processes)
+                search_many = lambda: store.search_many(ids)
+            _, search_time = timed(lambda: [store.search(id) for id in ids])
+            # First batch builds ID arrays of shard trees (see search_many), time the second one
+            search_many()
+            _, batch_time = timed(search_many)
+            _, add_time = timed(store.add_employees, batch)
+            _, inorder_time = timed(store.inorder)
+            if partition is not None:
+                store.close()
+            print(f"{n:>10} | {label:<15} | {ops / search_time:>9.0f} | {ops / batch_time:>11.0f} | "
+                  f"{ops / add_time:>9.0f} | {(n + ops) / inorder_time:>9.0f}")
+
+
+def bench_disk(sizes, ops):
+    """Lookup latency of the in-memory tree against the disk tree with a cold and a warm page cache, and scans"""
+    print("== Disk tree (microseconds per lookup, seconds per inorder scan) ==")
+    print(f"{'records':>10} | {'memory':>8} | {'disk cold':>9} | {'disk warm':>9} | {'16 pages':>9} | "
+          f"{'file (MB)':>9} | {'scan mem.':>9} | {'scan disk':>9}")
+    rng = random.Random(13)
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "employees.tree")
+        for n in sizes:
+            rows = [record_row(i) for i in generate_records(n, "sorted")]
+            tree = BinarySearchTree.from_rows(rows, presorted=True)
+            DiskTree.from_rows(file_path, rows, presorted=True).close()
+            ids = [rng.randint(1, n) for _ in range(ops)]
+
+            def lookups(target):
+                for id in ids:
+                    target.search(id, target.root)
+
+            _, memory_time = timed(lookups, tree)
+            # Cold: new page cache, and file pages dropped from the operating system cache where possible
+            if hasattr(os, "posix_fadvise"):
+                with open(file_path, "rb") as f:
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            with DiskTree(file_path, cache_pages=n) as disk:
+                _, cold_time = timed(lookups, disk)
+                _, warm_time = timed(lookups, disk)
+                _, scan_time = timed(lambda: sum(1 for _ in disk.iter_inorder(disk.root)))
+            with DiskTree(file_path, cache_pages=16) as disk:
+                lookups(disk)
+                _, small_time = timed(lookups, disk)
+            _, memory_scan_time = timed(lambda: sum(1 for _ in tree.iter_inorder(tree.root)))
+            size = os.path.getsize(file_path) / 2 ** 20
+            print(f"{n:>10} | {memory_time / ops * 1e6:>8.2f} | {cold_time / ops * 1e6:>9.2f} | "
+                  f"{warm_time / ops * 1e6:>9.2f} | {small_time / ops * 1e6:>9.2f} | {size:>9.1f} | "
+                  f"{memory_scan_time:>9.3f} | {scan_time:>9.3f}")
+
+
+def bench_aggregates(sizes):
+    """Headcount by place, birth-year histogram and age distribution: node list + Python, streaming, NumPy columns"""
+    print("== Aggregates (seconds for 3 dashboard queries) ==")
+    print(f"{'records':>10} | {'list+Python':>11} | {'streaming':>9} | {'columns 1st':>11} | {'columns':>9} | "
+          f"{'1% range':>9} | {'1% columns':>10}")
+    for n in sizes:
+        tree = BinarySearchTree.from_records(generate_records(n, "random"), typed=True)
+
+        def by_list():
+            # How reports were made before: all nodes in a list, then Date of Birth text parsed for each one
+            nodes = tree.inorder_traverse(tree.root)
+            places, years, ages = {}, {}, {}
+            today = datetime.date.today()
+            for node in nodes:
+                places[node.pob] = places.get(node.pob, 0) + 1
+                day, month, year = map(int, node.dob.split("/"))
+                years[year] = years.get(year, 0) + 1
+                age = (today.year - year - ((today.month, today.day) < (month, day))) // 10 * 10
+                ages[age] = ages.get(age, 0) + 1
+            return places, years, ages
+
+        def dashboard(low=None, high=None):
+            return (tree.group_by("pob", low=low, high=high).count(), tree.histogram("dob", low=low, high=high),
+                    tree.age_distribution(low=low, high=high))
+
+        low, high = n // 2, n // 2 + n // 100
+        _, list_time = timed(by_list)
+        with mock.patch("employee_aggregate.np", None):
+            _, stream_time = timed(dashboard)
+            _, range_time = timed(dashboard, low, high)
+        _, first_time = timed(dashboard)
+        _, columns_time = timed(dashboard)
+        _, range_columns_time = timed(dashboard, low, high)
+        print(f"{n:>10} | {list_time:>11.4f} | {stream_time:>9.4f} | {first_time:>11.4f} | {columns_time:>9.4f} | "
+              f"{range_time:>9.4f} | {range_columns_time:>10.4f}")
+
+
+def with_file_path(file_path, function, *args, **kwargs):
+    """Run load_file/write_file, answering their file path prompt with file_path"""
+    with mock.patch("builtins.input", return_value=file_path):
+        return function(*args, **kwargs)
+
+
+def bench_suite(sizes, orders, ops, repeat=1):
+    """
+    Every tree operation and the file I/O paths, for each ID order and size. Each timing is the best of repeat runs.
+    Return list of results (dictionary per operation) for machine-readable output
+    """
+    print(f"== Suite (best of {repeat}) ==")
+    print(f"{'order':>8} | {'records':>10} | {'operation':>22} | {'count':>10} | {'seconds':>10} | {'per op (us)':>12}")
+    results = []
+
+    def record(order, n, operation, count, seconds):
+        results.append({"order": order, "records": n, "operation": operation, "count": count,
+                        "seconds": seconds, "per_op_us": seconds / count * 1e6 if count else 0.0})
+        print(f"{order:>8} | {n:>10} | {operation:>22} | {count:>10} | {seconds:>10.4f} | "
+              f"{results[-1]['per_op_us']:>12.3f}")
+
+    def best(function):
+        # Best of repeat runs, function builds its own fresh input each time
+        return min(function() for _ in range(repeat))
+
+    for order in orders:
+        for n in sizes:
+            records = generate_records(n, order)
+            rng = random.Random(n)
+            # Searches hit existing IDs and miss (ID above range) half and half
+            search_ids = [rng.randint(1, n) if i % 2 else n + rng.randint(1, n) for i in range(ops)]
+            remove_ids = rng.sample(range(1, n + 1), min(ops, n))
+
+            def add():
+                return timed(build_by_insert, records)[1]
+            record(order, n, "add_employee", n, best(add))
+
+            tree = build_by_insert(records)
+            record(order, n, "search", ops,
+                   best(lambda: timed(lambda: [tree.search(id, tree.root) for id in search_ids])[1]))
+            record(order, n, "inorder_traverse", n, best(lambda: timed(tree.inorder_traverse, tree.root)[1]))
+            record(order, n, "breadth_first_search", n, best(lambda: timed(tree.breadth_first_search, tree.root)[1]))
+
+            def remove():
+                fresh = BinarySearchTree.from_records(records)
+                return timed(lambda: [fresh.remove_employee(id) for id in remove_ids])[1]
+            record(order, n, "remove_employee", len(remove_ids), best(remove))
+
+            with tempfile.TemporaryDirectory() as directory:
+                file_path = os.path.join(directory, "employees.json")
+                record(order, n, "write_file", n, best(
+                    lambda: timed(with_file_path, file_path, write_file, tree.iter_records(tree.root))[1]))
+                record(order, n, "load_file", n, best(lambda: timed(with_file_path, file_path, load_file)[1]))
+                record(order, n, "load_file+from_records", n, best(lambda: timed(
+                    lambda: BinarySearchTree.from_records(with_file_path(file_path, load_file, stream=True)))[1]))
+
+                # Memory: tree built by add_employee (records are traced too, so strings kept by nodes count),
+                # then peak while loading the file
+                del tree
+                gc.collect()
+                tracemalloc.start()
+                traced_records = generate_records(n, order)
+                tree = build_by_insert(traced_records)
+                del traced_records
+                gc.collect()
+                tree_bytes = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                del tree
+                _, load_peak = traced(with_file_path, file_path, load_file)
+            for operation, value in (("memory_tree", tree_bytes), ("memory_load_file_peak", load_peak)):
+                results.append({"order": order, "records": n, "operation": operation, "bytes": value,
+                                "bytes_per_employee": value / n})
+                print(f"{order:>8} | {n:>10} | {operation:>22} | {value / n:>10.1f} B per employee")
+    return results
+
+
+def save_results(file_path, results, args):
+    """Write results with details of the run (machine, Python, options) as json"""
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "options": {"sizes": args.sizes, "order": args.order, "ops": args.ops, "repeat": args.repeat},
+        "results": results,
+    }
+    with open(file_path, "w") as f:
+        json.dump(document, f, indent=4)
+    print(f"Results written to {file_path}")
+
+
+def compare_results(base_path, results):
+    """Print change of each timing against an earlier json result file (ratio > 1 means slower now)"""
+    with open(base_path) as f:
+        base = {(i["order"], i["records"], i["operation"]): i for i in json.load(f)["results"]}
+    print(f"== Compared with {base_path} ==")
+    print(f"{'order':>8} | {'records':>10} | {'operation':>22} | {'before':>12} | {'now':>12} | {'ratio':>6}")
+    for i in results:
+        before = base.get((i["order"], i["records"], i["operation"]))
+        if before is None:
+            continue
+        key = "per_op_us" if "per_op_us" in i else "bytes_per_employee"
+        ratio = i[key] / before[key] if before[key] else float("inf")
+        flag = " <- slower" if key == "per_op_us" and ratio > 1.1 else ""
+        print(f"{i['order']:>8} | {i['records']:>10} | {i['operation']:>22} | {before[key]:>12.3f} | "
+              f"{i[key]:>12.3f} | {ratio:>5.2f}x{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark employee BinarySearchTree")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--order", choices=["random", "sorted", "reverse"],
+                        help="ID order of generated records (bulk: random by default, suite: all orders by default)")
+    parser.add_argument("--ops", type=int, default=10000, help="number of operations timed per size")
+    parser.add_argument("--only", choices=["bulk", "operations", "memory", "json", "snapshot", "batch", "concurrency",
+                                           "wal", "search_many", "cache", "engines", "parallel", "sharded", "disk",
+                                           "aggregates", "suite"],
+                        help="run only one benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="parallel: numbers of worker processes")
+    parser.add_argument("--repeat", type=int, default=1, help="suite: take the best of this many runs")
+    parser.add_argument("--json", help="suite: write results to this json file")
+    parser.add_argument("--compare", help="suite: compare results with an earlier json file")
+    args = parser.parse_args()
+
+    if args.only in (None, "bulk"):
+        bench_bulk_load(args.sizes, args.order or "random")
+    if args.only in (None, "operations"):
+        bench_operations(args.sizes, args.ops)
+    if args.only in (None, "memory"):
+        bench_memory(args.sizes)
+    if args.only in (None, "json"):
+        bench_json(args.sizes)
+    if args.only in (None, "snapshot"):
+        bench_snapshot(args.sizes)
+    if args.only in (None, "batch"):
+        bench_batch(args.sizes)
+    if args.only in (None, "concurrency"):
+        bench_concurrency(args.sizes)
+    if args.only in (None, "wal"):
+        bench_wal(args.sizes)
+    if args.only in (None, "search_many"):
+        bench_search_many(args.sizes, args.ops)
+    if args.only in (None, "cache"):
+        bench_cache(args.sizes, args.ops)
+    if args.only in (None, "engines"):
+        bench_engines(args.sizes, args.ops)
+    if args.only in (None, "parallel"):
+        bench_parallel(args.sizes, args.workers)
+    if args.only in (None, "sharded"):
+        bench_sharded(args.sizes, args.ops)
+    if args.only in (None, "disk"):
+        bench_disk(args.sizes, args.ops)
+    if args.only in (None, "aggregates"):
+        bench_aggregates(args.sizes)
+    if args.only in (None, "suite"):
+        results = bench_suite(args.sizes, [args.order] if args.order else ["random", "sorted", "reverse"],
+                              args.ops, args.repeat)
+        if args.json:
+            save_results(args.json, results, args)
+        if args.compare:
+            compare_results(args.compare, results)
@@ -1,4 +1,21 @@
-import queue
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from employee_aggregate import EmployeeColumns, GroupBy
+from employee_index import EmployeeIndexes
+from employee_record import (MAX_ID, MIN_ID, RecordParser, dob_day, node_record, parse_dob, parse_id, record_row,
+                             unique_rows)
+from search_cache import SearchCache
+from tree_metrics import TreeMetrics
+
+# NumPy is optional, it is only used by search_many and columnar aggregates
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Node:
     """Node represents an employee which contains employee's information"""
@@ -16,52 +33,226 @@ class Node:
         self.right = None
         # Height of a node, default is 1
         self.height = 1
+        # Number of nodes in subtree of this node (itself included), default is 1
+        self.size = 1
+        # Previous and next node in ID order (in-order neighbours), None at both ends
+        self.prev = None
+        self.next = None
+
+
+class CompactNode:
+    """
+    Same employee node as Node but with fixed attributes (__slots__) instead of a per-instance __dict__,
+    used by BinarySearchTree(compact=True) to cut memory per employee
+    """
+    __slots__ = ("id", "name", "dob", "pob", "parent", "left", "right", "height", "size", "prev", "next")
+    __init__ = Node.__init__
 
 
 class BinarySearchTree:
     """Binary Search Tree that store all employees' information"""
-    def __init__(self):
+    # Batch operations rebuild the whole tree when batch size >= this ratio of tree size,
+    # otherwise records are applied one by one (measured: rebuilding wins from about 1 batch record per node)
+    batch_rebuild_ratio = 1.0
+    # Balancing engine of this class (see __new__)
+    engine = "avl"
+    # Operations timed when metrics are on: {operation name: method}
+    measured_operations = {"insert": "insert", "delete": "delete_node", "inorder_traverse": "inorder_traverse",
+                           "breadth_first_search": "breadth_first_search", "add_employees": "add_employees",
+                           "remove_employees": "remove_employees"}
+
+    def __new__(cls, *args, engine="avl", **kwargs):
+        """
+        Pick tree class by balancing engine, all of them have the same public API:
+        "avl" (this class), "rbtree" (red-black tree, fewer rotations on writes),
+        "btree" (B+-tree with wide pages, fewer pointer hops on searches and scans)
+        """
+        if cls is BinarySearchTree and engine != "avl":
+            if engine == "rbtree":
+                from red_black_tree import RedBlackTree
+                cls = RedBlackTree
+            elif engine == "btree":
+                from b_tree import BTree
+                cls = BTree
+            else:
+                raise ValueError("Engine must be 'avl', 'rbtree' or 'btree'")
+        return super().__new__(cls)
+
+    def __init__(self, compact=False, indexed=False, maintain_id_array=False, cache_size=0, cache_policy="lru",
+                 engine="avl", metrics=False, typed=False):
+        # (engine is used by __new__ to pick the tree class)
         # Initialize tree root is None
         self.root = None
+        # Compact mode: nodes without __dict__, repeated Date of Birth/Place of Birth strings are shared
+        self.compact = compact
+        self.node_type = CompactNode if compact else Node
+        # Typed mode: Date of Birth is parsed once (node.dob.day) and Place of Birth gets a code (node.pob.code)
+        # when an employee is added, see RecordParser (None if not used)
+        self.parser = RecordParser() if typed else None
+        # Secondary indexes on Name, Date of Birth, Place of Birth (None if not used)
+        self.indexes = EmployeeIndexes() if indexed else None
+        # Sorted array of all IDs (NumPy) and nodes in the same order, used by search_many.
+        # It is built when needed and dropped on every change, or kept up to date if maintain_id_array
+        self.maintain_id_array = maintain_id_array
+        self.id_array = None
+        self.id_nodes = None
+        # NumPy columns of all employees for aggregates (see EmployeeColumns), built when needed, dropped on changes
+        self.columns = None
+        # Cache of {ID: node} in front of search from root (None if not used), see SearchCache
+        self.cache = SearchCache(cache_size, cache_policy) if cache_size else None
+        # Operation counts, latencies, rotations (None if not used, see TreeMetrics)
+        self.metrics = None
+        if metrics:
+            self.enable_metrics()
+
+    @classmethod
+    def from_records(cls, records, presorted=False, **kwargs):
+        """
+        Build a height-balanced tree directly from employee records (list of dictionary as loaded from file)
+        instead of inserting them one by one, so no rotation is needed.
+        If records are already sorted by ID, set presorted=True to skip sorting.
+        Other keyword arguments are passed to BinarySearchTree (i.e. compact=True, typed=True, engine="rbtree")
+        """
+        # Convert records to (ID, Name, Date of Birth, Place of Birth) with integer ID
+        rows = [record_row(i) for i in records]
+        return cls.from_rows(rows, presorted, **kwargs)
+
+    @classmethod
+    def from_rows(cls, rows, presorted=False, **kwargs):
+        """
+        Same as from_records but rows are (ID, Name, Date of Birth, Place of Birth) tuples with integer ID
+        (i.e. rows restored from a binary snapshot)
+        """
+        tree = cls(**kwargs)
+
+        rows = list(rows)
+        # Sort once by ID (stable sort keeps the first record of a duplicated ID in front)
+        if not presorted:
+            rows.sort(key=lambda row: row[0])
+
+        # Drop duplicated IDs, keep the first one like add_employee does
+        tree.rebuild(unique_rows(rows))
+        return tree
 
     def add_employee(self, id, name, dob, pob):
         """Add new employee to tree"""
 
-        id = int(id)
+        id = parse_id(id)
+        if id is None:
+            print("Invalid ID.")
+            return False
 
-        # Create tree root if there is not one (First input employee to the tree)
-        if self.root is None:
-            self.root = Node(id, name, dob, pob)
         # Find position and add employee to Tree
-        else:
-            self.insert(self.root, id, name, dob, pob)
+        # (tree root is created if there is not one (First input employee to the tree))
+        self.insert(self.root, id, name, dob, pob)
+
+    def add_employees(self, records):
+        """
+        Add a batch of employee records (list of dictionary in file format).
+        Return list of status in the order of records: True if added, False if ID existed (or repeated in batch)
+        """
+        rows = [record_row(i) for i in records]
+        status = [False] * len(rows)
+        # Apply batch in ID order (stable sort keeps the first record of a repeated ID in front)
+        order = sorted(range(len(rows)), key=lambda i: rows[i][0])
+
+        # Small batch: insert one by one
+        if len(rows) < self.batch_rebuild_ratio * self.get_size(self.root):
+            for i in order:
+                id, name, dob, pob = rows[i]
+                status[i] = self.insert(self.root, id, name, dob, pob, quiet=True)
+            return status
+
+        # Big batch: merge batch into ID ordered employees of tree, then rebuild tree
+        merged = []
+        existing = ((node.id, node.name, node.dob, node.pob) for node in self.iter_inorder(self.root))
+        next_row = next(existing, None)
+        for i in order:
+            id = rows[i][0]
+            # Take employees of tree which come before this ID
+            while next_row is not None and next_row[0] < id:
+                merged.append(next_row)
+                next_row = next(existing, None)
+            # ID existed in tree or earlier in batch
+            if (next_row is not None and next_row[0] == id) or (merged and merged[-1][0] == id):
+                continue
+            merged.append(rows[i])
+            status[i] = True
+        if next_row is not None:
+            merged.append(next_row)
+            merged.extend(existing)
+
+        self.rebuild(merged)
+        return status
 
     def breadth_first_search(self, node):
         """Return a list of nodes follow BFS theory"""
-        result = []
-        q = queue.Queue()
-        q.put(node)
-        while not q.empty():
-            root = q.get()
-            result.append(root)
-            if root.left:
-                q.put(root.left)
-            if root.right:
-                q.put(root.right)
+        return list(self.iter_bfs(node))
 
-        return result
+    def build_balanced(self, rows, start, end, parent):
+        """
+        Build a balanced subtree from ID sorted rows[start..end] and return its root,
+        middle row becomes the root so heights of left and right subtrees differ at most 1
+        """
+        if start > end:
+            return None
+
+        mid = (start + end) // 2
+        id, name, dob, pob = rows[mid]
+        node = self.create_node(id, name, dob, pob, parent)
+        node.left = self.build_balanced(rows, start, mid - 1, node)
+        right = node.right = self.build_balanced(rows, mid + 1, end, node)
+        # Update height and size from children, both subtrees are already built
+        # (right subtree is never shorter than left subtree, since mid is rounded down)
+        if right:
+            node.height = right.height + 1
+        node.size = end - start + 1
+        return node
+
+    def count_range(self, low, high):
+        """Return number of employees whose ID is from low to high (both included) in O(log n)"""
+        if low > high:
+            return 0
+        return self.rank(high, inclusive=True) - self.rank(low)
+
+    def create_node(self, id, name, dob, pob, parent=None):
+        """Create a node of the tree's node type"""
+        if self.parser is not None:
+            # Typed values are shared by all employees with the same value already
+            dob = self.parser.date(dob)
+            pob = self.parser.place(pob)
+        elif self.compact:
+            # Few distinct values repeat across employees (i.e. VT, USA, UK, HCM), keep one copy of each
+            dob = sys.intern(dob)
+            pob = sys.intern(pob)
+        return self.node_type(id, name, dob, pob, parent)
 
     def delete_node(self, node):
         """Delete a node from tree"""
-        # Check if there is no node with input ID in tree
-        if not node or not self.search(node.id, self.root):
+        # Check if node is not in tree (internal lookup: not counted as a search by metrics or cache)
+        if not node or self.find_node(node.id) is not node:
             return False
 
-        # If node is valid, there are 3 cases to check
+        # Remove employee from secondary indexes and ID array
+        self.employee_removed(node)
+
+        return self.unlink_node(node)
+
+    def unlink_node(self, node):
+        """Take a node which is in tree out of tree structure, then re-balance"""
+        # There are 3 cases to check
         parent = node.parent
         # number of children is condition for each case
         num_children = self.number_of_children(node)
 
+        # Node object leaves tree in case 1 and 2: link its in-order neighbours to each other
+        # (in case 3 node stays, its successor object leaves through the recursive call)
+        if num_children < 2:
+            if node.prev is not None:
+                node.prev.next = node.next
+            if node.next is not None:
+                node.next.prev = node.prev
+
         # Case 1: node has no children => node is leave => point node's parent to None in replace of node
         if num_children == 0:
             # If node's parent is None => node is root
@@ -96,8 +287,11 @@ class BinarySearchTree:
         # Case 3: node has 2 children => replace node with its successor/predecessor,
         # delete successor/predecessor, recalculate heights of nodes, execute re-balance
         elif num_children == 2:
-            # Get successor (the smallest of right branch) or predecessor (the largest of left branch)
-            successor = self.min_node(node.right)
+            # Get successor (the smallest of right branch), which is the next node in ID order
+            successor = node.next
+
+            # Successor's data is moving to node, index entries of successor must follow
+            self.employee_moved(successor, node)
 
             # replace employee information in node with successor/predecessor
             # (or replace pointers of node's parent to suc/pred and pointers of suc/pred with node's pointers)
@@ -106,10 +300,10 @@ class BinarySearchTree:
             node.dob = successor.dob
             node.pob = successor.pob
 
-            # delete successor/predecessor, in the recursive call of deleter successor node,
+            # delete successor/predecessor, in the recursive call of unlink successor node,
             # since successor is leave or has 1 right child, case 1 or 2 is executed,
             # then program going to next step: re-balancing tree/subtree
-            self.delete_node(successor)
+            self.unlink_node(successor)
 
             return
 
@@ -118,12 +312,184 @@ class BinarySearchTree:
         # Case 1 + 2 covered parent is None
         # Case 3 will recursive call on deletion of suc/pred which then back to case 1 or 2
         if parent is not None:
-            # Update node's parent's height
-            parent.height = max(self.get_height(parent.left), self.get_height(parent.right)) + 1
+            # One node less in subtrees of all ancestors
+            ancestor = parent
+            while ancestor is not None:
+                ancestor.size -= 1
+                ancestor = ancestor.parent
 
-            # Function to traverse back to root, check balance, and re-balance
+            # Function to update heights while traversing back to root, check balance, and re-balance
             self.rebalance_deletion(parent)
 
+    def enable_metrics(self):
+        """
+        Start collecting metrics (see TreeMetrics) in self.metrics. Timed operations and search are replaced
+        by measuring versions on this tree object only, so trees without metrics pay nothing for them
+        """
+        self.metrics = TreeMetrics(self)
+        for operation, method in self.measured_operations.items():
+            setattr(self, method, self.metrics.timed(operation, getattr(type(self), method).__get__(self)))
+        self.search = self.measured_search
+
+    def disable_metrics(self):
+        """Stop collecting metrics, go back to the plain operations"""
+        self.metrics = None
+        for method in list(self.measured_operations.values()) + ["search"]:
+            self.__dict__.pop(method, None)
+
+    def employee_columns(self):
+        """Return NumPy columns of all employees (ID, Date of Birth day, Place of Birth code), kept until a change"""
+        if np is None:
+            raise ImportError("NumPy is needed for employee columns")
+        if self.columns is None:
+            self.columns = EmployeeColumns(self.iter_inorder(self.root), self.parser)
+        return self.columns
+
+    def employee_indexes(self):
+        """Return secondary indexes of tree, or temporary ones built from all nodes if tree is not indexed"""
+        if self.indexes is not None:
+            return self.indexes
+        return EmployeeIndexes(self.iter_inorder(self.root))
+
+    def employee_added(self, node):
+        """Keep secondary indexes and ID array up to date after a new node is added"""
+        if self.indexes is not None:
+            self.indexes.add(node)
+        self.columns = None
+        if self.id_array is not None:
+            # An ID which does not fit the int64 array (only possible through insert, add_employee rejects it)
+            # drops the array instead of leaving it without the new node
+            if self.maintain_id_array and MIN_ID <= node.id <= MAX_ID:
+                position = int(np.searchsorted(self.id_array, node.id))
+                self.id_array = np.insert(self.id_array, position, node.id)
+                self.id_nodes.insert(position, node)
+            else:
+                self.id_array = self.id_nodes = None
+
+    def employee_moved(self, node, new_node):
+        """Keep secondary indexes and ID array up to date when employee data of node is moved to new_node"""
+        if self.indexes is not None:
+            self.indexes.move(node, new_node)
+        # Cached node of this ID is about to be unlinked
+        if self.cache is not None:
+            self.cache.pop(node.id)
+        if self.id_array is not None:
+            self.id_nodes[int(np.searchsorted(self.id_array, node.id))] = new_node
+
+    def employee_removed(self, node):
+        """Keep secondary indexes and ID array up to date before employee of node is removed"""
+        if self.indexes is not None:
+            self.indexes.remove(node)
+        self.columns = None
+        if self.cache is not None:
+            self.cache.pop(node.id)
+        if self.id_array is not None:
+            if self.maintain_id_array:
+                position = int(np.searchsorted(self.id_array, node.id))
+                self.id_array = np.delete(self.id_array, position)
+                del self.id_nodes[position]
+            else:
+                self.id_array = self.id_nodes = None
+
+    def find_ceiling(self, id=None, inclusive=True):
+        """Return node with the smallest ID >= input ID (> if not inclusive, smallest of tree if None), or None"""
+        found = None
+        node = self.root
+        while node:
+            if id is None or node.id > id or (node.id == id and inclusive):
+                found = node
+                node = node.left
+            else:
+                node = node.right
+        return found
+
+    def find_floor(self, id=None, inclusive=True):
+        """Return node with the largest ID <= input ID (< if not inclusive, largest of tree if None), or None"""
+        found = None
+        node = self.root
+        while node:
+            if id is None or node.id < id or (node.id == id and inclusive):
+                found = node
+                node = node.right
+            else:
+                node = node.left
+        return found
+
+    def find_node(self, id):
+        """Return node of ID by a plain walk from root which bypasses cache and metrics, False if ID does not exist"""
+        root = self.root
+        while root:
+            if id == root.id:
+                return root
+            root = root.right if id > root.id else root.left
+        return False
+
+    def find_born_before(self, dob, inclusive=False):
+        """
+        Return list of employee nodes born before dob ("dd/mm/yyyy", on that day too if inclusive)
+        in Date of Birth order (ID order on the same day).
+        Employees whose Date of Birth is not a valid date are left out
+        """
+        day = parse_dob(dob)
+        if day is None:
+            raise ValueError("Date of Birth must be in dd/mm/yyyy format")
+        if not inclusive:
+            day -= 1
+        if self.indexes is not None:
+            return list(self.indexes.dob.range(None, day))
+        # Typed tree compares the parsed days, otherwise every Date of Birth is parsed here
+        found = []
+        for node in self.iter_inorder(self.root):
+            node_day = dob_day(node.dob)
+            if node_day is not None and node_day <= day:
+                found.append((node_day, node))
+        found.sort(key=lambda item: item[0])
+        return [node for node_day, node in found]
+
+    def find_by_dob(self, start=None, end=None):
+        """
+        Return list of employee nodes born from start to end ("dd/mm/yyyy", both included, None means no limit)
+        in Date of Birth order. Without secondary indexes, every node is checked
+        """
+        return self.employee_indexes().find_by_dob(start, end)
+
+    def find_by_name(self, name):
+        """Return list of employee nodes with exactly this Name"""
+        return self.employee_indexes().find_by_name(name)
+
+    def find_by_name_prefix(self, prefix):
+        """Return list of employee nodes whose Name starts with prefix, in Name order"""
+        return self.employee_indexes().find_by_name_prefix(prefix)
+
+    def find_by_pob(self, pob):
+        """Return list of employee nodes with this Place of Birth, in ID order"""
+        return self.employee_indexes().find_by_pob(pob)
+
+    def age_distribution(self, width=10, today=None, low=None, high=None):
+        """Return {age: number of employees} in buckets of width years (age 20 holds 20 to 29 for width 10)"""
+        return self.group_by("age", width, low, high, today).count()
+
+    def group_by(self, field, by=None, low=None, high=None, today=None):
+        """
+        Group employees whose ID is from low to high (both included, None means no limit) by field, see GroupBy.
+        i.e. tree.group_by("pob").count() is the headcount by Place of Birth,
+        tree.group_by("dob", by="year", low=100, high=200).nodes() are employees of IDs 100..200 by birth year
+        """
+        return GroupBy(self, field, by, low, high, today)
+
+    def group_by_pob(self):
+        """
+        Return {Place of Birth: list of employee nodes in ID order}, places in the order they are first met in ID order.
+        (Grouping by node.pob.code of a typed tree is not faster: hash of a str is computed once and kept)
+        """
+        groups = {}
+        for node in self.iter_inorder(self.root):
+            bucket = groups.get(node.pob)
+            if bucket is None:
+                bucket = groups[node.pob] = []
+            bucket.append(node)
+        return groups
+
     def get_height(self, node):
         """Get height of a node"""
         # If node is None, return node's height is 0
@@ -141,57 +507,222 @@ class BinarySearchTree:
         else:
             return self.get_height(node.left) - self.get_height(node.right)
 
+    def get_size(self, node):
+        """Get number of nodes in subtree of a node"""
+        # If node is None, subtree is empty
+        if not node:
+            return 0
+        else:
+            return node.size
+
+    def histogram(self, field, by=None, low=None, high=None, today=None):
+        """Return {bucket: number of employees}, i.e. histogram("dob", by="year") or histogram("age", by=5)"""
+        return self.group_by(field, by, low, high, today).count()
+
     def inorder_traverse(self, node):
         """Traversal from left to root to right of subtree/tree"""
-        result = []
-        # If input node is not None, start traversing
-        if node:
-            result += self.inorder_traverse(node.left)
-            result.append(node)
-            result += self.inorder_traverse(node.right)
         # Return list of nodes
-        return result
+        return list(self.iter_inorder(node))
 
-    def insert(self, root, id, name, dob, pob):
+    def insert(self, root, id, name, dob, pob, quiet=False):
         """
         If tree root created, find position and insert employee to tree,
-        update height of ancestors, rotate if tree is unbalance (Apply AVL tree)
+        update height of ancestors, rotate if tree is unbalance (Apply AVL tree).
+        Return True if inserted, False if ID existed (notify unless quiet)
         """
+        # Empty tree: new node becomes root
+        if root is None:
+            self.root = self.create_node(id, name, dob, pob)
+            self.employee_added(self.root)
+            self.rebalance_insertion(self.root)
+            return True
 
-        # If new ID < than current ID, move node to the left of current node
-        if id < root.id:
-            # If current node already had left node, recursive call insert on current left node
-            # (current left node become root)
-            if root.left:
-                self.insert(root.left, id, name, dob, pob)
-            # when the left of current node is None, create new node to its left, whose parent is current node
+        # Walk down from root to find position of new node
+        current = root
+        while True:
+            # If new ID < than current ID, move to the left of current node
+            if id < current.id:
+                # If current node already had left node, continue on current left node
+                if current.left:
+                    current = current.left
+                # when the left of current node is None, create new node to its left, whose parent is current node
+                else:
+                    new_node = current.left = self.create_node(id, name, dob, pob, current)
+                    # New left child comes right before current in ID order
+                    new_node.prev, new_node.next = current.prev, current
+                    break
+
+            # If new ID > than current ID, perform to the right similar on the left of current node
+            elif id > current.id:
+                if current.right:
+                    current = current.right
+                else:
+                    new_node = current.right = self.create_node(id, name, dob, pob, current)
+                    # New right child comes right after current in ID order
+                    new_node.prev, new_node.next = current, current.next
+                    break
+
+            # If ID existed, notify and return False
             else:
-                root.left = Node(id, name, dob, pob, root)
+                if not quiet:
+                    print("Invalid ID.")
+                return False
+
+        if new_node.prev is not None:
+            new_node.prev.next = new_node
+        if new_node.next is not None:
+            new_node.next.prev = new_node
+
+        # Add new employee to secondary indexes and ID array
+        self.employee_added(new_node)
+
+        # One node more in subtrees of all ancestors
+        ancestor = current
+        while ancestor is not root.parent:
+            ancestor.size += 1
+            ancestor = ancestor.parent
 
-        # If new ID > than current ID, perform to the right similar on the left of current node
-        elif id > root.id:
+        # Walk back up to root: update height of ancestors, rotate if new node makes tree unbalance
+        self.rebalance_insertion(new_node, root.parent)
+        return True
+
+    def iter_bfs(self, node):
+        """Yield nodes follow BFS theory one by one (level by level, left to right)"""
+        # deque is enough here, queue.Queue takes a lock on every put and get
+        q = deque()
+        if node:
+            q.append(node)
+        while q:
+            root = q.popleft()
+            yield root
+            if root.left:
+                q.append(root.left)
             if root.right:
-                self.insert(root.right, id, name, dob, pob)
+                q.append(root.right)
+
+    def iter_inorder(self, node):
+        """Yield nodes from left to root to right of subtree/tree one by one"""
+        if not node:
+            return
+        # Follow next links from the smallest to the largest ID of subtree, no stack or recursion needed
+        last = node
+        while last.right:
+            last = last.right
+        node = self.min_node(node)
+        while True:
+            yield node
+            if node is last:
+                return
+            node = node.next
+
+    def iter_postorder(self, node):
+        """Yield nodes from left to right to root of subtree/tree one by one"""
+        stack = []
+        last_visited = None
+        while stack or node:
+            # Go to the leftmost node, remember ancestors on the way
+            if node:
+                stack.append(node)
+                node = node.left
             else:
-                root.right = Node(id, name, dob, pob, root)
+                top = stack[-1]
+                # Traverse right subtree first if it has not been visited
+                if top.right and top.right is not last_visited:
+                    node = top.right
+                # Both subtrees are visited, visit the node itself
+                else:
+                    last_visited = stack.pop()
+                    yield last_visited
 
-        # If ID existed, notify and return False
-        else:
-            print("Invalid ID.")
-            return False
+    def iter_preorder(self, node):
+        """Yield nodes from root to left to right of subtree/tree one by one"""
+        stack = [node] if node else []
+        while stack:
+            root = stack.pop()
+            yield root
+            # Push right child first so left subtree is visited first
+            if root.right:
+                stack.append(root.right)
+            if root.left:
+                stack.append(root.left)
+
+    def iter_range(self, low=None, high=None, include_low=True):
+        """
+        Yield nodes whose ID is from low to high (both included, None means no limit) in ID order.
+        Walk down to lower bound first (O(log n)), then follow next links (O(1) per node)
+        """
+        node = self.find_ceiling(low, include_low)
+        while node is not None and (high is None or node.id <= high):
+            yield node
+            node = node.next
+
+    def iter_range_reverse(self, high=None, low=None, include_high=True):
+        """Yield nodes whose ID is from high down to low (both included, None means no limit) in reverse ID order"""
+        node = self.find_floor(high, include_high)
+        while node is not None and (low is None or node.id >= low):
+            yield node
+            node = node.prev
 
-        # Update height of ancestors
-        root.height = max(self.get_height(root.left), self.get_height(root.right)) + 1
+    def iter_records(self, node):
+        """Yield employee data of subtree/tree in ID order as dictionary in file format"""
+        for node in self.iter_inorder(node):
+            yield node_record(node)
 
-        # If new node makes tree unbalance, rotate
-        self.rebalance(root)
+    def measured_search(self, id, root):
+        """search which also records visited nodes and latency into metrics"""
+        start = time.perf_counter()
+        found = False
+        visits = 0
+        cache = self.cache if root is self.root else None
+        if self.root is not None:
+            cached = cache.get(id) if cache is not None else None
+            if cached is not None:
+                found = cached
+            # Same walk as search, counting nodes on the way
+            while found is False and root:
+                visits += 1
+                if id == root.id:
+                    found = root
+                    if cache is not None:
+                        cache.put(id, root)
+                elif id > root.id:
+                    root = root.right
+                else:
+                    root = root.left
+        self.metrics.observe_search(visits, time.perf_counter() - start, found is not False)
+        return found
+
+    def link_nodes(self):
+        """Set prev/next links of all nodes from tree structure (after the tree is built at once)"""
+        previous = None
+        stack = []
+        node = self.root
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                node.prev = previous
+                if previous is not None:
+                    previous.next = node
+                previous = node
+                node = node.right
+        if previous is not None:
+            previous.next = None
 
     def min_node(self, root):
         """Return node that is the smallest ID start from a selected node
         (i.e. start from root: root = BinarySearchTree.root)"""
-        if root is None or root.left is None:
+        if root is None:
             return root
-        return self.min_node(root.left)
+        while root.left is not None:
+            root = root.left
+        return root
+
+    def next_node(self, node):
+        """Return node with the next larger ID in O(1), None if node has the largest ID"""
+        return node.next
 
     def number_of_children(self, node):
         """Check how many children a node has (0, 1, 2)"""
@@ -202,6 +733,26 @@ class BinarySearchTree:
             children += 1
         return children
 
+    def paginate(self, after_id=None, limit=20):
+        """
+        Return (nodes, next cursor): at most limit nodes with ID > after_id (from the smallest ID if None).
+        Next cursor is the after_id of next page, or None if this is the last page
+        """
+        # Take 1 more node to know if there is a next page
+        nodes = list(islice(self.iter_range(after_id, None, include_low=False), limit + 1))
+        if len(nodes) > limit:
+            nodes.pop()
+            return nodes, nodes[-1].id
+        return nodes, None
+
+    def previous_node(self, node):
+        """Return node with the next smaller ID in O(1), None if node has the smallest ID"""
+        return node.prev
+
+    def range_query(self, low, high):
+        """Return list of nodes whose ID is from low to high (both included) in ID order"""
+        return list(self.iter_range(low, high))
+
     def rebalance(self, node):
         """
         Check Balance factor of Node to find out if tree/subtree is unbalance
@@ -213,46 +764,122 @@ class BinarySearchTree:
         # Get balance factor of current node
         balance = self.get_balance(node)
 
-        # If tree/subtree is unbalance, there are 4 cases
+        # If tree/subtree is unbalance, there are 4 cases, which is decided by balance factor of the heavy child
+        # (checking only whether a grandchild exists picks the wrong rotation when both grandchildren exist)
         # Case 1: left heavy and node -> left -> left ===>> rotate right
-        if balance > 1 and node.left.left:
+        if balance > 1 and self.get_balance(node.left) >= 0:
             self.rotate_right(node)
+            rotation = "rotations_single"
 
         # Case 2: right heavy and node -> right -> left ===>> rotate right at right node ===>> rotate left at node
-        elif balance < -1 and node.right.left:
+        elif balance < -1 and self.get_balance(node.right) > 0:
             # rotate the right node of current node to back to case 2
             self.rotate_right(node.right)
             # then perform case 2 rotation on current node
             self.rotate_left(node)
+            rotation = "rotations_double"
 
         # Case 3: node -> right -> right ===>> rotate left
-        elif balance < -1 and node.right.right:
+        elif balance < -1:
             self.rotate_left(node)
+            rotation = "rotations_single"
 
         # Case 4: right heavy and node -> left -> right ===>> rotate left at left node ===>> rotate right at node
-        elif balance > 1 and node.left.right:
+        elif balance > 1:
             # rotate the left node of current node to back to case 1
             self.rotate_left(node.left)
             # then perform case 1 rotation on current node
             self.rotate_right(node)
+            rotation = "rotations_double"
 
-    def rebalance_deletion(self, node):
-        """Traverse up to root, balance tree/subtree if a node is found unbalance"""
-        # Stop at the root of the tree
-        if node is None:
+        else:
             return
 
-        # Execute re-balance method if a node is found unbalance while traverse back to root
-        if abs(self.get_balance(node)) > 1:
-            self.rebalance(node)
+        if self.metrics is not None:
+            self.metrics.count(rotation)
 
-        # Recursive call to traverse back to root and execute re-balance
-        self.rebalance_deletion(node.parent)
+    def rebalance_insertion(self, node, stop=None):
+        """Traverse up from parent of a new node to root (or until stop node), balance tree/subtree on the way"""
+        to_root = self.retrace(node.parent, stop)
+        if self.metrics is not None:
+            self.metrics.count("insert_retrace_to_root" if to_root else "insert_retrace_early_stop")
+
+    def rebalance_deletion(self, node):
+        """Traverse up to root, balance tree/subtree if a node is found unbalance"""
+        to_root = self.retrace(node)
+        if self.metrics is not None:
+            self.metrics.count("delete_retrace_to_root" if to_root else "delete_retrace_early_stop")
+
+    def rebuild(self, rows):
+        """Replace the whole tree by a balanced tree built from ID sorted rows of unique IDs"""
+        self.root = self.build_balanced(rows, 0, len(rows) - 1, None)
+        self.link_nodes()
+        # Build secondary indexes at once (one sort each) instead of adding nodes one by one
+        if self.indexes is not None:
+            self.indexes = EmployeeIndexes(self.iter_inorder(self.root))
+        # All nodes are new, ID array and columns are built again when needed and cached nodes are gone
+        self.id_array = self.id_nodes = self.columns = None
+        if self.cache is not None:
+            self.cache.clear()
 
     def remove_employee(self, id):
         """Take input ID then remove node contains the ID from tree"""
+        id = parse_id(id)
+        if id is None:
+            return False
         return self.delete_node(self.search(id, self.root))
 
+    def remove_employees(self, ids):
+        """
+        Remove a batch of employees by ID.
+        Return list of status in the order of ids: True if removed, False if ID does not exist (or repeated in batch)
+        """
+        ids = [parse_id(id) for id in ids]
+        status = [False] * len(ids)
+        # An invalid ID is left out of the batch, its status stays False
+        order = sorted((i for i in range(len(ids)) if ids[i] is not None), key=lambda i: ids[i])
+
+        # Small batch: remove one by one
+        if len(order) < self.batch_rebuild_ratio * self.get_size(self.root):
+            for i in order:
+                node = self.search(ids[i], self.root)
+                if node:
+                    self.delete_node(node)
+                    status[i] = True
+            return status
+
+        # Big batch: walk employees of tree and batch IDs together in ID order, keep employees not in batch
+        kept = []
+        position = 0
+        for node in self.iter_inorder(self.root):
+            # Skip batch IDs which are smaller than this employee (they do not exist)
+            while position < len(order) and ids[order[position]] < node.id:
+                position += 1
+            if position < len(order) and ids[order[position]] == node.id:
+                status[order[position]] = True
+                position += 1
+            else:
+                kept.append((node.id, node.name, node.dob, node.pob))
+
+        self.rebuild(kept)
+        return status
+
+    def rank(self, id, inclusive=False):
+        """
+        Return number of employees whose ID is smaller than input ID (or smaller or equal if inclusive)
+        in O(log n), using subtree sizes. Input ID does not have to exist in tree
+        """
+        count = 0
+        node = self.root
+        while node:
+            if id < node.id or (id == node.id and not inclusive):
+                node = node.left
+            else:
+                # Node and its whole left subtree are counted
+                count += self.get_size(node.left) + 1
+                node = node.right
+        return count
+
     def read_tree(self, traversal_result):
         """Print ID, parent, left child, right child of nodes"""
         for node in traversal_result:
@@ -271,6 +898,31 @@ class BinarySearchTree:
                 right = node.right.id
             print(f"ID: {node.id:<5} | Parent: {parent:<5} | Left: {left:<5} | Right: {right:<5}")
 
+    def retrace(self, node, stop=None):
+        """
+        Walk up from node to root (or until stop node), update heights and re-balance nodes on the way.
+        Stop early when height of a subtree does not change, since its ancestors are not affected.
+        Return True if the walk went all the way up, False if it stopped early
+        """
+        while node is not stop:
+            # Parent is saved before re-balance because rotation moves current node down
+            parent = node.parent
+            old_height = node.height
+            node.height = max(self.get_height(node.left), self.get_height(node.right)) + 1
+
+            # Execute re-balance method if a node is found unbalance while traverse back to root
+            if abs(self.get_balance(node)) > 1:
+                self.rebalance(node)
+
+            # After rotation, the place of node is taken by its new parent
+            top = node if node.parent is parent else node.parent
+            if top.height == old_height:
+                return False
+
+            # Move up to traverse back to root and execute re-balance
+            node = parent
+        return True
+
     def rotate_left(self, x):
         """Rotate tree/subtree to left"""
         # If tree/subtree is right heavy (balance factor > -1)
@@ -305,9 +957,11 @@ class BinarySearchTree:
             elif y.parent.right == x:
                 y.parent.right = y
 
-        # Update x and y heights
+        # Update x and y heights and sizes (x is child of y now, so x first)
         x.height = max(self.get_height(x.left), self.get_height(x.right)) + 1
         y.height = max(self.get_height(y.left), self.get_height(y.right)) + 1
+        x.size = self.get_size(x.left) + self.get_size(x.right) + 1
+        y.size = self.get_size(y.left) + self.get_size(y.right) + 1
 
     def rotate_right(self, x):
         """Rotate tree/subtree to right"""
@@ -343,9 +997,11 @@ class BinarySearchTree:
             elif y.parent.right == x:
                 y.parent.right = y
 
-        # Update x and y heights
+        # Update x and y heights and sizes (x is child of y now, so x first)
         x.height = max(self.get_height(x.left), self.get_height(x.right)) + 1
         y.height = max(self.get_height(y.left), self.get_height(y.right)) + 1
+        x.size = self.get_size(x.left) + self.get_size(x.right) + 1
+        y.size = self.get_size(y.left) + self.get_size(y.right) + 1
 
     def search(self, id, root):
         """Search for a node by input ID start from a node
@@ -353,15 +1009,72 @@ class BinarySearchTree:
 
         if self.root is None:
             return False
-        else:
+
+        # Searches of the whole tree go through cache first (nodes keep their employee through rotations,
+        # so only removing/moving an employee changes what a cached ID points to)
+        cache = self.cache
+        if cache is not None and root is self.root:
+            node = cache.get(id)
+            if node is not None:
+                return node
+
+        start = root
+        # Walk down from root until ID is found or there is no child to go to
+        while root:
             if id == root.id:
+                if cache is not None and start is self.root:
+                    cache.put(id, root)
                 return root
-            elif id > root.id and root.right:
-                return self.search(id, root.right)
-            elif id < root.id and root.left:
-                return self.search(id, root.left)
+            elif id > root.id:
+                root = root.right
             else:
-                return False
+                root = root.left
+        return False
+
+    def search_many(self, ids):
+        """
+        Search a batch of IDs, return list of nodes in the order of ids (False for an ID which does not exist).
+        With NumPy, all IDs are looked up at once with np.searchsorted on a sorted ID array of the tree
+        (built on first use, rebuilt after the tree changes); without NumPy, search is called for each ID
+        """
+        if np is None:
+            return [self.search(id, self.root) for id in ids]
+
+        try:
+            if self.id_array is None:
+                self.id_nodes = list(self.iter_inorder(self.root))
+                self.id_array = np.fromiter((node.id for node in self.id_nodes), dtype=np.int64,
+                                            count=len(self.id_nodes))
+            if not self.id_nodes:
+                return [False] * len(ids)
+            ids = np.asarray(ids, dtype=np.int64)
+        except OverflowError:
+            # An ID of tree or batch does not fit int64: no array, search each ID
+            self.id_array = self.id_nodes = None
+            return [self.search(id, self.root) for id in ids]
+        positions = np.searchsorted(self.id_array, ids)
+        # Positions after the largest ID point out of array, compare them with the last ID instead
+        positions = np.minimum(positions, len(self.id_array) - 1)
+        found = self.id_array[positions] == ids
+        id_nodes = self.id_nodes
+        return [id_nodes[position] if exist else False for position, exist in zip(positions.tolist(), found.tolist())]
+
+    def select(self, k):
+        """Return node with the k-th smallest ID (k starts from 1) in O(log n), False if k is out of range"""
+        if k < 1 or k > self.get_size(self.root):
+            return False
+
+        node = self.root
+        while node:
+            left_size = self.get_size(node.left)
+            if k <= left_size:
+                node = node.left
+            elif k == left_size + 1:
+                return node
+            else:
+                # Skip node and its left subtree
+                k -= left_size + 1
+                node = node.right
 
     def show(self, traversal_result):
         """Print employee data in the order of traversal type"""
@@ -371,6 +1084,43 @@ class BinarySearchTree:
         for node in traversal_result:
             print(f"{node.id:<4} | {node.name:<20} | {node.dob:^14} | {node.pob:^10}")
 
+    def verify(self):
+        """
+        Check structure of tree: ID order, parent pointers, heights, sizes, AVL balance and prev/next links.
+        Return number of nodes, raise AssertionError if something is broken
+        """
+        for node in self.iter_postorder(self.root):
+            for child in (node.left, node.right):
+                if child:
+                    assert child.parent is node, f"Wrong parent of ID {child.id}"
+            assert not node.left or node.left.id < node.id, f"Wrong order at ID {node.id}"
+            assert not node.right or node.right.id > node.id, f"Wrong order at ID {node.id}"
+            assert node.height == max(self.get_height(node.left), self.get_height(node.right)) + 1, \
+                f"Wrong height of ID {node.id}"
+            assert node.size == self.get_size(node.left) + self.get_size(node.right) + 1, \
+                f"Wrong size of ID {node.id}"
+            assert abs(self.get_balance(node)) <= 1, f"Unbalanced at ID {node.id}"
+        assert self.root is None or self.root.parent is None, "Root has a parent"
+        self.verify_links()
+        return self.get_size(self.root)
+
+    def verify_links(self):
+        """Check prev/next links against the order given by tree structure (walked with a stack, not by links)"""
+        previous = None
+        stack = []
+        node = self.root
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                assert node.prev is previous, f"Wrong prev link of ID {node.id}"
+                assert previous is None or previous.next is node, f"Wrong next link of ID {previous.id}"
+                previous = node
+                node = node.right
+        assert previous is None or previous.next is None, "Largest ID has a next link"
+
 
 if __name__ == "__main__":
     data = [{'ID': '1', 'Name': 'Nguyen Ba Ngoc Dung', 'Date of Birth': '03/09/1990', 'Place of Birth': 'VT'},
@@ -0,0 +1,202 @@
+import threading
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+from binary_search_tree import BinarySearchTree
+from employee_record import node_record, parse_id
+from persistent_tree import PersistentBinarySearchTree
+
+
+class ReadWriteLock:
+    """
+    Lock which lets many readers in at the same time, but a writer only alone.
+    Waiting writers go first, so a stream of readers cannot starve writers
+    """
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class TreeSnapshot(Sequence):
+    """
+    Rows (ID, Name, Date of Birth, Place of Birth) of all employees at one moment, in ID order.
+    Rows come from persistent nodes which no write ever changes, so the snapshot needs no lock;
+    row i is found from subtree sizes in O(log n)
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def __len__(self):
+        return self.root.size if self.root else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Snapshot index out of range")
+        node = self.root
+        while True:
+            left_size = node.left.size if node.left else 0
+            if index < left_size:
+                node = node.left
+            elif index > left_size:
+                index -= left_size + 1
+                node = node.right
+            else:
+                return node.id, node.name, node.dob, node.pob
+
+    def __iter__(self):
+        node = self.root
+        stack = []
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node.id, node.name, node.dob, node.pob
+                node = node.right
+
+
+class ConcurrentEmployeeTree:
+    """
+    BinarySearchTree shared between threads: searches and traversals run together under a read lock,
+    add/remove run alone under a write lock. Employee data is returned as copies (dictionary in file format),
+    so a reader never sees a node that a writer is changing (i.e. delete_node case 3 copying successor's data).
+    Snapshots come from a persistent copy of the employees and take no lock at all
+    """
+    def __init__(self, tree=None):
+        self.tree = tree if tree is not None else BinarySearchTree()
+        self.lock = ReadWriteLock()
+        # Persistent copy of the employees, changed by writers with path copying (O(log n) new nodes per write):
+        # snapshot_root is swapped to the new root under the write lock, and a snapshot only takes the current root
+        self.persistent = PersistentBinarySearchTree()
+        rows = [(node.id, node.name, node.dob, node.pob) for node in self.tree.iter_inorder(self.tree.root)]
+        self.snapshot_root = self.persistent.build_balanced(rows, 0, len(rows) - 1)
+
+    # ======= Read operations (shared)
+    def search(self, id):
+        """Return employee data with input ID, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None:
+            return False
+        with self.lock.read_locked():
+            node = self.tree.search(id, self.tree.root)
+            return node_record(node) if node else False
+
+    def range_query(self, low, high):
+        """Return list of employee data whose ID is from low to high in ID order"""
+        with self.lock.read_locked():
+            return [node_record(node) for node in self.tree.iter_range(low, high)]
+
+    def inorder(self):
+        """Return list of all employee data in ID order (holds the read lock during the whole walk)"""
+        with self.lock.read_locked():
+            return list(self.tree.iter_records(self.tree.root))
+
+    def snapshot(self):
+        """
+        Return an immutable TreeSnapshot of all employees in ID order in O(1): no lock is taken and nothing is
+        copied, so neither taking a snapshot nor scanning it ever blocks writers (or is blocked by them)
+        """
+        return TreeSnapshot(self.snapshot_root)
+
+    # ======= Persistent copy (called by writers under the write lock)
+    def publish_added(self, id):
+        """Add employee of ID, which was just added to tree, to the persistent copy"""
+        node = self.tree.search(id, self.tree.root)
+        self.snapshot_root = self.persistent.insert(self.snapshot_root, node.id, node.name, node.dob, node.pob)
+
+    def publish_removed(self, id):
+        """Remove ID, which was just removed from tree, from the persistent copy"""
+        self.snapshot_root = self.persistent.delete(self.snapshot_root, id)
+
+    # ======= Write operations (exclusive)
+    def add_employee(self, id, name, dob, pob):
+        """Add new employee, return True if added, False if ID existed or is not a number"""
+        id = parse_id(id)
+        if id is None:
+            print("Invalid ID.")
+            return False
+        with self.lock.write_locked():
+            added = self.tree.insert(self.tree.root, id, name, dob, pob, quiet=True)
+            if added:
+                self.publish_added(id)
+            return added
+
+    def remove_employee(self, id):
+        """Remove employee by ID, return True if removed, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None:
+            return False
+        with self.lock.write_locked():
+            node = self.tree.search(id, self.tree.root)
+            if not node:
+                return False
+            self.tree.delete_node(node)
+            self.publish_removed(id)
+            return True
+
+    def add_employees(self, records):
+        """Add a batch of employees, return list of status (see BinarySearchTree.add_employees)"""
+        with self.lock.write_locked():
+            status = self.tree.add_employees(records)
+            for record, added in zip(records, status):
+                if added:
+                    self.publish_added(parse_id(record["ID"]))
+            return status
+
+    def remove_employees(self, ids):
+        """Remove a batch of employees, return list of status (see BinarySearchTree.remove_employees)"""
+        with self.lock.write_locked():
+            status = self.tree.remove_employees(ids)
+            for id, removed in zip(ids, status):
+                if removed:
+                    self.publish_removed(parse_id(id))
+            return status
+
@@ -0,0 +1,565 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+
+from b_tree import Employee
+from binary_search_tree import BinarySearchTree
+from employee_record import node_record, parse_id, record_row, unique_rows
+from search_cache import SearchCache
+
+# Disk tree file layout (little-endian), made of fixed-size pages:
+#   page 0:        header: magic, version, page size, number of employees, root page, first free page, number of pages
+#   leaf page:     kind, number of employees, previous leaf, next leaf, byte length of text, then
+#                  IDs of employees, character lengths of Name, Date of Birth, Place of Birth of each employee,
+#                  and text: all strings back to back in utf-8 (decoded at once, then cut by lengths)
+#   inner page:    kind, number of keys, unused, unused, unused, then keys (IDs) and child page numbers
+#                  (one more than keys)
+#   free page:     kind, unused, unused, next free page, unused
+# Page number 0 (the header) means "no page" in links.
+DISK_MAGIC = b"EMPT"
+DISK_VERSION = 1
+DISK_HEADER = struct.Struct("<4sIIQIII")
+PAGE_HEADER = struct.Struct("<BHIIH")
+# ID and 3 string lengths of an employee in a leaf page
+RECORD_SIZE = 14
+# Record count and text size of a page are unsigned shorts in its header, pages must not hold more
+MIN_PAGE_SIZE, MAX_PAGE_SIZE = 256, 2 ** 16 - 1
+LEAF, INNER, FREE = 1, 2, 3
+
+
+class DiskPage:
+    """
+    Decoded page of DiskTree. Leaf: children are employees, prev/next are page numbers of neighbour leaves,
+    used is the number of bytes the page takes encoded. Inner: children are page numbers, keys[i] separates
+    children[i] (IDs < keys[i]) from children[i + 1] (IDs >= keys[i])
+    """
+    __slots__ = ("number", "leaf", "keys", "children", "prev", "next", "used")
+
+    def __init__(self, number, leaf, keys=None, children=None):
+        self.number = number
+        self.leaf = leaf
+        self.keys = keys if keys is not None else []
+        self.children = children if children is not None else []
+        self.prev = 0
+        self.next = 0
+        self.used = 0
+
+
+def record_size(employee):
+    """Number of bytes an employee takes in a leaf page"""
+    return RECORD_SIZE + len((employee.name + employee.dob + employee.pob).encode("utf-8"))
+
+
+class DiskTree:
+    """
+    Employee B+-tree stored in a file of fixed-size pages and read through mmap, for rosters larger than memory.
+    Only the header and the pages in a page cache (cache_pages decoded pages, evicted by cache_policy "lru"
+    or "lfu", see SearchCache) are held as Python objects; every change is written to its page in the mapped
+    file at once, so evicting a page never loses data. Inorder scans read leaves one after another through
+    their next links without filling the cache.
+    Same search, add/remove and traversal API as BinarySearchTree: tree.root is the root page number,
+    nodes are Employee objects decoded from pages (changing them does not change the file).
+    Pages are freed when they become empty, not merged when half empty. Changes reach the disk when the
+    operating system writes the mapped pages or on flush()/close(); the file is not crash safe
+    """
+    def __init__(self, file_path, page_size=4096, cache_pages=1024, cache_policy="lru"):
+        # Checked before any file is created (page size of an existing file comes from its header)
+        if not MIN_PAGE_SIZE <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(f"Page size must be from {MIN_PAGE_SIZE} to {MAX_PAGE_SIZE}")
+        self.file_path = file_path
+        self.cache = SearchCache(cache_pages, cache_policy)
+        self.file = open(file_path, "r+b" if os.path.exists(file_path) else "w+b")
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.page_size = page_size
+            self.count = self.root = self.free_page_number = 0
+            self.page_count = 1
+            self.file.truncate(page_size * 16)
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+            self.write_header()
+        else:
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+            if len(self.mm) >= DISK_HEADER.size:
+                magic, version, self.page_size, self.count, self.root, self.free_page_number, self.page_count = \
+                    DISK_HEADER.unpack_from(self.mm, 0)
+            if len(self.mm) < DISK_HEADER.size or magic != DISK_MAGIC or version != DISK_VERSION:
+                # Not written by DiskTree: close without writing a header into it
+                self.mm.close()
+                self.file.close()
+                raise ValueError(f"{file_path} is not an employee disk tree file")
+        # Largest number of keys of an inner page
+        self.max_keys = (self.page_size - PAGE_HEADER.size - 4) // 12
+
+    @classmethod
+    def from_records(cls, file_path, records, presorted=False, **kwargs):
+        """Write employee records (list of dictionary as loaded from file) to a new disk tree file"""
+        rows = [record_row(i) for i in records]
+        return cls.from_rows(file_path, rows, presorted, **kwargs)
+
+    @classmethod
+    def from_rows(cls, file_path, rows, presorted=False, **kwargs):
+        """Write (ID, Name, Date of Birth, Place of Birth) rows to disk tree file, replacing its employees"""
+        rows = list(rows)
+        if not presorted:
+            rows.sort(key=lambda row: row[0])
+
+        tree = cls(file_path, **kwargs)
+        # Drop duplicated IDs, keep the first one like add_employee does
+        tree.rebuild(unique_rows(rows))
+        return tree
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_employee(self, id, name, dob, pob):
+        """Add new employee to tree, return True if added, False if ID existed or is not a number"""
+        id = parse_id(id)
+        if id is None:
+            print("Invalid ID.")
+            return False
+        return self.insert(self.root, id, name, dob, pob)
+
+    def allocate_page(self):
+        """Return number of a free page, the file grows (doubling) when all its pages are used"""
+        if self.free_page_number:
+            number = self.free_page_number
+            self.free_page_number = PAGE_HEADER.unpack_from(self.mm, number * self.page_size)[3]
+            return number
+        number = self.page_count
+        self.page_count += 1
+        if self.page_count * self.page_size > len(self.mm):
+            self.mm.close()
+            self.file.truncate(2 * self.page_count * self.page_size)
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+        return number
+
+    def breadth_first_search(self, node):
+        """All employees are in leaves on the last level, so level order is ID order"""
+        return list(self.iter_bfs(node))
+
+    def close(self):
+        """Write header and mapped pages to disk and close file, unused space at the end of file is given back"""
+        if self.file.closed:
+            return
+        self.flush()
+        self.mm.close()
+        self.file.truncate(self.page_count * self.page_size)
+        self.file.close()
+
+    def decode_page(self, number):
+        """Decode page from mapped file"""
+        offset = number * self.page_size
+        kind, count, prev, next, text_size = PAGE_HEADER.unpack_from(self.mm, offset)
+        offset += PAGE_HEADER.size
+        if kind == INNER:
+            values = struct.unpack_from(f"<{count}q{count + 1}I", self.mm, offset)
+            return DiskPage(number, False, list(values[:count]), list(values[count:]))
+
+        page = DiskPage(number, True)
+        page.prev, page.next = prev, next
+        page.used = PAGE_HEADER.size + RECORD_SIZE * count + text_size
+        values = struct.unpack_from(f"<{count}q{3 * count}H", self.mm, offset)
+        page.keys = list(values[:count])
+        offset += RECORD_SIZE * count
+        text = self.mm[offset:offset + text_size].decode("utf-8")
+        # Cut text into Name, Date of Birth, Place of Birth of each employee
+        bounds = list(accumulate(values[count:], initial=0))
+        strings = [text[start:end] for start, end in zip(bounds, islice(bounds, 1, None))]
+        page.children = list(map(Employee, page.keys, strings[0::3], strings[1::3], strings[2::3]))
+        return page
+
+    def delete_node(self, node):
+        """Delete employee of a node (found by its ID) from tree"""
+        if not node:
+            return False
+        return self.remove_employee(node.id)
+
+    def encode_page(self, page):
+        """Write page into mapped file"""
+        offset = page.number * self.page_size
+        if not page.leaf:
+            count = len(page.keys)
+            PAGE_HEADER.pack_into(self.mm, offset, INNER, count, 0, 0, 0)
+            struct.pack_into(f"<{count}q{count + 1}I", self.mm, offset + PAGE_HEADER.size, *page.keys,
+                             *page.children)
+            return
+        count = len(page.children)
+        lengths = []
+        for employee in page.children:
+            lengths += (len(employee.name), len(employee.dob), len(employee.pob))
+        text = "".join([employee.name + employee.dob + employee.pob for employee in page.children]).encode("utf-8")
+        data = (PAGE_HEADER.pack(LEAF, count, page.prev, page.next, len(text)) +
+                struct.pack(f"<{count}q{3 * count}H", *page.keys, *lengths) + text)
+        self.mm[offset:offset + len(data)] = data
+
+    def fits(self, page):
+        """Whether page fits in page_size bytes"""
+        return page.used <= self.page_size if page.leaf else len(page.keys) <= self.max_keys
+
+    def flush(self):
+        """Write header and changed mapped pages to disk"""
+        self.write_header()
+        self.mm.flush()
+
+    def free_page(self, number):
+        """Put page in the list of free pages"""
+        self.cache.pop(number)
+        PAGE_HEADER.pack_into(self.mm, number * self.page_size, FREE, 0, 0, self.free_page_number, 0)
+        self.free_page_number = number
+
+    def get_size(self, root):
+        """Return number of employees under a page (i.e. whole tree: self.root)"""
+        if root == self.root:
+            return self.count
+        return sum(1 for _ in self.iter_inorder(root))
+
+    def inorder_traverse(self, node):
+        """Traversal of subtree/tree in ID order, return list of employees"""
+        return list(self.iter_inorder(node))
+
+    def insert(self, root, id, name, dob, pob, quiet=False):
+        """
+        Insert employee into its leaf, split pages which do not fit on the way back up (root is always self.root).
+        Return True if inserted, False if ID existed (notify unless quiet)
+        """
+        employee = Employee(id, name, dob, pob)
+        size = record_size(employee)
+        if PAGE_HEADER.size + size > self.page_size:
+            raise ValueError(f"Employee {id} does not fit in a page of {self.page_size} bytes")
+
+        if not self.root:
+            page = DiskPage(self.allocate_page(), True)
+            page.used = PAGE_HEADER.size
+            self.root = page.number
+        else:
+            page = self.read_page(self.root)
+
+        # Walk down to the leaf, remember inner pages and the child taken in each
+        path = []
+        while not page.leaf:
+            position = bisect_right(page.keys, id)
+            path.append((page, position))
+            page = self.read_page(page.children[position])
+
+        position = bisect_left(page.keys, id)
+        if position < len(page.keys) and page.keys[position] == id:
+            if not quiet:
+                print("Invalid ID.")
+            return False
+
+        page.keys.insert(position, id)
+        page.children.insert(position, employee)
+        page.used += size
+        self.count += 1
+
+        # Split pages which do not fit, the new right half goes next to them in their parent
+        while not self.fits(page):
+            sibling, separator = self.split(page)
+            if not path:
+                root = DiskPage(self.allocate_page(), False, [separator], [page.number, sibling.number])
+                self.write_page(root)
+                self.root = root.number
+                break
+            parent, position = path.pop()
+            parent.keys.insert(position, separator)
+            parent.children.insert(position + 1, sibling.number)
+            page = parent
+        else:
+            self.write_page(page)
+        self.write_header()
+        return True
+
+    def iter_bfs(self, node):
+        """All employees are in leaves on the last level, so level order is ID order"""
+        return self.iter_inorder(node)
+
+    def iter_inorder(self, node):
+        """Yield employees under a page (i.e. whole tree: self.root) in ID order, leaf after leaf"""
+        if not node:
+            return
+        # First and last leaf under the page
+        first = last = self.read_page(node)
+        while not first.leaf:
+            first = self.read_page(first.children[0])
+        while not last.leaf:
+            last = self.read_page(last.children[-1])
+        page = first
+        while True:
+            yield from page.children
+            if page.number == last.number:
+                return
+            page = self.read_page(page.next, cache=False)
+
+    def iter_range(self, low=None, high=None, include_low=True):
+        """Yield employees whose ID is from low to high (None means no limit) in ID order, leaf after leaf"""
+        if not self.root:
+            return
+        page = self.read_page(self.root)
+        while not page.leaf:
+            page = self.read_page(page.children[0 if low is None else bisect_right(page.keys, low)])
+        if low is None:
+            position = 0
+        elif include_low:
+            position = bisect_left(page.keys, low)
+        else:
+            position = bisect_right(page.keys, low)
+
+        while True:
+            for employee in page.children[position:]:
+                if high is not None and employee.id > high:
+                    return
+                yield employee
+            if not page.next:
+                return
+            page = self.read_page(page.next, cache=False)
+            position = 0
+
+    def iter_records(self, node):
+        """Yield employee data of tree in ID order as dictionary in file format"""
+        for employee in self.iter_inorder(node):
+            yield node_record(employee)
+
+    def read_page(self, number, cache=True):
+        """
+        Return decoded page from page cache, or decode it from mapped file and cache it.
+        With cache=False (leaf scans) a page which is not cached is decoded without being cached
+        """
+        page = self.cache.get(number)
+        if page is None:
+            page = self.decode_page(number)
+            if cache:
+                self.cache.put(number, page)
+        return page
+
+    def read_tree(self, traversal_result):
+        """Print ID of employees and the leaf page holding each of them"""
+        for employee in traversal_result:
+            page = self.read_page(self.root)
+            while not page.leaf:
+                page = self.read_page(page.children[bisect_right(page.keys, employee.id)])
+            print(f"ID: {employee.id:<5} | Leaf page: {page.number} ({len(page.keys)} employees)")
+
+    def rebuild(self, rows):
+        """Replace all employees by ID sorted rows of unique IDs: leaves are written one after another, 3/4 full"""
+        self.cache.clear()
+        self.count = len(rows)
+        self.root = self.free_page_number = 0
+        self.page_count = 1
+
+        # Leaves: add employees until 3/4 of page is used
+        level = []
+        page = None
+        limit = self.page_size * 3 // 4
+        for row in rows:
+            employee = Employee(*row)
+            size = record_size(employee)
+            if PAGE_HEADER.size + size > self.page_size:
+                raise ValueError(f"Employee {employee.id} does not fit in a page of {self.page_size} bytes")
+            if page is None or page.used + size > limit:
+                if page is not None:
+                    level.append(page)
+                page = DiskPage(self.allocate_page(), True)
+                page.used = PAGE_HEADER.size
+                if level:
+                    page.prev, level[-1].next = level[-1].number, page.number
+            page.keys.append(employee.id)
+            page.children.append(employee)
+            page.used += size
+        if page is not None:
+            level.append(page)
+        for page in level:
+            self.encode_page(page)
+
+        # Inner levels until one page is left, separator of a child is the smallest ID under it
+        smallest = [page.keys[0] for page in level]
+        fanout = self.max_keys * 3 // 4 + 1
+        while len(level) > 1:
+            pages, page_smallest = [], []
+            start = 0
+            while start < len(level):
+                # Do not leave a last page with a single child
+                end = len(level) if len(level) - start <= fanout + 1 else start + fanout
+                page = DiskPage(self.allocate_page(), False, smallest[start + 1:end],
+                                [child.number for child in level[start:end]])
+                self.encode_page(page)
+                pages.append(page)
+                page_smallest.append(smallest[start])
+                start = end
+            level, smallest = pages, page_smallest
+        self.root = level[0].number if level else 0
+        self.write_header()
+
+    def remove_employee(self, id):
+        """Remove employee by ID, return True if removed, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None or not self.root:
+            return False
+        path = []
+        page = self.read_page(self.root)
+        while not page.leaf:
+            position = bisect_right(page.keys, id)
+            path.append((page, position))
+            page = self.read_page(page.children[position])
+        position = bisect_left(page.keys, id)
+        if position == len(page.keys) or page.keys[position] != id:
+            return False
+
+        page.used -= record_size(page.children[position])
+        del page.keys[position]
+        del page.children[position]
+        self.count -= 1
+        if page.children:
+            self.write_page(page)
+            self.write_header()
+            return True
+
+        # Leaf is empty: take it out of the leaf chain and free it, then drop it (and emptied parents) from parents
+        if page.prev:
+            previous_page = self.read_page(page.prev)
+            previous_page.next = page.next
+            self.write_page(previous_page)
+        if page.next:
+            next_page = self.read_page(page.next)
+            next_page.prev = page.prev
+            self.write_page(next_page)
+        self.free_page(page.number)
+        while path:
+            parent, position = path.pop()
+            del parent.children[position]
+            if parent.keys:
+                del parent.keys[max(position - 1, 0)]
+            if parent.children:
+                self.write_page(parent)
+                break
+            self.free_page(parent.number)
+        else:
+            self.root = 0
+
+        # Root with 1 child is not needed
+        while self.root:
+            root = self.read_page(self.root)
+            if root.leaf or len(root.children) > 1:
+                break
+            self.free_page(root.number)
+            self.root = root.children[0]
+        self.write_header()
+        return True
+
+    def search(self, id, root):
+        """Search for an employee by ID under a page (i.e. start from root: self.root), False if it does not exist"""
+        if not root:
+            return False
+        page = self.read_page(root)
+        while not page.leaf:
+            page = self.read_page(page.children[bisect_right(page.keys, id)])
+        position = bisect_left(page.keys, id)
+        if position < len(page.keys) and page.keys[position] == id:
+            return page.children[position]
+        return False
+
+    # Employee data is printed the same way as BinarySearchTree
+    show = BinarySearchTree.show
+
+    def split(self, page):
+        """Move the right half of page to a new page, write both, return (new page, smallest ID under new page)"""
+        sibling = DiskPage(self.allocate_page(), page.leaf)
+        if page.leaf:
+            # Split where the bigger half is smallest in bytes
+            sizes = [record_size(employee) for employee in page.children]
+            total = sum(sizes)
+            left = 0
+            best = None
+            for position in range(1, len(sizes)):
+                left += sizes[position - 1]
+                if best is None or max(left, total - left) < best[0]:
+                    best = (max(left, total - left), position)
+            half = best[1]
+            sibling.keys, sibling.children = page.keys[half:], page.children[half:]
+            del page.keys[half:]
+            del page.children[half:]
+            page.used = PAGE_HEADER.size + sum(record_size(employee) for employee in page.children)
+            sibling.used = PAGE_HEADER.size + sum(record_size(employee) for employee in sibling.children)
+            separator = sibling.keys[0]
+            sibling.prev, sibling.next = page.number, page.next
+            if page.next:
+                next_page = self.read_page(page.next)
+                next_page.prev = sibling.number
+                self.write_page(next_page)
+            page.next = sibling.number
+        else:
+            # Key between the halves moves up to parent
+            half = len(page.children) // 2
+            separator = page.keys[half - 1]
+            sibling.keys, sibling.children = page.keys[half:], page.children[half:]
+            del page.keys[half - 1:]
+            del page.children[half:]
+        self.write_page(page)
+        self.write_page(sibling)
+        return sibling, separator
+
+    def verify(self):
+        """
+        Check structure of file: key order, separators, page fill, leaves on one level, leaf links,
+        number of employees and free pages. Return number of employees, raise AssertionError if something is broken
+        """
+        leaves = []
+        leaf_depths = set()
+        reachable = 0
+        # (page number, depth, smallest allowed ID, ID limit) of pages to check
+        stack = [(self.root, 0, None, None)] if self.root else []
+        while stack:
+            number, depth, low, high = stack.pop()
+            page = self.decode_page(number)
+            reachable += 1
+            assert page.keys == sorted(set(page.keys)), f"Keys of page {number} are not in order"
+            assert all((low is None or key >= low) and (high is None or key < high) for key in page.keys), \
+                f"Key out of separator range in page {number}"
+            assert self.fits(page), f"Page {number} is too big"
+            # Every change is written through, so a cached page is the same as the file
+            cached = self.cache.get(number)
+            if cached is not None:
+                assert cached.keys == page.keys, f"Cached page {number} differs from file"
+                if page.leaf:
+                    assert [(e.name, e.dob, e.pob) for e in cached.children] == \
+                           [(e.name, e.dob, e.pob) for e in page.children], f"Cached page {number} differs from file"
+                else:
+                    assert cached.children == page.children, f"Cached page {number} differs from file"
+            if page.leaf:
+                assert page.children, f"Leaf page {number} is empty"
+                leaves.append(page)
+                leaf_depths.add(depth)
+                continue
+            assert len(page.children) == len(page.keys) + 1, f"Inner page {number} has wrong number of keys"
+            bounds = [low] + page.keys + [high]
+            for i in reversed(range(len(page.children))):
+                stack.append((page.children[i], depth + 1, bounds[i], bounds[i + 1]))
+
+        assert len(leaf_depths) <= 1, "Leaves are not on the same level"
+        numbers = [0] + [leaf.number for leaf in leaves] + [0]
+        for i, leaf in enumerate(leaves):
+            assert leaf.prev == numbers[i] and leaf.next == numbers[i + 2], f"Wrong leaf link of page {leaf.number}"
+        assert sum(len(leaf.children) for leaf in leaves) == self.count, "Wrong number of employees"
+
+        free = 0
+        number = self.free_page_number
+        while number:
+            kind, _, _, number, _ = PAGE_HEADER.unpack_from(self.mm, number * self.page_size)
+            assert kind == FREE, "Used page in free list"
+            free += 1
+        assert reachable + free == self.page_count - 1, "Pages are lost"
+        return self.count
+
+    def write_header(self):
+        DISK_HEADER.pack_into(self.mm, 0, DISK_MAGIC, DISK_VERSION, self.page_size, self.count, self.root,
+                              self.free_page_number, self.page_count)
+
+    def write_page(self, page):
+        """Write changed page into mapped file, page cache holds this decoded page from now on"""
+        self.encode_page(page)
+        self.cache.pop(page.number)
+        self.cache.put(page.number, page)
+
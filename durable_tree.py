@@ -0,0 +1,293 @@
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+from binary_search_tree import BinarySearchTree
+from employee_record import parse_id
+from read_write_file import read_snapshot, write_snapshot
+
+# Log record on disk: frame header (payload length, crc32 of payload), then payload.
+# Payload: operation (b"A" add / b"R" remove), ID, and for add: Name, Date of Birth, Place of Birth
+# each as a length-prefixed utf-8 string
+FRAME_HEADER = struct.Struct("<II")
+OPERATION = struct.Struct("<cq")
+TEXT_LENGTH = struct.Struct("<H")
+MAX_TEXT_SIZE = 2 ** 16 - 1
+
+SNAPSHOT_FILE = re.compile(r"snapshot\.(\d+)\.bin$")
+LOG_FILE = re.compile(r"wal\.(\d+)\.log$")
+
+
+def encode_add(id, name, dob, pob):
+    """Return log payload of an add operation, raise ValueError if a text is too long for its length field"""
+    parts = [OPERATION.pack(b"A", id)]
+    for text in (name, dob, pob):
+        data = text.encode("utf-8")
+        if len(data) > MAX_TEXT_SIZE:
+            raise ValueError(f"Employee data longer than {MAX_TEXT_SIZE} bytes cannot be saved")
+        parts.append(TEXT_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def encode_remove(id):
+    """Return log payload of a remove operation"""
+    return OPERATION.pack(b"R", id)
+
+
+def decode(payload):
+    """Return (operation, ID, texts) of a log payload"""
+    operation, id = OPERATION.unpack_from(payload, 0)
+    texts = []
+    position = OPERATION.size
+    while position < len(payload):
+        (length,) = TEXT_LENGTH.unpack_from(payload, position)
+        position += TEXT_LENGTH.size
+        texts.append(payload[position:position + length].decode("utf-8"))
+        position += length
+    return operation, id, texts
+
+
+def read_log(file_path):
+    """
+    Yield payloads of a log file in order. Reading stops at the first incomplete or corrupted record
+    (i.e. the last write before a crash), return value of the generator is the size of the valid part
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    position = 0
+    while position + FRAME_HEADER.size <= len(data):
+        length, checksum = FRAME_HEADER.unpack_from(data, position)
+        start = position + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        yield payload
+        position = start + length
+    return position
+
+
+class DurableEmployeeTree:
+    """
+    BinarySearchTree whose changes survive a crash. Every add/remove is appended to a write-ahead log,
+    which is flushed to disk (fsync) in groups: every sync_every records or sync_interval seconds.
+    On start, the latest snapshot is loaded and the logs written after it are replayed.
+    Compaction writes a new snapshot in background and starts a new log, so logs do not grow forever.
+
+    Files in directory: snapshot.<g>.bin holds all changes of logs before generation g, wal.<g>.log is log g
+    """
+    def __init__(self, directory, sync_every=64, sync_interval=0.05, compact_bytes=64 * 2 ** 20):
+        self.directory = directory
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        # Log size which starts a compaction automatically (None: only compact() starts it)
+        self.compact_bytes = compact_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # Lock protects tree and log, since the sync and compaction threads use them too
+        self.lock = threading.RLock()
+        self.tree = BinarySearchTree()
+        self.generation = 0
+        self.log = None
+        self.log_size = 0
+        self.unsynced = 0
+        self.compaction = None
+        self.closed = False
+
+        self.recover()
+        self.syncer = threading.Thread(target=self.sync_periodically, daemon=True)
+        self.syncer.start()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def files(self, pattern):
+        """Return {generation: file name} of files in directory matching pattern"""
+        found = {}
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                found[int(match.group(1))] = name
+        return found
+
+    def recover(self):
+        """Load the latest snapshot, replay logs written after it, then open a log for new changes"""
+        snapshots = self.files(SNAPSHOT_FILE)
+        logs = self.files(LOG_FILE)
+        base = max(snapshots) if snapshots else 0
+        if snapshots:
+            self.tree = BinarySearchTree.from_rows(read_snapshot(self.path(snapshots[base])), presorted=True)
+
+        # New changes go to a log of generation >= base even if no log of the snapshot is left (i.e. a crash
+        # after the snapshot was written and older logs removed), logs older than base are skipped by recovery
+        self.generation = base
+
+        # Replay every log of generation >= base in order
+        for generation in sorted(g for g in logs if g >= base):
+            file_path = self.path(logs[generation])
+            reader = read_log(file_path)
+            while True:
+                try:
+                    payload = next(reader)
+                except StopIteration as stop:
+                    valid_size = stop.value
+                    break
+                self.apply(payload)
+            # Cut a torn record at the end of log left by a crash
+            if valid_size < os.path.getsize(file_path):
+                with open(file_path, "r+b") as f:
+                    f.truncate(valid_size)
+            self.generation = generation
+
+        # Files older than the snapshot are not needed any more (i.e. a crash happened during clean up)
+        self.remove_old_files(base)
+        self.open_log(self.generation)
+
+    def apply(self, payload):
+        """Apply a log record to tree"""
+        operation, id, texts = decode(payload)
+        if operation == b"A":
+            self.tree.insert(self.tree.root, id, *texts, quiet=True)
+        else:
+            node = self.tree.search(id, self.tree.root)
+            if node:
+                self.tree.delete_node(node)
+
+    def open_log(self, generation):
+        """Open log of a generation to append new records"""
+        self.generation = generation
+        self.log = open(self.path(f"wal.{generation}.log"), "ab")
+        self.log_size = self.log.tell()
+        if self.log_size == 0:
+            # New file: its directory entry must be on disk too, or records fsynced to it can be lost
+            self.sync_directory()
+
+    def sync_directory(self):
+        """Write directory entries (created, renamed, removed files) to disk, where the system allows it"""
+        try:
+            descriptor = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            # Directories cannot be opened on Windows, where renames are durable on their own
+            return
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def append(self, payload):
+        """Append a record to log, flush to disk when enough records are waiting"""
+        self.log.write(FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.log_size += FRAME_HEADER.size + len(payload)
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def compact_if_needed(self):
+        """Start a compaction when log has grown to compact_bytes (called after tree has the logged change)"""
+        if self.compact_bytes is not None and self.log_size >= self.compact_bytes:
+            self.compact()
+
+    def sync(self):
+        """Write waiting log records to disk"""
+        with self.lock:
+            if self.unsynced and self.log is not None:
+                self.log.flush()
+                os.fsync(self.log.fileno())
+                self.unsynced = 0
+
+    def sync_periodically(self):
+        """Background thread: flush waiting records at least every sync_interval seconds"""
+        while not self.closed:
+            time.sleep(self.sync_interval)
+            self.sync()
+
+    def add_employee(self, id, name, dob, pob):
+        """Add new employee, return True if added, False if ID existed or is not a number or cannot be logged"""
+        id = parse_id(id)
+        if id is None:
+            print("Invalid ID.")
+            return False
+        # Encode before anything is changed, so data which cannot be logged leaves tree and log as they are
+        try:
+            payload = encode_add(id, name, dob, pob)
+        except (ValueError, struct.error) as error:
+            print(error)
+            return False
+        with self.lock:
+            if self.tree.search(id, self.tree.root):
+                print("Invalid ID.")
+                return False
+            # Log first, then change tree
+            self.append(payload)
+            self.tree.insert(self.tree.root, id, name, dob, pob, quiet=True)
+            self.compact_if_needed()
+            return True
+
+    def remove_employee(self, id):
+        """Remove employee by ID, return True if removed, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None:
+            return False
+        with self.lock:
+            node = self.tree.search(id, self.tree.root)
+            if not node:
+                return False
+            self.append(encode_remove(id))
+            self.tree.delete_node(node)
+            self.compact_if_needed()
+            return True
+
+    def compact(self, wait=False):
+        """
+        Fold logs into a new snapshot. Rows of tree are copied and a new log generation is started under lock,
+        then the snapshot is written by a background thread while new changes go to the new log
+        """
+        with self.lock:
+            # Only one compaction at a time
+            if self.compaction is not None and self.compaction.is_alive():
+                if wait:
+                    self.compaction.join()
+                return
+            rows = [(node.id, node.name, node.dob, node.pob) for node in self.tree.iter_inorder(self.tree.root)]
+            self.sync()
+            self.log.close()
+            self.open_log(self.generation + 1)
+            self.compaction = threading.Thread(target=self.write_compacted, args=(rows, self.generation))
+            self.compaction.start()
+        if wait:
+            self.compaction.join()
+
+    def write_compacted(self, rows, generation):
+        """Write snapshot of a generation safely (temporary file, fsync, rename), then remove older files"""
+        temporary_path = self.path(f"snapshot.{generation}.tmp")
+        write_snapshot(temporary_path, rows)
+        with open(temporary_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.path(f"snapshot.{generation}.bin"))
+        # New snapshot name must be on disk before older files it replaces are removed
+        self.sync_directory()
+        self.remove_old_files(generation)
+
+    def remove_old_files(self, generation):
+        """Remove snapshots and logs older than a generation"""
+        for pattern in (SNAPSHOT_FILE, LOG_FILE):
+            for old_generation, name in self.files(pattern).items():
+                if old_generation < generation:
+                    os.remove(self.path(name))
+
+    def close(self):
+        """Flush log, finish running compaction, stop sync thread and close log (closing again does nothing)"""
+        if self.compaction is not None:
+            self.compaction.join()
+        with self.lock:
+            if self.closed:
+                return
+            self.sync()
+            self.closed = True
+            self.log.close()
+            self.log = None
+        self.syncer.join()
+
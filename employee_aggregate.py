@@ -0,0 +1,188 @@
+from collections import Counter
+from datetime import date
+from operator import attrgetter
+
+from employee_record import dob_day
+
+# NumPy is optional, it is only used by the columnar path of whole-roster aggregates
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Fields employees can be grouped by, and ways to bucket Date of Birth ("age" buckets are years wide, by=width)
+FIELDS = ("name", "dob", "pob", "age")
+DOB_BUCKETS = ("day", "month", "year", "decade")
+# Ordinal day of 01/01/1970: NumPy dates count days from it
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+
+def age_on(day, today):
+    """Age in full years on date today of an employee born on ordinal day"""
+    born = date.fromordinal(day)
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+class EmployeeColumns:
+    """
+    Columns (NumPy arrays in ID order) of all employees of a tree: ID, Date of Birth as ordinal day
+    (0 if it is not a valid date) and Place of Birth code (index in places).
+    Aggregates over them run in C instead of visiting every node in Python
+    """
+    def __init__(self, nodes, parser=None):
+        nodes = list(nodes)
+        count = len(nodes)
+        self.ids = np.fromiter((node.id for node in nodes), dtype=np.int64, count=count)
+        self.days = np.fromiter((dob_day(node.dob) or 0 for node in nodes), dtype=np.int64, count=count)
+        if parser is not None:
+            # Typed tree: codes were given when employees were added
+            self.places = list(parser.places)
+            self.codes = np.fromiter((node.pob.code for node in nodes), dtype=np.int64, count=count)
+        else:
+            codes = {}
+            self.codes = np.fromiter((codes.setdefault(node.pob, len(codes)) for node in nodes), dtype=np.int64,
+                                     count=count)
+            self.places = list(codes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, low=None, high=None):
+        """Return (start, end) positions of employees whose ID is from low to high (both included, None: no limit)"""
+        start = 0 if low is None else int(np.searchsorted(self.ids, low, side="left"))
+        end = len(self.ids) if high is None else int(np.searchsorted(self.ids, high, side="right"))
+        return start, max(start, end)
+
+    def count(self, field, by=None, today=None, low=None, high=None):
+        """Same as GroupBy(...).count() on the employees of these columns"""
+        start, end = self.positions(low, high)
+        if field == "pob":
+            counts = np.bincount(self.codes[start:end], minlength=len(self.places))
+            return dict(sorted((self.places[code], int(counts[code])) for code in np.flatnonzero(counts).tolist()))
+
+        days = self.days[start:end]
+        days = days[days > 0]
+        # Dates from ordinal days: the first of month and first of year of each date give month, year and day
+        dates = (days - EPOCH_DAY).astype("datetime64[D]")
+        months = dates.astype("datetime64[M]")
+        years = months.astype("datetime64[Y]").astype(np.int64) + 1970
+        if field == "age":
+            today = today or date.today()
+            month = months.astype(np.int64) % 12 + 1
+            day = (dates - months).astype(np.int64) + 1
+            # Birthday of this year is not reached yet: one year younger
+            keys = today.year - years - (today.month * 32 + today.day < month * 32 + day)
+            keys = keys // (by or 1) * (by or 1)
+        elif by == "day":
+            keys = days
+        elif by == "month":
+            keys = months.astype(np.int64)
+        elif by == "decade":
+            keys = years // 10 * 10
+        else:
+            keys = years
+
+        values, counts = np.unique(keys, return_counts=True)
+        values = values.tolist()
+        if field == "dob" and by == "day":
+            values = [date.fromordinal(value) for value in values]
+        elif field == "dob" and by == "month":
+            values = [(value // 12 + 1970, value % 12 + 1) for value in values]
+        return dict(zip(values, counts.tolist()))
+
+
+class GroupBy:
+    """
+    Employees of a tree (or of an ID range of it) grouped by a field, made by BinarySearchTree.group_by:
+    "name", "pob" (Place of Birth), "dob" (Date of Birth by "day", "month", "year" (default) or "decade")
+    or "age" (on date today, in buckets of by years). Employees whose Date of Birth is not a valid date
+    are left out of "dob" and "age" groups. Groups are in key order
+    """
+    def __init__(self, tree, field, by=None, low=None, high=None, today=None):
+        if field not in FIELDS:
+            raise ValueError(f"Field must be one of {', '.join(FIELDS)}")
+        if field == "dob" and by is None:
+            by = "year"
+        if field == "dob" and by not in DOB_BUCKETS:
+            raise ValueError(f"Date of Birth buckets must be one of {', '.join(DOB_BUCKETS)}")
+        if field == "age" and by is not None and (not isinstance(by, int) or by < 1):
+            raise ValueError("Age buckets must be a number of years >= 1")
+        self.tree = tree
+        self.field = field
+        # Node attribute whose value gives the group ("age" is worked out from Date of Birth)
+        self.attribute = "dob" if field == "age" else field
+        self.by = by
+        self.low = low
+        self.high = high
+        self.today = today or date.today()
+
+    def key_function(self):
+        """
+        Return function which gives group key of a field value (None: employee is left out).
+        Keys are worked out once per distinct value, since many employees share a Date of Birth or Place of Birth
+        """
+        field, by, today = self.field, self.by, self.today
+        if field in ("name", "pob"):
+            return lambda value: value
+        if field == "age":
+            width = by or 1
+
+            def key(dob):
+                day = dob_day(dob)
+                return None if day is None else age_on(day, today) // width * width
+            return key
+
+        def key(dob):
+            day = dob_day(dob)
+            if day is None:
+                return None
+            born = date.fromordinal(day)
+            if by == "day":
+                return born
+            if by == "month":
+                return born.year, born.month
+            return born.year // 10 * 10 if by == "decade" else born.year
+        return key
+
+    def nodes_in_range(self):
+        """Yield nodes of the ID range in ID order"""
+        if self.low is None and self.high is None:
+            return self.tree.iter_inorder(self.tree.root)
+        return self.tree.iter_range(self.low, self.high)
+
+    def count(self):
+        """
+        Return {group key: number of employees}. Place, Date of Birth and age groups are counted on NumPy columns
+        of the tree when NumPy is installed and the columns are built (they are for whole-roster aggregates),
+        otherwise nodes of the range are visited once
+        """
+        if self.field != "name" and np is not None:
+            columns = self.tree.columns
+            if columns is None and self.low is None and self.high is None:
+                columns = self.tree.employee_columns()
+            if columns is not None:
+                return columns.count(self.field, self.by, self.today, self.low, self.high)
+
+        key = self.key_function()
+        counts = {}
+        for value, count in Counter(map(attrgetter(self.attribute), self.nodes_in_range())).items():
+            value = key(value)
+            if value is not None:
+                counts[value] = counts.get(value, 0) + count
+        return dict(sorted(counts.items()))
+
+    def nodes(self):
+        """Return {group key: list of employee nodes in ID order}"""
+        key = self.key_function()
+        keys = {}
+        groups = {}
+        attribute = self.attribute
+        for node in self.nodes_in_range():
+            value = getattr(node, attribute)
+            if value not in keys:
+                keys[value] = key(value)
+            group = keys[value]
+            if group is not None:
+                groups.setdefault(group, []).append(node)
+        return dict(sorted(groups.items()))
+
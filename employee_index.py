@@ -0,0 +1,159 @@
+from bisect import bisect_left, bisect_right, insort
+
+from employee_record import dob_day, parse_dob
+
+
+class SortedIndex:
+    """
+    Sorted list of (key, ID, node) entries split into chunks, so adding/removing an entry only shifts
+    one small chunk and lookups are a binary search on chunk maximums then inside one chunk
+    """
+    def __init__(self, entries=(), chunk_size=512):
+        self.chunk_size = chunk_size
+        entries = sorted(entries, key=lambda entry: entry[:2])
+        # Chunks of sorted entries and the (key, ID) of last entry of each chunk
+        self.chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+        self.maxes = [chunk[-1][:2] for chunk in self.chunks]
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def add(self, key, id, node):
+        """Add an entry"""
+        entry = (key, id, node)
+        # First entry of the index
+        if not self.chunks:
+            self.chunks.append([entry])
+            self.maxes.append((key, id))
+            return
+
+        # Find the chunk to put entry in, entry bigger than everything goes to the last chunk
+        position = bisect_left(self.maxes, (key, id))
+        if position == len(self.chunks):
+            position -= 1
+            self.maxes[position] = (key, id)
+        chunk = self.chunks[position]
+        insort(chunk, entry, key=lambda item: item[:2])
+
+        # Split chunk into 2 halves when it is too big
+        if len(chunk) > 2 * self.chunk_size:
+            half = len(chunk) // 2
+            self.chunks[position:position + 1] = [chunk[:half], chunk[half:]]
+            self.maxes[position:position + 1] = [chunk[half - 1][:2], chunk[-1][:2]]
+
+    def find(self, key, id):
+        """Return (chunk number, position in chunk) of entry (key, ID), None if there is no such entry"""
+        position = bisect_left(self.maxes, (key, id))
+        if position == len(self.chunks):
+            return None
+        chunk = self.chunks[position]
+        index = bisect_left(chunk, (key, id), key=lambda item: item[:2])
+        if index < len(chunk) and chunk[index][:2] == (key, id):
+            return position, index
+        return None
+
+    def remove(self, key, id):
+        """Remove entry (key, ID) if it exists"""
+        found = self.find(key, id)
+        if found is None:
+            return
+        position, index = found
+        chunk = self.chunks[position]
+        del chunk[index]
+
+        # Drop empty chunk, otherwise update maximum of chunk
+        if not chunk:
+            del self.chunks[position]
+            del self.maxes[position]
+        else:
+            self.maxes[position] = chunk[-1][:2]
+
+    def replace_node(self, key, id, node):
+        """Point entry (key, ID) to another node (when employee data is moved to another node)"""
+        found = self.find(key, id)
+        if found is not None:
+            position, index = found
+            self.chunks[position][index] = (key, id, node)
+
+    def range(self, low, high, include_high=True):
+        """Yield nodes whose key is from low to high, in (key, ID) order, None means no limit"""
+        # Start from the first entry whose key >= low
+        if low is None:
+            position, index = 0, 0
+        else:
+            position = bisect_left(self.maxes, (low,))
+            index = 0
+            if position < len(self.chunks):
+                index = bisect_left(self.chunks[position], (low,), key=lambda item: item[:1])
+
+        # Walk entries in order until key passes high
+        while position < len(self.chunks):
+            chunk = self.chunks[position]
+            while index < len(chunk):
+                key, id, node = chunk[index]
+                if high is not None and (key > high or (key == high and not include_high)):
+                    return
+                yield node
+                index += 1
+            position += 1
+            index = 0
+
+
+class EmployeeIndexes:
+    """Secondary indexes of employees on Name, Date of Birth (as ordinal day) and Place of Birth"""
+    def __init__(self, nodes=()):
+        nodes = list(nodes)
+        self.name = SortedIndex((node.name, node.id, node) for node in nodes)
+        self.dob = SortedIndex((dob_day(node.dob), node.id, node) for node in nodes
+                               if dob_day(node.dob) is not None)
+        self.pob = SortedIndex((node.pob, node.id, node) for node in nodes)
+
+    def add(self, node):
+        """Add employee in node to all indexes"""
+        self.name.add(node.name, node.id, node)
+        dob = dob_day(node.dob)
+        # Date of Birth which is not a valid date is not indexed
+        if dob is not None:
+            self.dob.add(dob, node.id, node)
+        self.pob.add(node.pob, node.id, node)
+
+    def remove(self, node):
+        """Remove employee in node from all indexes"""
+        self.name.remove(node.name, node.id)
+        dob = dob_day(node.dob)
+        if dob is not None:
+            self.dob.remove(dob, node.id)
+        self.pob.remove(node.pob, node.id)
+
+    def move(self, node, new_node):
+        """Employee data of node is moved to new_node, point index entries to new_node"""
+        self.name.replace_node(node.name, node.id, new_node)
+        dob = dob_day(node.dob)
+        if dob is not None:
+            self.dob.replace_node(dob, node.id, new_node)
+        self.pob.replace_node(node.pob, node.id, new_node)
+
+    def find_by_name(self, name):
+        """Return list of nodes with exactly this Name"""
+        return list(self.name.range(name, name))
+
+    def find_by_name_prefix(self, prefix):
+        """Return list of nodes whose Name starts with prefix, in Name order"""
+        result = []
+        for node in self.name.range(prefix, None):
+            if not node.name.startswith(prefix):
+                break
+            result.append(node)
+        return result
+
+    def find_by_dob(self, start=None, end=None):
+        """Return list of nodes born from start to end ("dd/mm/yyyy", both included, None means no limit)"""
+        low = None if start is None else parse_dob(start)
+        high = None if end is None else parse_dob(end)
+        if (start is not None and low is None) or (end is not None and high is None):
+            raise ValueError("Date of Birth must be in dd/mm/yyyy format")
+        return list(self.dob.range(low, high))
+
+    def find_by_pob(self, pob):
+        """Return list of nodes with this Place of Birth, in ID order"""
+        return list(self.pob.range(pob, pob))
@@ -0,0 +1,120 @@
+from datetime import date
+
+# IDs are stored as signed 64-bit integers (log records, snapshots, disk pages, NumPy ID arrays)
+MIN_ID, MAX_ID = -2 ** 63, 2 ** 63 - 1
+
+
+def parse_id(value):
+    """
+    Convert an employee ID (int or text of digits, i.e. typed by user or read from file) to int,
+    None if invalid or out of the signed 64-bit range
+    """
+    if not isinstance(value, int):
+        try:
+            value = int(value.strip())
+        except (ValueError, AttributeError):
+            return None
+    return value if MIN_ID <= value <= MAX_ID else None
+
+
+def parse_dob(dob):
+    """Convert Date of Birth "dd/mm/yyyy" to an ordinal day number (sortable), None if it is not a valid date"""
+    try:
+        day, month, year = dob.split("/")
+        return date(int(year), int(month), int(day)).toordinal()
+    except (ValueError, AttributeError):
+        return None
+
+
+def record_row(record):
+    """Return (ID, Name, Date of Birth, Place of Birth) row with integer ID of an employee record in file format"""
+    id = parse_id(record["ID"])
+    if id is None:
+        raise ValueError(f"Invalid employee ID {record['ID']!r}")
+    return id, record["Name"], record["Date of Birth"], record["Place of Birth"]
+
+
+def row_record(row):
+    """Return employee record in file format (dictionary) of an (ID, Name, Date of Birth, Place of Birth) row"""
+    return {"ID": row[0], "Name": row[1], "Date of Birth": row[2], "Place of Birth": row[3]}
+
+
+def node_record(node):
+    """Return employee record in file format of a node (any employee object with id, name, dob and pob)"""
+    return {"ID": node.id, "Name": node.name, "Date of Birth": node.dob, "Place of Birth": node.pob}
+
+
+def unique_rows(rows):
+    """
+    Return list of ID sorted rows without duplicated IDs: the first row of an ID is kept like add_employee does,
+    every other one is reported as "Invalid ID."
+    """
+    unique = []
+    for row in rows:
+        if unique and unique[-1][0] == row[0]:
+            print("Invalid ID.")
+            continue
+        unique.append(row)
+    return unique
+
+
+def dob_day(dob):
+    """Ordinal day of a Date of Birth: parsed once if it is a BirthDate, parsed now if it is plain text"""
+    return dob.day if isinstance(dob, BirthDate) else parse_dob(dob)
+
+
+class BirthDate(str):
+    """
+    Date of Birth text ("dd/mm/yyyy") which also carries its ordinal day (day, None if not a valid date).
+    It is still the same str for printing, comparing and json, so files are written exactly as they were read
+    """
+    def __new__(cls, text, day):
+        value = super().__new__(cls, text)
+        value.day = day
+        return value
+
+    def __reduce__(self):
+        return BirthDate, (str(self), self.day)
+
+
+class BirthPlace(str):
+    """Place of Birth text which also carries its category code (code: small integer, one per distinct place)"""
+    def __new__(cls, text, code):
+        value = super().__new__(cls, text)
+        value.code = code
+        return value
+
+    def __reduce__(self):
+        return BirthPlace, (str(self), self.code)
+
+
+class RecordParser:
+    """
+    Typed values of a tree: every distinct Date of Birth is parsed once and every distinct Place of Birth
+    gets a code once, then all employees with the same value share one BirthDate/BirthPlace object.
+    Queries compare node.dob.day and node.pob.code (integers) instead of parsing text again
+    """
+    def __init__(self):
+        # {text: BirthDate}, {text: BirthPlace} and places by code
+        self.dates = {}
+        self.place_codes = {}
+        self.places = []
+
+    def date(self, text):
+        """Return the shared BirthDate of a Date of Birth text (a value which is not text is kept as it is)"""
+        if not isinstance(text, str):
+            return text
+        value = self.dates.get(text)
+        if value is None:
+            value = self.dates[text] = BirthDate(text, parse_dob(text))
+        return value
+
+    def place(self, text):
+        """Return the shared BirthPlace of a Place of Birth text, a new place gets the next code"""
+        if not isinstance(text, str):
+            return text
+        value = self.place_codes.get(text)
+        if value is None:
+            value = self.place_codes[text] = BirthPlace(text, len(self.places))
+            self.places.append(value)
+        return value
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+from itertools import islice
+
+from binary_search_tree import BinarySearchTree
+from employee_record import node_record, parse_id
+from read_write_file import read_records
+
+# Protocol: one json object per line.
+# Request:  {"id": <request id>, "op": <operation>, ...arguments}
+#   search   {"ID": 5}                      -> {"id", "ok": true, "result": employee or null}
+#   insert   {"record": {employee}}         -> {"id", "ok": true, "result": true/false}
+#   remove   {"ID": 5}                      -> {"id", "ok": true, "result": true/false}
+#   range    {"low": 1, "high": 100}        -> streamed
+#   traverse {"order": "inorder" / "bfs"}   -> streamed
+#   metrics  {"format": "dict" / "prometheus"} -> {"id", "ok": true, "result": metrics or null if tree has none}
+# Streamed results come as {"id", "ok": true, "chunk": [employees]} lines then {"id", "ok": true, "done": true}.
+# Errors: {"id", "ok": false, "error": message}
+
+
+def employee_id(value):
+    """
+    Integer employee ID of a request, raise ValueError (sent back as an error) if it is not a number
+    or does not fit 64 bits
+    """
+    id = parse_id(value)
+    if id is None:
+        raise ValueError(f"Invalid ID {value!r}")
+    return id
+
+
+class EmployeeServer:
+    """
+    Asyncio server in front of a BinarySearchTree. Searches from all connections are collected
+    and answered in batches, large results are sent in chunks so one client cannot hold the loop
+    """
+    def __init__(self, tree, max_batch=256, chunk_size=500):
+        self.tree = tree
+        self.max_batch = max_batch
+        self.chunk_size = chunk_size
+        # Waiting searches: (ID, future of result)
+        self.searches = None
+        self.batcher = None
+        # Number of search batches answered and searches in them
+        self.batches = 0
+        self.batched_searches = 0
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """Start listening on loopback TCP (or a Unix socket if unix_path is given), return asyncio server"""
+        self.searches = asyncio.Queue()
+        self.batcher = asyncio.create_task(self.answer_searches())
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_client, path=unix_path, limit=2 ** 20)
+        return await asyncio.start_server(self.handle_client, host, port, limit=2 ** 20)
+
+    async def answer_searches(self):
+        """
+        Take all waiting searches (at most max_batch) at once and answer them together:
+        distinct IDs of the batch are looked up in ID order by one search_many call
+        """
+        while True:
+            batch = [await self.searches.get()]
+            while len(batch) < self.max_batch and not self.searches.empty():
+                batch.append(self.searches.get_nowait())
+            ids = sorted({id for id, future in batch})
+            try:
+                found = dict(zip(ids, self.tree.search_many(ids)))
+            except Exception as error:
+                # A failed batch fails its own searches (sent back as errors), the batcher keeps answering the next
+                for id, future in batch:
+                    if not future.done():
+                        future.set_exception(ValueError(f"Search failed: {error!r}"))
+            else:
+                for id, future in batch:
+                    node = found[id]
+                    if not future.done():
+                        future.set_result(node_record(node) if node else None)
+            self.batches += 1
+            self.batched_searches += len(batch)
+            # Let connections run and queue more searches before the next batch
+            await asyncio.sleep(0)
+
+    async def handle_client(self, reader, writer):
+        """Read requests of a connection line by line, answer each one in its own task"""
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self.handle_request(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            # Requests still running when the connection is lost are cancelled, and their errors are collected
+            # here, so no task writes to a closed connection or leaves an exception nobody retrieved
+            pending = list(tasks)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+
+    async def send(self, writer, write_lock, message):
+        async with write_lock:
+            writer.write((json.dumps(message) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    async def handle_request(self, line, writer, write_lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = request.get("op")
+
+            if op == "search":
+                future = asyncio.get_running_loop().create_future()
+                await self.searches.put((employee_id(request["ID"]), future))
+                result = await future
+            elif op == "insert":
+                i = request["record"]
+                result = self.tree.insert(self.tree.root, employee_id(i["ID"]), i["Name"], i["Date of Birth"],
+                                          i["Place of Birth"], quiet=True)
+            elif op == "remove":
+                node = self.tree.search(employee_id(request["ID"]), self.tree.root)
+                result = bool(node)
+                if node:
+                    self.tree.delete_node(node)
+            elif op == "metrics":
+                metrics = self.tree.metrics
+                if metrics is None:
+                    result = None
+                elif request.get("format", "dict") == "prometheus":
+                    result = metrics.prometheus()
+                else:
+                    result = metrics.as_dict()
+            elif op == "range":
+                await self.stream_range(request_id, request.get("low"), request.get("high"), writer, write_lock)
+                return
+            elif op == "traverse":
+                if request.get("order", "inorder") == "bfs":
+                    await self.stream_bfs(request_id, writer, write_lock)
+                else:
+                    await self.stream_range(request_id, None, None, writer, write_lock)
+                return
+            else:
+                raise ValueError(f"Unknown operation {op!r}")
+        except KeyError as error:
+            await self.send(writer, write_lock, {"id": request_id, "ok": False, "error": f"Missing field {error}"})
+            return
+        except (ValueError, TypeError, AttributeError) as error:
+            await self.send(writer, write_lock, {"id": request_id, "ok": False, "error": str(error)})
+            return
+
+        await self.send(writer, write_lock, {"id": request_id, "ok": True, "result": result})
+
+    async def stream_range(self, request_id, low, high, writer, write_lock):
+        """
+        Send employees from low to high in chunks. Each chunk restarts from the last sent ID,
+        so changes made between chunks (by other clients) never break the walk
+        """
+        include_low = True
+        while True:
+            nodes = islice(self.tree.iter_range(low, high, include_low), self.chunk_size)
+            chunk = [node_record(node) for node in nodes]
+            if chunk:
+                await self.send(writer, write_lock, {"id": request_id, "ok": True, "chunk": chunk})
+            if len(chunk) < self.chunk_size:
+                break
+            low, include_low = chunk[-1]["ID"], False
+        await self.send(writer, write_lock, {"id": request_id, "ok": True, "done": True})
+
+    async def stream_bfs(self, request_id, writer, write_lock):
+        """Send employees in breadth first order in chunks (order is taken at once, it changes with rotations)"""
+        rows = [node_record(node) for node in self.tree.iter_bfs(self.tree.root)]
+        for start in range(0, len(rows), self.chunk_size):
+            await self.send(writer, write_lock, {"id": request_id, "ok": True,
+                                                 "chunk": rows[start:start + self.chunk_size]})
+        await self.send(writer, write_lock, {"id": request_id, "ok": True, "done": True})
+
+
+async def serve(tree, host, port, unix_path):
+    server = EmployeeServer(tree)
+    listener = await server.start(host, port, unix_path)
+    print(f"Serving {tree.get_size(tree.root)} employees on {unix_path or f'{host}:{port}'}")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve employee data over a JSON lines protocol")
+    parser.add_argument("--data", help="json file of employees to load")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--metrics", action="store_true", help="collect tree metrics (metrics operation)")
+    args = parser.parse_args()
+
+    # Search batches use the sorted ID array of tree (search_many), keep it up to date on changes
+    tree = BinarySearchTree(metrics=args.metrics, maintain_id_array=True)
+    if args.data:
+        tree = BinarySearchTree.from_records(read_records(open(args.data)), metrics=args.metrics,
+                                             maintain_id_array=True)
+    try:
+        asyncio.run(serve(tree, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print("Server stopped.")
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def client(reader, writer, rng, max_id, deadline, latencies, mix):
+    """Send one request at a time until deadline, record latency of each request"""
+    request_id = 0
+    while time.perf_counter() < deadline:
+        request_id += 1
+        choice = rng.random()
+        if choice < mix["search"]:
+            request = {"id": request_id, "op": "search", "ID": rng.randint(1, max_id)}
+        elif choice < mix["search"] + mix["insert"]:
+            id = rng.randint(max_id + 1, 2 * max_id)
+            request = {"id": request_id, "op": "insert",
+                       "record": {"ID": id, "Name": f"Employee {id}", "Date of Birth": "01/01/2000",
+                                  "Place of Birth": "VT"}}
+        elif choice < mix["search"] + mix["insert"] + mix["remove"]:
+            request = {"id": request_id, "op": "remove", "ID": rng.randint(max_id + 1, 2 * max_id)}
+        else:
+            low = rng.randint(1, max_id)
+            request = {"id": request_id, "op": "range", "low": low, "high": low + 100}
+
+        start = time.perf_counter()
+        writer.write((json.dumps(request) + "\n").encode("utf-8"))
+        await writer.drain()
+        # Streamed answers end with a "done" line, other answers are 1 line
+        while True:
+            answer = json.loads(await reader.readline())
+            if not answer.get("chunk"):
+                break
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(host, port, unix_path, connections, seconds, max_id, mix):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    streams = []
+    for _ in range(connections):
+        if unix_path:
+            streams.append(await asyncio.open_unix_connection(unix_path, limit=2 ** 20))
+        else:
+            streams.append(await asyncio.open_connection(host, port, limit=2 ** 20))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(reader, writer, random.Random(i), max_id, deadline, latencies, mix)
+                           for i, (reader, writer) in enumerate(streams)))
+    elapsed = time.perf_counter() - start
+    for _, writer in streams:
+        writer.close()
+    return latencies, elapsed
+
+
+def percentile(values, fraction):
+    """Value at fraction of sorted values, None if there are no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def milliseconds(seconds):
+    return "n/a" if seconds is None else f"{seconds * 1000:.2f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for employee_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--max-id", type=int, default=100000, help="largest ID loaded in server")
+    parser.add_argument("--search", type=float, default=0.9, help="fraction of search requests")
+    parser.add_argument("--insert", type=float, default=0.04, help="fraction of insert requests")
+    parser.add_argument("--remove", type=float, default=0.04, help="fraction of remove requests (rest: range)")
+    args = parser.parse_args()
+
+    mix = {"search": args.search, "insert": args.insert, "remove": args.remove}
+    latencies, elapsed = asyncio.run(run(args.host, args.port, args.unix, args.connections, args.seconds,
+                                         args.max_id, mix))
+    print(f"requests: {len(latencies)} in {elapsed:.1f} s ({len(latencies) / elapsed:.0f} requests/s)")
+    print(f"latency p50: {milliseconds(percentile(latencies, 0.5))}, p99: {milliseconds(percentile(latencies, 0.99))}")
@@ -1,9 +1,15 @@
 
+from itertools import islice
+
 from read_write_file import load_file, write_file
 from binary_search_tree import BinarySearchTree
+from durable_tree import DurableEmployeeTree
+from employee_record import parse_id
 
 
 def menu():
+    # Data directory opened by option 10, changes are saved to it automatically (None if not opened)
+    store = None
     # Create menu in loop so user can select function again without start program again
     while True:
         print()
@@ -18,6 +24,8 @@ def menu():
         print("6. Remove Employee Data by ID")
         print("7. Read Tree")
         print("8. Save Data to file")
+        print("9. List Employee Data in ID range")
+        print("10. Open Data directory (changes are saved automatically)")
         print("0. Exit")
         print("====================================")
 
@@ -29,13 +37,16 @@ def menu():
             print("Please select a number display on the MENU.")
             continue
 
-        # Make sure user enter number from 0 -> 8
-        if select < 0 or select > 8:
+        # Make sure user enter number from 0 -> 10
+        if select < 0 or select > 10:
             print("Please select a number display on the MENU.")
             continue
 
         # ======= Exit function
         if select == 0:
+            # Make sure every change is on disk
+            if store:
+                store.close()
             print("EXIT.")
             print("Thank you. See you again!")
             break
@@ -43,17 +54,22 @@ def menu():
         # ======= Load data from file, if file path is incorrect, ask user to enter file path again or return to menu
         elif select == 1:
             print("1. Load Data from file")
-            data = load_file()
+            # Records are read from file one by one while the tree is built
+            data = load_file(stream=True)
             if not data:
                 continue
-            print("File loaded successfully!")
 
-            # Create tree from loaded data
-            tree = BinarySearchTree()
-            for i in data:
-                tree.add_employee(int(i["ID"]), i["Name"], i["Date of Birth"], i["Place of Birth"])
+            # Loaded data is not saved automatically, close data directory if it is opened
+            if store:
+                store.close()
+                store = None
+
+            # Create balanced tree from loaded data in one pass,
+            # Date of Birth and Place of Birth are parsed once here for date and place queries
+            tree = BinarySearchTree.from_records(data, typed=True)
+            print("File loaded successfully!")
             # Print Employee Data after loaded
-            to_print = tree.inorder_traverse(tree.root)
+            to_print = tree.iter_inorder(tree.root)
             tree.show(to_print)
 
         # ======= Insert new Employee Data
@@ -70,22 +86,15 @@ def menu():
 
             if id == "":
                 continue
-            # If ID existed, notify and require user to select another ID
-            found = tree.search(int(id), tree.root)
-            if found:
-                while found.id == int(id):
-                    id = input("Invalid ID. Please select another ID.\n")
-                    if id == "":
-                        break
-                    found = tree.search(int(id), tree.root)
-                    if found:
-                        continue
-                    else:
-                        break
-
+            # If ID is not a number or existed, notify and require user to select another ID
+            while parse_id(id) is None or tree.search(parse_id(id), tree.root):
+                id = input("Invalid ID. Please select another ID.\n")
                 # Enter to return to Menu
                 if id == "":
-                    continue
+                    break
+            if id == "":
+                continue
+            id = parse_id(id)
 
             name = input("Please enter Employee Name:\n")
             if name == "":
@@ -97,7 +106,13 @@ def menu():
             if pob == "":
                 continue
 
-            tree.add_employee(int(id), name, dob, pob)
+            # In a data directory, the change is written to its log before tree is changed
+            if store:
+                # Data which cannot be written to the log is not added
+                if not store.add_employee(id, name, dob, pob):
+                    continue
+            else:
+                tree.add_employee(id, name, dob, pob)
             print("Employee Data has been added to Dataset")
             print(f"Employee ID: {id}")
             print(f"Employee Name: {name}")
@@ -113,8 +128,8 @@ def menu():
             except UnboundLocalError:
                 print("ERROR: Invalid Dataset. Please load Dataset.")
                 continue
-            # Get a list of node in inorder traverse, then print information
-            to_print = tree.inorder_traverse(tree.root)
+            # Get nodes in inorder traverse one by one, then print information
+            to_print = tree.iter_inorder(tree.root)
             tree.show(to_print)
             # Read ID, parent, left child, right child of node
             # tree.read_tree(to_print)
@@ -128,8 +143,8 @@ def menu():
             except UnboundLocalError:
                 print("ERROR: Invalid Dataset. Please load Dataset.")
                 continue
-            # Get a list of node in breadth first traverse, then print information
-            to_print = tree.breadth_first_search(tree.root)
+            # Get nodes in breadth first traverse one by one, then print information
+            to_print = tree.iter_bfs(tree.root)
             tree.show(to_print)
             # Read ID, parent, left child, right child of node
             # tree.read_tree(to_print)
@@ -148,8 +163,9 @@ def menu():
             if search_id == "":
                 continue
 
-            # If search return False, notify user and back to menu
-            found = [tree.search(int(search_id), tree.root)]
+            # If ID is not a number or search return False, notify user and back to menu
+            search_id = parse_id(search_id)
+            found = [search_id is not None and tree.search(search_id, tree.root)]
             if not found[0]:
                 print("Employee ID does not exist!")
             else:
@@ -169,13 +185,16 @@ def menu():
             if id == "":
                 continue
 
-            id = int(id)
-            remove = tree.search(id, tree.root)
+            id = parse_id(id)
+            remove = id is not None and tree.search(id, tree.root)
             if not remove:
                 print("Invalid ID.")
                 continue
             else:
-                tree.remove_employee(id)
+                if store:
+                    store.remove_employee(id)
+                else:
+                    tree.remove_employee(id)
                 tree.show([remove])
                 print("Employee Data has been deleted")
 
@@ -188,7 +207,7 @@ def menu():
             except UnboundLocalError:
                 print("ERROR: Invalid Dataset. Please load Dataset.")
                 continue
-            nodes = tree.breadth_first_search(tree.root)
+            nodes = tree.iter_bfs(tree.root)
             tree.read_tree(nodes)
 
         # ======= Save Data to file
@@ -201,15 +220,58 @@ def menu():
                 print("ERROR: Invalid Dataset. Please load Dataset.")
                 continue
 
-            nodes = tree.inorder_traverse(tree.root)
-            data = []
-            for node in nodes:
-                node_infor = {"ID": node.id, "Name": node.name, "Date of Birth": node.dob, "Place of Birth": node.pob}
-                data.append(node_infor)
+            # Employee data is created one by one while writing, the whole list is never built
+            data = tree.iter_records(tree.root)
             write = write_file(data)
             if not write:
                 continue
 
+        # ======= List Employee Data whose ID is in a range, page by page
+        elif select == 9:
+            print("9. List Employee Data in ID range")
+            # Check if Dataset is valid
+            try:
+                tree.root
+            except UnboundLocalError:
+                print("ERROR: Invalid Dataset. Please load Dataset.")
+                continue
+
+            low = input("Please enter the smallest Employee ID:\n")
+            if low == "":
+                continue
+            high = input("Please enter the largest Employee ID:\n")
+            if high == "":
+                continue
+
+            low, high = parse_id(low), parse_id(high)
+            if low is None or high is None:
+                print("Invalid ID.")
+                continue
+
+            # Show 20 employees at a time, walking the tree in ID order from the smallest ID
+            nodes = tree.iter_range(low, high)
+            page = list(islice(nodes, 20))
+            if not page:
+                print("No Employee Data in this range.")
+            while page:
+                tree.show(page)
+                page = list(islice(nodes, 20))
+                if page and input("Press Enter to show next page, enter any key to go back to Menu:\n") != "":
+                    break
+
+        # ======= Open a data directory: load its snapshot and log, then save every change to it automatically
+        elif select == 10:
+            print("10. Open Data directory (changes are saved automatically)")
+            directory = input("Please enter directory path:\n")
+            if directory == "":
+                continue
+
+            if store:
+                store.close()
+            store = DurableEmployeeTree(directory)
+            tree = store.tree
+            print(f"Data directory opened, {tree.get_size(tree.root)} employees loaded.")
+
 
 if __name__ == "__main__":
     menu()
@@ -0,0 +1,226 @@
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+from itertools import islice
+from operator import itemgetter
+
+from binary_search_tree import BinarySearchTree
+from employee_record import node_record, record_row
+from read_write_file import (SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_RECORD, SNAPSHOT_VERSION, read_records,
+                             read_snapshot)
+
+# Parallel load and export of large employee files.
+# Load: the file is cut into byte ranges (JSON Lines) or record ranges (binary snapshot), a process pool
+# parses and validates each range into ID sorted rows, the sorted runs are merged into one ID order
+# and the tree is built at once by BinarySearchTree.from_rows.
+# Export: each worker encodes a disjoint range of IDs (by rank) of the tree, parts are written in order.
+
+# Tree which export workers read, set before the pool is forked so workers inherit it without pickling
+export_tree = None
+
+
+def pool_context():
+    """Process start method for workers: fork shares the tree and file data with workers for free"""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def file_format(file_path):
+    """Return "snapshot", "json" (a json list) or "jsonl" (one json record per line) by first bytes of file"""
+    with open(file_path, "rb") as f:
+        head = f.read(len(SNAPSHOT_MAGIC))
+        if head == SNAPSHOT_MAGIC:
+            return "snapshot"
+        head = (head + f.read(256)).lstrip()
+    return "json" if head.startswith(b"[") else "jsonl"
+
+
+def parse_lines(file_path, start, end):
+    """
+    Worker: parse JSON Lines records of file whose line starts in byte range [start, end),
+    return their (ID, Name, Date of Birth, Place of Birth) rows sorted by ID.
+    Raise ValueError (with byte offset) for a broken record
+    """
+    with open(file_path, "rb") as f:
+        # A line cut by start belongs to the previous range
+        if start:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()
+        offset = f.tell()
+        data = f.read(max(end - offset, 0))
+        # Finish the last line of range
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+
+    rows = []
+    loads = json.loads
+    for line in data.split(b"\n"):
+        if line.strip():
+            try:
+                i = loads(line)
+                rows.append(record_row(i))
+            except (ValueError, KeyError, TypeError) as error:
+                raise ValueError(f"{file_path}: invalid employee record at byte {offset}: {error!r}") from None
+        offset += len(line) + 1
+    # Stable sort keeps duplicated IDs in file order, so the first one wins like add_employee
+    rows.sort(key=itemgetter(0))
+    return rows
+
+
+def parse_snapshot(file_path, first, last):
+    """
+    Worker: decode records [first, last) of a binary snapshot (written by write_snapshot) into rows.
+    Only strings used by these records are decoded. Raise ValueError if IDs are not in increasing order
+    """
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, count, string_count, string_table_offset = SNAPSHOT_HEADER.unpack_from(mm, 0)
+            offsets_start = string_table_offset
+            strings_start = string_table_offset + 8 * (string_count + 1)
+            strings = {}
+
+            def string(index):
+                text = strings.get(index)
+                if text is None:
+                    begin, end = struct.unpack_from("<QQ", mm, offsets_start + 8 * index)
+                    text = strings[index] = mm[strings_start + begin:strings_start + end].decode("utf-8")
+                return text
+
+            start = SNAPSHOT_HEADER.size + first * SNAPSHOT_RECORD.size
+            end = SNAPSHOT_HEADER.size + last * SNAPSHOT_RECORD.size
+            rows = [(id, string(name), string(dob), string(pob))
+                    for id, name, dob, pob in SNAPSHOT_RECORD.iter_unpack(mm[start:end])]
+
+    for previous, row in zip(rows, islice(rows, 1, None)):
+        if previous[0] >= row[0]:
+            raise ValueError(f"{file_path}: snapshot IDs are not in increasing order at ID {row[0]}")
+    return rows
+
+
+def map_chunks(function, chunks, workers):
+    """Run function(*chunk) for every chunk, in a process pool if workers > 1, return results in chunk order"""
+    context = pool_context()
+    if workers <= 1 or len(chunks) <= 1 or context is None:
+        return [function(*chunk) for chunk in chunks]
+    with context.Pool(min(workers, len(chunks))) as pool:
+        return pool.starmap(function, chunks)
+
+
+def read_rows_parallel(file_path, workers=None):
+    """
+    Read employees of a JSON Lines file or a binary snapshot with a pool of worker processes,
+    return a list of (ID, Name, Date of Birth, Place of Birth) rows in ID order (duplicated IDs kept in file order).
+    A json list file (written by write_file) cannot be cut safely between records, it is read in one process
+    """
+    workers = workers or os.cpu_count() or 1
+    kind = file_format(file_path)
+
+    if kind == "json":
+        rows = [record_row(i) for i in read_records(open(file_path))]
+        rows.sort(key=itemgetter(0))
+        return rows
+
+    if kind == "snapshot":
+        with open(file_path, "rb") as f:
+            header = f.read(SNAPSHOT_HEADER.size)
+        if len(header) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{file_path} is not an employee snapshot file")
+        magic, version, count, _, _ = SNAPSHOT_HEADER.unpack(header)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{file_path} is not an employee snapshot file")
+        if workers <= 1:
+            return read_snapshot(file_path)
+        step = max(-(-count // workers), 1)
+        runs = map_chunks(parse_snapshot, [(file_path, first, min(first + step, count))
+                                           for first in range(0, count, step)], workers)
+        # Runs are consecutive ID ranges: check the borders, then joining them keeps ID order
+        for previous, run in zip(runs, runs[1:]):
+            if previous and run and previous[-1][0] >= run[0][0]:
+                raise ValueError(f"{file_path}: snapshot IDs are not in increasing order at ID {run[0][0]}")
+        return [row for run in runs for row in run]
+
+    size = os.path.getsize(file_path)
+    step = max(-(-size // workers), 1)
+    runs = map_chunks(parse_lines, [(file_path, start, min(start + step, size))
+                                    for start in range(0, size, step)], workers)
+    # k-way merge of sorted runs: sort of the concatenated runs finds each run and merges them in C,
+    # which is about twice as fast as heapq.merge in Python (stable, so duplicated IDs keep file order)
+    rows = [row for run in runs for row in run]
+    rows.sort(key=itemgetter(0))
+    return rows
+
+
+def load_parallel(file_path, workers=None, **kwargs):
+    """
+    Build a balanced tree from a large employee file (JSON Lines, binary snapshot or json list) parsed by
+    workers processes (default: number of CPUs). Other keyword arguments are passed to BinarySearchTree
+    """
+    return BinarySearchTree.from_rows(read_rows_parallel(file_path, workers), presorted=True, **kwargs)
+
+
+def encode_range(part):
+    """Worker: encode employees of rank start + 1 .. start + count of the exported tree, return utf-8 bytes"""
+    start, count, json_lines, compact = part
+    tree = export_tree
+    first = tree.select(start + 1)
+    records = [node_record(node) for node in islice(tree.iter_range(first.id), count)]
+    if json_lines:
+        dumps = json.JSONEncoder(separators=(",", ":")).encode
+        return "".join([dumps(record) + "\n" for record in records]).encode("utf-8")
+    # Same layout as write_records: encode the part as a list and remove its brackets
+    if compact:
+        return json.JSONEncoder(separators=(",", ":")).encode(records)[1:-1].encode("utf-8")
+    return json.JSONEncoder(indent=4).encode(records)[2:-2].encode("utf-8")
+
+
+def export_parallel(tree, file_path, workers=None, json_lines=False, compact=False, part_size=50000):
+    """
+    Write all employees of tree to file in ID order, parts of at most part_size employees
+    (disjoint ID ranges) are encoded by workers processes. Output is the same as write_records
+    (json list, compact or indented), or one compact json record per line with json_lines=True
+    """
+    global export_tree
+    workers = workers or os.cpu_count() or 1
+    size = tree.get_size(tree.root)
+    parts = [(start, min(part_size, size - start), json_lines, compact) for start in range(0, size, part_size)]
+
+    # Text to open the list, to separate parts, to close the list (as in write_records)
+    if json_lines:
+        start, separator, end = b"", b"", b""
+    elif compact:
+        start, separator, end = b"[", b",", b"]"
+    else:
+        start, separator, end = b"[\n", b",\n", b"\n]"
+
+    context = pool_context()
+    pool = None
+    export_tree = tree
+    try:
+        if workers > 1 and len(parts) > 1 and context is not None:
+            # Forked workers see the tree as it is now, parts come back in order while the next ones are encoded
+            pool = context.Pool(min(workers, len(parts)))
+            encoded = pool.imap(encode_range, parts)
+        else:
+            encoded = map(encode_range, parts)
+
+        with open(file_path, "wb") as f:
+            # Empty tree is written as an empty list
+            if not parts:
+                f.write(b"" if json_lines else b"[]")
+                return
+            f.write(start)
+            for number, data in enumerate(encoded):
+                if number:
+                    f.write(separator)
+                f.write(data)
+            f.write(end)
+    finally:
+        export_tree = None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
@@ -0,0 +1,242 @@
+from binary_search_tree import BinarySearchTree
+from employee_record import parse_id, record_row, unique_rows
+
+
+class PersistentNode:
+    """
+    Employee node which is never changed after it is created, so one node can be shared by many versions.
+    There is no parent pointer: a node can have different parents in different versions
+    """
+    __slots__ = ("id", "name", "dob", "pob", "left", "right", "height", "size")
+
+    def __init__(self, id, name, dob, pob, left=None, right=None):
+        self.id = id
+        self.name = name
+        # Date of Birth
+        self.dob = dob
+        # Place of Birth
+        self.pob = pob
+        self.left = left
+        self.right = right
+        # Height and size are computed from children, which already exist
+        left_height = left.height if left else 0
+        right_height = right.height if right else 0
+        self.height = max(left_height, right_height) + 1
+        self.size = (left.size if left else 0) + (right.size if right else 0) + 1
+
+
+class PersistentBinarySearchTree:
+    """
+    Versioned AVL tree of employees. Every add/remove creates a new version by copying only the nodes
+    on the path from root to the change (O(log n) new nodes), all other nodes are shared with the previous version.
+    Every version stays readable: versions[v] is the root of version v
+    """
+    def __init__(self):
+        # Version 0 is the empty tree
+        self.versions = [None]
+
+    @classmethod
+    def from_records(cls, records, presorted=False):
+        """Create tree whose version 0 holds employee records (list of dictionary as loaded from file)"""
+        rows = [record_row(i) for i in records]
+        if not presorted:
+            rows.sort(key=lambda row: row[0])
+
+        # Drop duplicated IDs, keep the first one like add_employee does
+        rows = unique_rows(rows)
+        tree = cls()
+        tree.versions[0] = tree.build_balanced(rows, 0, len(rows) - 1)
+        return tree
+
+    @property
+    def version(self):
+        """Number of the latest version"""
+        return len(self.versions) - 1
+
+    def add_employee(self, id, name, dob, pob):
+        """Add new employee, return number of the new version, False if ID existed or is not a number"""
+        id = parse_id(id)
+        if id is None:
+            print("Invalid ID.")
+            return False
+        root = self.versions[-1]
+        if self.search(id, self.version):
+            print("Invalid ID.")
+            return False
+        self.versions.append(self.insert(root, id, name, dob, pob))
+        return self.version
+
+    def build_balanced(self, rows, start, end):
+        """Build a balanced subtree from ID sorted rows[start..end] and return its root"""
+        if start > end:
+            return None
+        mid = (start + end) // 2
+        id, name, dob, pob = rows[mid]
+        return PersistentNode(id, name, dob, pob,
+                              self.build_balanced(rows, start, mid - 1), self.build_balanced(rows, mid + 1, end))
+
+    def copy(self, node, left, right):
+        """Return a new node with the employee data of node and new children"""
+        return PersistentNode(node.id, node.name, node.dob, node.pob, left, right)
+
+    def delete(self, node, id):
+        """Return root of a new subtree without ID (ID must exist in subtree)"""
+        if id < node.id:
+            return self.rebalance(self.copy(node, self.delete(node.left, id), node.right))
+        if id > node.id:
+            return self.rebalance(self.copy(node, node.left, self.delete(node.right, id)))
+
+        # Node to delete has at most 1 child: the child takes its place
+        if node.left is None:
+            return node.right
+        if node.right is None:
+            return node.left
+        # Node has 2 children: successor (the smallest of right branch) takes its place
+        successor = node.right
+        while successor.left:
+            successor = successor.left
+        right = self.delete(node.right, successor.id)
+        return self.rebalance(self.copy(successor, node.left, right))
+
+    def diff(self, old_version, new_version):
+        """
+        Yield (ID, old node, new node) for every employee added (old node is None), removed (new node is None)
+        or changed between 2 versions, in ID order. Subtrees shared by both versions are skipped without
+        being visited, so time depends on the number of changes, not on the size of the tree
+        """
+        # Stacks of what is left to compare in ID order (top is next): ("tree", node) is a whole subtree
+        # which is not opened yet, ("node", node) is a single employee
+        old_stack = [("tree", self.versions[old_version])]
+        new_stack = [("tree", self.versions[new_version])]
+
+        def expand(stack):
+            # Replace the subtree on top of stack by its left subtree, its root and its right subtree
+            node = stack.pop()[1]
+            if node.right:
+                stack.append(("tree", node.right))
+            stack.append(("node", node))
+            if node.left:
+                stack.append(("tree", node.left))
+
+        # Empty versions have nothing to compare
+        for stack in (old_stack, new_stack):
+            if stack[-1][1] is None:
+                stack.pop()
+
+        while old_stack and new_stack:
+            old_kind, old_node = old_stack[-1]
+            new_kind, new_node = new_stack[-1]
+            # Same subtree object in both versions: nothing changed inside it
+            if old_node is new_node:
+                old_stack.pop()
+                new_stack.pop()
+            # Open subtrees until both tops are single employees, taller subtree first so shared parts line up
+            elif old_kind == "tree" and (new_kind == "node" or old_node.height >= new_node.height):
+                expand(old_stack)
+            elif new_kind == "tree":
+                expand(new_stack)
+            # Both tops are single employees: compare IDs
+            elif old_node.id < new_node.id:
+                old_stack.pop()
+                yield old_node.id, old_node, None
+            elif old_node.id > new_node.id:
+                new_stack.pop()
+                yield new_node.id, None, new_node
+            else:
+                old_stack.pop()
+                new_stack.pop()
+                if (old_node.name, old_node.dob, old_node.pob) != (new_node.name, new_node.dob, new_node.pob):
+                    yield old_node.id, old_node, new_node
+
+        # Whatever is left exists only in one version
+        while old_stack:
+            if old_stack[-1][0] == "tree":
+                expand(old_stack)
+            else:
+                node = old_stack.pop()[1]
+                yield node.id, node, None
+        while new_stack:
+            if new_stack[-1][0] == "tree":
+                expand(new_stack)
+            else:
+                node = new_stack.pop()[1]
+                yield node.id, None, node
+
+    def insert(self, node, id, name, dob, pob):
+        """Return root of a new subtree which has the new employee (ID must not exist in subtree)"""
+        if node is None:
+            return PersistentNode(id, name, dob, pob)
+        if id < node.id:
+            return self.rebalance(self.copy(node, self.insert(node.left, id, name, dob, pob), node.right))
+        return self.rebalance(self.copy(node, node.left, self.insert(node.right, id, name, dob, pob)))
+
+    def iter_inorder(self, version=None):
+        """Yield nodes of a version (latest if None) in ID order"""
+        node = self.versions[-1 if version is None else version]
+        stack = []
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node
+                node = node.right
+
+    def inorder_traverse(self, version=None):
+        """Return list of nodes of a version (latest if None) in ID order"""
+        return list(self.iter_inorder(version))
+
+    def rebalance(self, node):
+        """Return a balanced subtree equal to subtree of node (AVL rotations create new nodes)"""
+        left_height = node.left.height if node.left else 0
+        right_height = node.right.height if node.right else 0
+
+        # Left heavy
+        if left_height - right_height > 1:
+            left = node.left
+            # Left child is right heavy: rotate left at left node first
+            if (left.left.height if left.left else 0) < (left.right.height if left.right else 0):
+                left = self.rotate_left(left)
+            return self.rotate_right(self.copy(node, left, node.right))
+
+        # Right heavy
+        if right_height - left_height > 1:
+            right = node.right
+            # Right child is left heavy: rotate right at right node first
+            if (right.right.height if right.right else 0) < (right.left.height if right.left else 0):
+                right = self.rotate_right(right)
+            return self.rotate_left(self.copy(node, node.left, right))
+
+        return node
+
+    def remove_employee(self, id):
+        """Remove employee by ID, return number of the new version, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None or not self.search(id, self.version):
+            return False
+        self.versions.append(self.delete(self.versions[-1], id))
+        return self.version
+
+    def rotate_left(self, x):
+        """Return new subtree root after rotating subtree of x to the left"""
+        y = x.right
+        return self.copy(y, self.copy(x, x.left, y.left), y.right)
+
+    def rotate_right(self, x):
+        """Return new subtree root after rotating subtree of x to the right"""
+        y = x.left
+        return self.copy(y, y.left, self.copy(x, y.right, x.right))
+
+    def search(self, id, version=None):
+        """Search for a node by ID in a version (latest if None), False if ID does not exist in that version"""
+        node = self.versions[-1 if version is None else version]
+        while node:
+            if id == node.id:
+                return node
+            node = node.right if id > node.id else node.left
+        return False
+
+    # Print employee data the same way as BinarySearchTree
+    show = BinarySearchTree.show
+
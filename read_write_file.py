@@ -1,8 +1,22 @@
 import json
+import mmap
+import struct
 
+# Binary snapshot layout (little-endian):
+#   header:       magic, version, number of records, number of strings, offset of string table
+#   record table: one (ID, Name index, Date of Birth index, Place of Birth index) per employee, in ID order
+#   string table: (number of strings + 1) byte offsets, followed by all utf-8 strings back to back
+SNAPSHOT_MAGIC = b"EMPS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sIQQQ")
+SNAPSHOT_RECORD = struct.Struct("<qIII")
 
-def load_file():
-    """Read file and return an ID sorted list of dictionary of data"""
+
+def load_file(stream=False):
+    """
+    Read file and return an ID sorted list of dictionary of data.
+    With stream=True, return a generator which reads records one by one from file instead
+    """
 
     while True:
         file_path = input("Please enter file path:\n")
@@ -16,6 +30,9 @@ def load_file():
             print("File not found. Please enter file path again\n")
             continue
         else:
+            if stream:
+                return read_records(f)
+
             read_data = f.read()
             data = json.loads(read_data)
             f.close()
@@ -23,8 +40,56 @@ def load_file():
             return data
 
 
-def write_file(data):
-    """Write json data to file"""
+def read_records(f, chunk_size=65536):
+    """
+    Yield records of a json list from an opened file one by one,
+    file is read in chunks so the whole text is never kept in memory. File is closed at the end
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    try:
+        while True:
+            # Skip white spaces, opening bracket of the list and commas between records
+            while position < len(buffer) and (buffer[position] in " \t\r\n," or
+                                                (buffer[position] == "[" and not started)):
+                started = started or buffer[position] == "["
+                position += 1
+
+            # Closing bracket: end of the list
+            if position < len(buffer) and buffer[position] == "]":
+                return
+
+            # Decode next record if it is completely in buffer
+            if position < len(buffer):
+                try:
+                    record, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Record is cut at the end of buffer, read more below (or fail if file has no more data)
+                    pass
+                else:
+                    yield record
+                    continue
+
+            # Read next chunk, drop text of records already decoded
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if buffer[position:].strip():
+                    # Raise the decode error of the incomplete record
+                    decoder.raw_decode(buffer, position)
+                return
+            buffer = buffer[position:] + chunk
+            position = 0
+    finally:
+        f.close()
+
+
+def write_file(data, compact=False):
+    """
+    Write json data (list or any iterable of dictionary) to file, one record at a time.
+    With compact=True, data is written without indentation and spaces
+    """
 
     while True:
         file_path = input("Please enter file path:\n")
@@ -38,13 +103,107 @@ def write_file(data):
             continue
 
         else:
-            data = json.dumps(data, indent=4)
-            f.write(data)
+            write_records(f, data, compact)
             f.close()
 
             return
 
 
+def write_records(f, data, compact=False, batch_size=1000):
+    """
+    Write records to an opened file in the same layout as json.dumps(data, indent=4)
+    (or json.dumps(data, separators=(",", ":")) if compact) without building the whole string in memory.
+    Records are encoded in small batches, which is much faster than one json.dumps per record
+    """
+    if compact:
+        encoder = json.JSONEncoder(separators=(",", ":"))
+        # Text to open the list, to separate records, to close the list, to remove around each encoded batch
+        start, separator, end, trim = "[", ",", "]", 1
+    else:
+        encoder = json.JSONEncoder(indent=4)
+        start, separator, end, trim = "[\n", ",\n", "\n]", 2
+
+    first = True
+    batch = []
+    for record in data:
+        batch.append(record)
+        if len(batch) == batch_size:
+            # Open the list before first batch, separate next batches by comma
+            f.write(start if first else separator)
+            first = False
+            # Batch is encoded as a list, remove its brackets
+            f.write(encoder.encode(batch)[trim:-trim])
+            batch = []
+    if batch:
+        f.write(start if first else separator)
+        first = False
+        f.write(encoder.encode(batch)[trim:-trim])
+
+    # Empty data is written as an empty list
+    f.write("[]" if first else end)
+
+
+def write_snapshot(file_path, rows):
+    """
+    Write employees to a binary snapshot file.
+    rows: (ID, Name, Date of Birth, Place of Birth) tuples in ID order (i.e. walked from tree in inorder)
+    """
+    # Every distinct string is stored once, records refer to strings by index
+    string_index = {}
+    strings = []
+
+    def index_of(text):
+        index = string_index.get(text)
+        if index is None:
+            index = string_index[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return index
+
+    with open(file_path, "wb") as f:
+        # Reserve header, it is written at the end when counts are known
+        f.write(bytes(SNAPSHOT_HEADER.size))
+        count = 0
+        pack = SNAPSHOT_RECORD.pack
+        for id, name, dob, pob in rows:
+            f.write(pack(id, index_of(name), index_of(dob), index_of(pob)))
+            count += 1
+
+        # String table: offsets of strings then the strings
+        string_table_offset = f.tell()
+        offsets = [0]
+        for text in strings:
+            offsets.append(offsets[-1] + len(text))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(b"".join(strings))
+
+        f.seek(0)
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, count, len(strings), string_table_offset))
+
+
+def read_snapshot(file_path):
+    """
+    Read a binary snapshot file (written by write_snapshot) through mmap,
+    return a list of (ID, Name, Date of Birth, Place of Birth) tuples in ID order
+    """
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < SNAPSHOT_HEADER.size:
+                raise ValueError(f"{file_path} is not an employee snapshot file")
+            magic, version, count, string_count, string_table_offset = SNAPSHOT_HEADER.unpack_from(mm, 0)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f"{file_path} is not an employee snapshot file")
+
+            # Decode each distinct string once, equal strings of employees share the same object
+            offsets = struct.unpack_from(f"<{string_count + 1}Q", mm, string_table_offset)
+            start = string_table_offset + 8 * (string_count + 1)
+            blob = mm[start:start + offsets[-1]]
+            strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(string_count)]
+
+            records_end = SNAPSHOT_HEADER.size + count * SNAPSHOT_RECORD.size
+            return [(id, strings[name], strings[dob], strings[pob]) for id, name, dob, pob
+                    in SNAPSHOT_RECORD.iter_unpack(mm[SNAPSHOT_HEADER.size:records_end])]
+
+
 if __name__ == "__main__":
     data = [{'ID': '1', 'Name': 'Nguyen Ba Ngoc Dung', 'Date of Birth': '03/09/1990', 'Place of Birth': 'VT'},
             {'ID': '4', 'Name': 'Python Awesome', 'Date of Birth': '02/07/1980', 'Place of Birth': 'USA'},
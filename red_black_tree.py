@@ -0,0 +1,195 @@
+from binary_search_tree import BinarySearchTree, CompactNode, Node
+
+
+class RedBlackNode(Node):
+    """Employee node of a red-black tree, new nodes are red"""
+    def __init__(self, id, name, dob, pob, parent=None):
+        Node.__init__(self, id, name, dob, pob, parent)
+        self.red = True
+
+
+class CompactRedBlackNode(CompactNode):
+    """RedBlackNode without __dict__ (compact mode)"""
+    __slots__ = ("red",)
+
+    __init__ = RedBlackNode.__init__
+
+
+class RedBlackTree(BinarySearchTree):
+    """
+    Employee tree balanced by red-black rules instead of AVL heights: every red node has black children,
+    every path from a node down to an empty child has the same number of black nodes.
+    Tree is less strictly balanced than AVL (height up to 2 log n), but insert needs at most 2 rotations
+    and delete at most 3, most fixes are only re-coloring. Searches, traversals, rank/select, indexes
+    and cache are shared with BinarySearchTree (height of nodes is not maintained)
+    """
+    engine = "rbtree"
+
+    def __init__(self, compact=False, **kwargs):
+        super().__init__(compact=compact, **kwargs)
+        self.node_type = CompactRedBlackNode if compact else RedBlackNode
+
+    def is_red(self, node):
+        """Empty children are black"""
+        return node is not None and node.red
+
+    def rebalance_insertion(self, node, stop=None):
+        """Fix red node under red parent after insert by re-coloring up the tree, rotate at most twice"""
+        # stop is not used: re-coloring may go up to root
+        while node.parent is not None and node.parent.red:
+            parent = node.parent
+            # Red parent is never root, so grandparent exists
+            grandparent = parent.parent
+            if parent is grandparent.left:
+                uncle = grandparent.right
+                # Red uncle: push black down from grandparent, continue from grandparent
+                if self.is_red(uncle):
+                    parent.red = uncle.red = False
+                    grandparent.red = True
+                    node = grandparent
+                    continue
+                # Node is inner grandchild: rotate it to outer position first
+                double = node is parent.right
+                if double:
+                    self.rotate_left(parent)
+                    node, parent = parent, node
+                parent.red = False
+                grandparent.red = True
+                self.rotate_right(grandparent)
+            else:
+                uncle = grandparent.left
+                if self.is_red(uncle):
+                    parent.red = uncle.red = False
+                    grandparent.red = True
+                    node = grandparent
+                    continue
+                double = node is parent.left
+                if double:
+                    self.rotate_right(parent)
+                    node, parent = parent, node
+                parent.red = False
+                grandparent.red = True
+                self.rotate_left(grandparent)
+            self.count_rotation("rotations_double" if double else "rotations_single")
+        self.root.red = False
+
+    def rebalance_deletion(self, node):
+        """Re-coloring after delete is done by unlink_node, which knows the color of the removed node"""
+
+    def unlink_node(self, node):
+        """Take a node which is in tree out of tree structure, then fix colors"""
+        # Case 3 copies successor into node and unlinks successor, which comes back here with at most 1 child
+        if node.left and node.right:
+            return super().unlink_node(node)
+
+        parent = node.parent
+        child = node.left or node.right
+        super().unlink_node(node)
+
+        # Removing a red node keeps black counts. A black node with 1 child has a red child: make it black
+        if node.red:
+            return
+        if child is not None:
+            child.red = False
+            return
+        # A black leaf is gone: one path of parent has 1 black node less
+        if parent is not None:
+            self.fix_double_black(None, parent)
+
+    def count_rotation(self, kind):
+        """Count a rotation ("rotations_single" or "rotations_double") if tree has metrics"""
+        if self.metrics is not None:
+            self.metrics.count(kind)
+
+    def fix_double_black(self, node, parent):
+        """Fix a subtree of parent (node, can be empty) which has 1 black node less than its sibling"""
+        while node is not self.root and not self.is_red(node):
+            # Sibling always exists, it has at least 1 black node more than node
+            if node is parent.left:
+                sibling = parent.right
+                # Red sibling: rotate so that sibling is black
+                if sibling.red:
+                    sibling.red = False
+                    parent.red = True
+                    self.rotate_left(parent)
+                    sibling = parent.right
+                    self.count_rotation("rotations_single")
+                # Both children of sibling are black: sibling gives up 1 black, problem moves up
+                if not self.is_red(sibling.left) and not self.is_red(sibling.right):
+                    sibling.red = True
+                    node, parent = parent, parent.parent
+                    continue
+                # Inner child of sibling is red: rotate it to outer position first
+                double = not self.is_red(sibling.right)
+                if double:
+                    sibling.left.red = False
+                    sibling.red = True
+                    self.rotate_right(sibling)
+                    sibling = parent.right
+                # Outer child of sibling is red: rotate at parent, node side gets 1 black more
+                sibling.red = parent.red
+                parent.red = False
+                sibling.right.red = False
+                self.rotate_left(parent)
+                self.count_rotation("rotations_double" if double else "rotations_single")
+                node = self.root
+            else:
+                sibling = parent.left
+                if sibling.red:
+                    sibling.red = False
+                    parent.red = True
+                    self.rotate_right(parent)
+                    sibling = parent.left
+                    self.count_rotation("rotations_single")
+                if not self.is_red(sibling.left) and not self.is_red(sibling.right):
+                    sibling.red = True
+                    node, parent = parent, parent.parent
+                    continue
+                double = not self.is_red(sibling.left)
+                if double:
+                    sibling.right.red = False
+                    sibling.red = True
+                    self.rotate_left(sibling)
+                    sibling = parent.left
+                sibling.red = parent.red
+                parent.red = False
+                sibling.left.red = False
+                self.rotate_right(parent)
+                self.count_rotation("rotations_double" if double else "rotations_single")
+                node = self.root
+        if node is not None:
+            node.red = False
+
+    def rebuild(self, rows):
+        """Replace the whole tree by a balanced tree built from ID sorted rows, nodes of the deepest level are red"""
+        super().rebuild(rows)
+        # Balanced tree: all empty children are on the last 2 levels, so making the deepest level red
+        # (and everything else black) gives every path the same number of black nodes
+        level = [self.root] if self.root else []
+        while level:
+            next_level = [child for node in level for child in (node.left, node.right) if child]
+            for node in level:
+                node.red = not next_level and node is not self.root
+            level = next_level
+
+    def verify(self):
+        """
+        Check structure of tree: ID order, parent pointers, sizes, red-black rules and prev/next links.
+        Return number of nodes, raise AssertionError if something is broken
+        """
+        # Number of black nodes from each node down to its empty children
+        black_height = {None: 0}
+        for node in self.iter_postorder(self.root):
+            for child in (node.left, node.right):
+                if child:
+                    assert child.parent is node, f"Wrong parent of ID {child.id}"
+                    assert not (node.red and child.red), f"Red node with red child at ID {node.id}"
+            assert not node.left or node.left.id < node.id, f"Wrong order at ID {node.id}"
+            assert not node.right or node.right.id > node.id, f"Wrong order at ID {node.id}"
+            assert node.size == self.get_size(node.left) + self.get_size(node.right) + 1, \
+                f"Wrong size of ID {node.id}"
+            assert black_height[node.left] == black_height[node.right], f"Unequal black height at ID {node.id}"
+            black_height[node] = black_height[node.left] + (0 if node.red else 1)
+        assert self.root is None or (self.root.parent is None and not self.root.red), "Root has a parent or is red"
+        self.verify_links()
+        return self.get_size(self.root)
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+
+
+class SearchCache:
+    """
+    Bounded cache of {ID: node} in front of BinarySearchTree.search, so IDs searched again and again
+    do not walk the tree each time. When full, one entry is evicted by policy:
+    "lru" drops the least recently used ID, "lfu" drops the least frequently used ID
+    (the least recently used one among IDs used equally often).
+    Every search changes the cache, so it is not safe for searches running in parallel threads
+    """
+    def __init__(self, capacity=1024, policy="lru"):
+        if capacity < 1:
+            raise ValueError("Cache capacity must be at least 1")
+        if policy not in ("lru", "lfu"):
+            raise ValueError("Cache policy must be 'lru' or 'lfu'")
+        self.capacity = capacity
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        # LRU: {ID: node} from least to most recently used
+        self.entries = OrderedDict()
+        # LFU: {ID: use count} and {use count: {ID: node} from least to most recently used}
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = 0
+
+    def __len__(self):
+        return len(self.entries) if self.policy == "lru" else len(self.counts)
+
+    def get(self, id):
+        """Return cached node of ID, None if ID is not cached"""
+        if self.policy == "lru":
+            node = self.entries.get(id)
+            if node is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(id)
+            self.hits += 1
+            return node
+
+        count = self.counts.get(id)
+        if count is None:
+            self.misses += 1
+            return None
+        # Move ID to the bucket of the next use count
+        node = self.buckets[count].pop(id)
+        if not self.buckets[count]:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+        self.counts[id] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[id] = node
+        self.hits += 1
+        return node
+
+    def put(self, id, node):
+        """Cache node of ID (which is not cached yet), evict one entry if cache is full"""
+        if self.policy == "lru":
+            self.entries[id] = node
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            return
+
+        if len(self.counts) >= self.capacity:
+            evicted, _ = self.buckets[self.min_count].popitem(last=False)
+            if not self.buckets[self.min_count]:
+                del self.buckets[self.min_count]
+            del self.counts[evicted]
+        self.counts[id] = 1
+        self.buckets.setdefault(1, OrderedDict())[id] = node
+        self.min_count = 1
+
+    def pop(self, id):
+        """Forget ID (its node is removed or no longer holds this ID)"""
+        if self.policy == "lru":
+            self.entries.pop(id, None)
+            return
+
+        count = self.counts.pop(id, None)
+        if count is None:
+            return
+        del self.buckets[count][id]
+        if not self.buckets[count]:
+            del self.buckets[count]
+            # Find the new smallest use count
+            if self.min_count == count:
+                self.min_count = min(self.buckets, default=0)
+
+    def clear(self):
+        """Forget all IDs (i.e. tree is rebuilt with new nodes), hit/miss counters are kept"""
+        self.entries.clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.min_count = 0
+
+    def stats(self):
+        """Return dictionary of hits, misses, hit rate and number of cached IDs"""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self), "capacity": self.capacity, "policy": self.policy}
@@ -0,0 +1,352 @@
+import heapq
+import multiprocessing
+from bisect import bisect_right
+from itertools import islice
+from operator import itemgetter
+
+from binary_search_tree import BinarySearchTree
+from employee_record import parse_id, record_row, row_record, unique_rows
+
+
+class Shard:
+    """
+    Operations of one shard on its own BinarySearchTree. Arguments and results are plain rows, lists and
+    booleans (never nodes), so the same operations can run in this process or in a worker process
+    """
+    def __init__(self, tree):
+        self.tree = tree
+
+    def add(self, id, name, dob, pob):
+        return self.tree.insert(self.tree.root, id, name, dob, pob, quiet=True)
+
+    def add_many(self, records):
+        return self.tree.add_employees(records)
+
+    def load(self, rows):
+        """Replace all employees by ID sorted rows of unique IDs"""
+        self.tree.rebuild(rows)
+        return len(rows)
+
+    def range_rows(self, low, high, include_low=True, limit=None):
+        """Rows of at most limit employees whose ID is from low to high"""
+        return [(node.id, node.name, node.dob, node.pob)
+                for node in islice(self.tree.iter_range(low, high, include_low), limit)]
+
+    def remove(self, id):
+        node = self.tree.search(id, self.tree.root)
+        if not node:
+            return False
+        self.tree.delete_node(node)
+        return True
+
+    def remove_many(self, ids):
+        return self.tree.remove_employees(ids)
+
+    def search(self, id):
+        node = self.tree.search(id, self.tree.root)
+        return (node.id, node.name, node.dob, node.pob) if node else False
+
+    def search_many(self, ids):
+        return [(node.id, node.name, node.dob, node.pob) if node else False for node in self.tree.search_many(ids)]
+
+    def size(self):
+        return self.tree.get_size(self.tree.root)
+
+    def verify(self):
+        return self.tree.verify()
+
+
+class LocalShard:
+    """Shard whose tree lives in this process: a request is run at once, its result waits for receive()"""
+    def __init__(self, tree_kwargs):
+        self.shard = Shard(BinarySearchTree(**tree_kwargs))
+        self.result = None
+
+    def send(self, operation, *args):
+        try:
+            self.result = (True, getattr(self.shard, operation)(*args))
+        except Exception as error:
+            self.result = (False, error)
+
+    def receive(self):
+        ok, result = self.result
+        self.result = None
+        if not ok:
+            raise result
+        return result
+
+    def call(self, operation, *args):
+        self.send(operation, *args)
+        return self.receive()
+
+    def close(self):
+        pass
+
+
+def serve_shard(connection, tree_kwargs):
+    """Worker process: answer (operation, arguments) requests from pipe until None is received"""
+    shard = Shard(BinarySearchTree(**tree_kwargs))
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        operation, args = request
+        try:
+            connection.send((True, getattr(shard, operation)(*args)))
+        except Exception as error:
+            connection.send((False, error))
+    connection.close()
+
+
+class ProcessShard(LocalShard):
+    """
+    Shard whose tree lives in a worker process, requests and results go through a local pipe.
+    send() returns at once, so requests sent to several shards before receive() run at the same time
+    """
+    def __init__(self, tree_kwargs):
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve_shard, args=(worker_connection, tree_kwargs),
+                                               daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+    def send(self, operation, *args):
+        self.connection.send((operation, args))
+
+    def receive(self):
+        ok, result = self.connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(None)
+            self.process.join()
+        self.connection.close()
+
+
+class ShardedEmployeeStore:
+    """
+    Employees partitioned by ID across several BinarySearchTree shards, by ID range (shard i holds IDs from
+    boundaries[i - 1] up to boundaries[i]) or by hash of ID. With processes=True every shard lives in its own
+    worker process, so batches and scans sent to many shards run on many cores.
+    Searches, adds and removes go to the shard of the ID. Scans are merged from shards in global ID order.
+    Range shards are rebalanced (boundaries moved to equal shard sizes) when the largest shard grows to
+    rebalance_ratio times the average. Employee data is returned as dictionary in file format.
+    A store is not safe for use by many threads at the same time
+    """
+    # Rebalance only stores of at least this many employees
+    min_rebalance_size = 256
+
+    def __init__(self, shards=4, partition="range", processes=False, rebalance_ratio=2.0, **kwargs):
+        if shards < 1:
+            raise ValueError("Number of shards must be at least 1")
+        if partition not in ("range", "hash"):
+            raise ValueError("Partition must be 'range' or 'hash'")
+        self.partition = partition
+        self.rebalance_ratio = rebalance_ratio
+        # Other keyword arguments are passed to BinarySearchTree of each shard (i.e. compact=True, engine="btree")
+        shard_type = ProcessShard if processes else LocalShard
+        self.shards = [shard_type(kwargs) for _ in range(shards)]
+        # Range partition: smallest ID of shards 1, 2...; shards after the last boundary are empty until rebalance
+        self.boundaries = []
+        # Number of employees of each shard
+        self.sizes = [0] * shards
+        self.rebalances = 0
+
+    @classmethod
+    def from_records(cls, records, shards=4, partition="range", processes=False, **kwargs):
+        """Create store holding employee records (list of dictionary as loaded from file), shards equally filled"""
+        rows = sorted((record_row(i) for i in records), key=itemgetter(0))
+        store = cls(shards, partition, processes, **kwargs)
+        # Drop duplicated IDs, keep the first one like add_employee does
+        store.load(unique_rows(rows))
+        return store
+
+    def __len__(self):
+        return sum(self.sizes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_employee(self, id, name, dob, pob):
+        """Add new employee, return True if added, False if ID existed or is not a number"""
+        id = parse_id(id)
+        if id is None:
+            print("Invalid ID.")
+            return False
+        index = self.shard_of(id)
+        added = self.shards[index].call("add", id, name, dob, pob)
+        if added:
+            self.sizes[index] += 1
+            self.rebalance_if_skewed()
+        return added
+
+    def add_employees(self, records):
+        """Add a batch of employee records, return list of status (see BinarySearchTree.add_employees)"""
+        groups = self.group_by_shard([record_row(i)[0] for i in records])
+        status = self.fan_out("add_many", {index: [records[i] for i in group] for index, group in groups.items()},
+                              groups, len(records))
+        for index, group in groups.items():
+            self.sizes[index] += sum(status[i] for i in group)
+        self.rebalance_if_skewed()
+        return status
+
+    def close(self):
+        """Stop worker processes of shards"""
+        for shard in self.shards:
+            shard.close()
+
+    def fan_out(self, operation, arguments, groups, length):
+        """
+        Send operation with its list argument to every shard of arguments ({shard index: list}) at once,
+        then put the results of each shard back at its positions in batch (groups, see group_by_shard)
+        """
+        for index, argument in arguments.items():
+            self.shards[index].send(operation, argument)
+        # An ID left out of groups (not a number) gets False
+        results = [False] * length
+        for index in arguments:
+            for position, result in zip(groups[index], self.shards[index].receive()):
+                results[position] = result
+        return results
+
+    def group_by_shard(self, ids):
+        """Return {shard index: positions in batch of IDs which belong to the shard}, None IDs are left out"""
+        groups = {}
+        for position, id in enumerate(ids):
+            if id is None:
+                continue
+            groups.setdefault(self.shard_of(id), []).append(position)
+        return groups
+
+    def inorder(self):
+        """Return list of all employee data in ID order"""
+        return list(self.iter_range())
+
+    def iter_range(self, low=None, high=None, chunk_size=1000):
+        """
+        Yield employee data whose ID is from low to high (None means no limit) in ID order.
+        Rows are fetched from shards chunk_size at a time, each chunk restarts from the last ID,
+        so changes made between chunks never break the walk
+        """
+        if self.partition == "range":
+            # Shards hold consecutive ID ranges: walk only shards overlapping the range, one after another
+            first = 0 if low is None else self.shard_of(low)
+            last = len(self.shards) - 1 if high is None else self.shard_of(high)
+            for index in range(first, last + 1):
+                for row in self.shard_rows(index, low, high, chunk_size):
+                    yield row_record(row)
+            return
+
+        # Every shard may hold any ID: merge ID ordered rows of all shards
+        for row in heapq.merge(*(self.shard_rows(index, low, high, chunk_size) for index in range(len(self.shards))),
+                               key=itemgetter(0)):
+            yield row_record(row)
+
+    def load(self, rows):
+        """Replace all employees by ID sorted rows of unique IDs, range shards get equal parts"""
+        count = len(self.shards)
+        if self.partition == "range":
+            # Boundary of each shard is the first ID of its part
+            starts = [len(rows) * index // count for index in range(count + 1)]
+            parts = {index: rows[starts[index]:starts[index + 1]] for index in range(count)}
+            self.boundaries = [rows[start][0] for start in starts[1:-1] if start < len(rows)]
+        else:
+            parts = {index: [] for index in range(count)}
+            for row in rows:
+                parts[self.shard_of(row[0])].append(row)
+        for index, part in parts.items():
+            self.shards[index].send("load", part)
+        for index in parts:
+            self.sizes[index] = self.shards[index].receive()
+
+    def range_query(self, low, high):
+        """Return list of employee data whose ID is from low to high in ID order"""
+        return list(self.iter_range(low, high))
+
+    def rebalance(self):
+        """Move boundaries of range shards so every shard holds an equal part of employees"""
+        if self.partition != "range":
+            return
+        rows = []
+        for index in range(len(self.shards)):
+            rows.extend(self.shard_rows(index, None, None, None))
+        self.load(rows)
+        self.rebalances += 1
+
+    def rebalance_if_skewed(self):
+        """Rebalance range shards if the largest one holds rebalance_ratio times the average or more"""
+        total = len(self)
+        if (self.partition == "range" and total >= self.min_rebalance_size and
+                max(self.sizes) >= self.rebalance_ratio * total / len(self.shards)):
+            self.rebalance()
+
+    def remove_employee(self, id):
+        """Remove employee by ID, return True if removed, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None:
+            return False
+        index = self.shard_of(id)
+        removed = self.shards[index].call("remove", id)
+        if removed:
+            self.sizes[index] -= 1
+        return removed
+
+    def remove_employees(self, ids):
+        """Remove a batch of employees by ID, return list of status (see BinarySearchTree.remove_employees)"""
+        ids = [parse_id(id) for id in ids]
+        groups = self.group_by_shard(ids)
+        status = self.fan_out("remove_many", {index: [ids[i] for i in group] for index, group in groups.items()},
+                              groups, len(ids))
+        for index, group in groups.items():
+            self.sizes[index] -= sum(status[i] for i in group)
+        return status
+
+    def search(self, id):
+        """Return employee data with input ID, False if ID does not exist"""
+        id = parse_id(id)
+        if id is None:
+            return False
+        row = self.shards[self.shard_of(id)].call("search", id)
+        return row_record(row) if row else False
+
+    def search_many(self, ids):
+        """Return list of employee data (False if ID does not exist) of a batch of IDs, shards search together"""
+        ids = [parse_id(id) for id in ids]
+        groups = self.group_by_shard(ids)
+        rows = self.fan_out("search_many", {index: [ids[i] for i in group] for index, group in groups.items()},
+                            groups, len(ids))
+        return [row_record(row) if row else False for row in rows]
+
+    def shard_of(self, id):
+        """Index of the shard which holds ID"""
+        if self.partition == "range":
+            return bisect_right(self.boundaries, id)
+        return hash(id) % len(self.shards)
+
+    def shard_rows(self, index, low, high, chunk_size):
+        """Yield rows of a shard whose ID is from low to high, fetched chunk_size at a time (None: all at once)"""
+        include_low = True
+        while True:
+            rows = self.shards[index].call("range_rows", low, high, include_low, chunk_size)
+            yield from rows
+            if chunk_size is None or len(rows) < chunk_size:
+                return
+            low, include_low = rows[-1][0], False
+
+    def verify(self):
+        """
+        Check every shard tree, that each ID is in the right shard and sizes are right.
+        Return number of employees, raise AssertionError if something is broken
+        """
+        for index, shard in enumerate(self.shards):
+            assert shard.call("verify") == self.sizes[index], f"Wrong size of shard {index}"
+            for row in self.shard_rows(index, None, None, None):
+                assert self.shard_of(row[0]) == index, f"ID {row[0]} is in shard {index}"
+        return len(self)
+
@@ -0,0 +1,178 @@
+import io
+import random
+from contextlib import redirect_stdout
+from datetime import date
+
+import pytest
+
+from binary_search_tree import BinarySearchTree
+from employee_record import parse_dob
+from read_write_file import write_records
+
+# Options of every engine, B+-tree pages are small so pages split and merge often
+ENGINES = {"avl": {}, "rbtree": {}, "btree": {"page_size": 4}}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_random_changes_keep_structure(engine):
+    """Randomized insert/delete: structure stays consistent, traversals, rank/select, ranges, indexes and batches"""
+    rng = random.Random(0)
+    for _ in range(50):
+        tree = BinarySearchTree(engine=engine, indexed=True, **ENGINES[engine])
+        assert tree.engine == engine
+        ids = set()
+        for _ in range(500):
+            id = rng.randint(1, 300)
+            if rng.random() < 0.6:
+                if id not in ids:
+                    tree.add_employee(id, "sth", "sth", f"P{id % 3}")
+                    ids.add(id)
+            else:
+                tree.remove_employee(id)
+                ids.discard(id)
+            assert tree.verify() == len(ids)
+
+        ordered = sorted(ids)
+        assert [node.id for node in tree.iter_inorder(tree.root)] == ordered
+        assert sorted(node.id for node in tree.iter_bfs(tree.root)) == ordered
+        for k, id in enumerate(ordered, 1):
+            assert tree.select(k).id == id and tree.rank(id) == k - 1
+        low, high = sorted(rng.sample(range(0, 302), 2))
+        in_range = [id for id in ordered if low <= id <= high]
+        assert tree.count_range(low, high) == len(in_range)
+        assert [node.id for node in tree.range_query(low, high)] == in_range
+        assert [node.id for node in tree.iter_range_reverse(high, low)] == in_range[::-1]
+        ceiling, floor = tree.find_ceiling(low, False), tree.find_floor(high, False)
+        assert (ceiling and ceiling.id) == next((id for id in ordered if id > low), None)
+        assert (floor and floor.id) == next((id for id in reversed(ordered) if id < high), None)
+        if ordered:
+            node = tree.find_ceiling()
+            for id in ordered[1:]:
+                node = tree.next_node(node)
+                assert node.id == id and tree.previous_node(node).id < id
+            assert tree.next_node(node) is None
+        assert [node.id for node in tree.find_by_pob("P1")] == [id for id in ordered if id % 3 == 1]
+
+        # Batches small (one by one) and big (rebuild) give the same status as on a set
+        batch = [rng.randint(1, 400) for _ in range(rng.choice((5, 500)))]
+        status = tree.add_employees([{"ID": id, "Name": "b", "Date of Birth": "b", "Place of Birth": "P0"}
+                                     for id in batch])
+        expected = []
+        for id in batch:
+            expected.append(id not in ids)
+            ids.add(id)
+        assert status == expected and tree.verify() == len(ids)
+        batch = [rng.randint(1, 400) for _ in range(rng.choice((5, 500)))]
+        expected = []
+        for id in batch:
+            expected.append(id in ids)
+            ids.discard(id)
+        assert tree.remove_employees(batch) == expected and tree.verify() == len(ids)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_search_cache_matches_tree(engine, policy):
+    """Cached searches match the tree after removals, case 3 moves and rebuilds"""
+    rng = random.Random(1)
+    tree = BinarySearchTree(cache_size=32, cache_policy=policy, engine=engine, **ENGINES[engine])
+    ids = set()
+    for step in range(20000):
+        id = rng.randint(1, 300)
+        if rng.random() < 0.3:
+            if id not in ids:
+                tree.add_employee(id, f"Employee {id}", "sth", "sth")
+                ids.add(id)
+        elif rng.random() < 0.3:
+            tree.remove_employee(id)
+            ids.discard(id)
+        elif step % 5000 == 0:
+            tree.rebuild([(node.id, node.name, node.dob, node.pob) for node in tree.iter_inorder(tree.root)])
+        else:
+            # Skewed searches, so some IDs stay in cache for long
+            id = min(id, rng.randint(1, 300))
+            node = tree.search(id, tree.root)
+            assert (node.id, node.name) == (id, f"Employee {id}") if id in ids else node is False
+    assert len(tree.cache) <= 32 and tree.cache.hits > 0
+
+    # delete_node checks the node without going through cache, so each removal is a single lookup
+    lookups = tree.cache.hits + tree.cache.misses
+    for id in list(ids)[:10]:
+        tree.remove_employee(id)
+    assert tree.cache.hits + tree.cache.misses == lookups + 10
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_metrics_count_operations(engine):
+    """Operation counts match the calls, tree goes back to plain methods when metrics are disabled"""
+    tree = BinarySearchTree(engine=engine, metrics=True, **ENGINES[engine])
+    for id in range(1, 101):
+        tree.add_employee(id, "sth", "sth", "sth")
+    for id in range(1, 101, 2):
+        tree.remove_employee(id)
+    metrics = tree.metrics.as_dict()
+    assert metrics["operations"]["insert"] == 100 and metrics["operations"]["delete"] == 50
+    # Only the search of each remove_employee is counted, not the check inside delete_node
+    assert metrics["operations"]["search"] == 50
+    assert metrics["size"] == 50 and metrics["search_visits"]["count"] == metrics["operations"]["search"]
+    if engine == "avl":
+        assert metrics["counters"]["rotations_single"] > 0 and metrics["height"] <= metrics["height_bound"]
+    assert tree.metrics.prometheus().count("_operation_seconds_count") == 3
+    tree.disable_metrics()
+    assert tree.metrics is None and "insert" not in vars(tree) and "search" not in vars(tree)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("indexed", [False, True])
+def test_typed_records(engine, indexed):
+    """Typed tree keeps the same employees and file as untyped tree, date and place queries match parsed text"""
+    rng = random.Random(2)
+    places = ["VT", "USA", "UK", "HCM", "Ha Noi"]
+    records = [{"ID": str(id), "Name": f"Employee {id}", "Place of Birth": rng.choice(places),
+                "Date of Birth": rng.choice([date.fromordinal(rng.randint(710000, 740000)).strftime("%d/%m/%Y"),
+                                             "31/02/1990", "sth"])} for id in rng.sample(range(1, 5000), 2000)]
+    plain = BinarySearchTree.from_records(records, engine=engine, **ENGINES[engine])
+    tree = BinarySearchTree.from_records(records, engine=engine, typed=True, indexed=indexed, **ENGINES[engine])
+    for id in rng.sample(range(5000, 6000), 200):
+        place = rng.choice(places)
+        for t in (plain, tree):
+            t.add_employee(str(id), "Added", "01/01/1990", place)
+    for id in rng.sample(range(1, 6000), 500):
+        plain.remove_employee(id)
+        tree.remove_employee(id)
+    assert tree.verify() == plain.verify()
+    texts = []
+    for t in (plain, tree):
+        texts.append(io.StringIO())
+        write_records(texts[-1], t.iter_records(t.root))
+    assert texts[0].getvalue() == texts[1].getvalue()
+
+    nodes = list(tree.iter_inorder(tree.root))
+    assert all(node.dob.day == parse_dob(node.dob) and tree.parser.places[node.pob.code] == node.pob
+               for node in nodes)
+    for before in ("01/01/1990", "29/02/2000", "15/06/1960"):
+        for inclusive in (False, True):
+            limit = parse_dob(before)
+            expected = sorted((node for node in nodes if parse_dob(node.dob) is not None and
+                               (parse_dob(node.dob) <= limit if inclusive else parse_dob(node.dob) < limit)),
+                              key=lambda node: (parse_dob(node.dob), node.id))
+            assert tree.find_born_before(before, inclusive) == expected
+            assert [node.id for node in plain.find_born_before(before, inclusive)] == [node.id for node in expected]
+    groups = tree.group_by_pob()
+    assert list(groups) == list(dict.fromkeys(node.pob for node in nodes))
+    assert {place: [node.id for node in group] for place, group in groups.items()} == \
+           {place: [node.id for node in group] for place, group in plain.group_by_pob().items()}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_id_array_with_ids_out_of_int64(engine):
+    """add_employee rejects an ID which does not fit int64, one inserted directly drops the maintained ID array"""
+    tree = BinarySearchTree(engine=engine, maintain_id_array=True, **ENGINES[engine])
+    for id in range(1, 21):
+        tree.add_employee(id, "sth", "sth", "sth")
+    assert [bool(node) for node in tree.search_many([5, 25])] == [True, False]
+    with redirect_stdout(io.StringIO()):
+        assert tree.add_employee(2 ** 70, "sth", "sth", "sth") is False
+    tree.insert(tree.root, 2 ** 70, "sth", "sth", "sth")
+    assert [node.id if node else node for node in tree.search_many([5, 2 ** 70, -2 ** 70])] == [5, 2 ** 70, False]
+    tree.verify()
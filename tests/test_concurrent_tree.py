@@ -0,0 +1,68 @@
+import random
+import threading
+
+from concurrent_tree import ConcurrentEmployeeTree
+
+
+def employee(id):
+    # Every field is derived from ID, so a half-updated employee is detected by readers
+    return id, f"Employee {id}", f"{id % 28 + 1:02}/01/1990", f"P{id % 7}"
+
+
+def test_readers_never_see_half_updates():
+    """Writers add/remove while readers search, scan snapshots and check what they see"""
+    store = ConcurrentEmployeeTree()
+    errors = []
+    stop = threading.Event()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            id = rng.randint(1, 2000)
+            if rng.random() < 0.6:
+                store.add_employee(*employee(id))
+            else:
+                store.remove_employee(id)
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            try:
+                found = store.search(rng.randint(1, 2000))
+                if found and tuple(found.values()) != employee(found["ID"]):
+                    errors.append(f"Half-updated employee {found}")
+                rows = store.snapshot()
+                if any(rows[i][0] >= rows[i + 1][0] for i in range(len(rows) - 1)):
+                    errors.append("Snapshot is not in ID order")
+                if any(row != employee(row[0]) for row in rows):
+                    errors.append("Snapshot has a half-updated employee")
+            except Exception as error:
+                errors.append(repr(error))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(2)]
+    threads += [threading.Thread(target=reader, args=(i + 100,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    stop.wait(2)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    store.tree.verify()
+    assert not errors, errors[:5]
+
+
+def test_snapshot_is_unchanged_by_later_writes():
+    """Snapshot keeps the employees of its moment, a new one has every change (batches too)"""
+    store = ConcurrentEmployeeTree()
+    for id in range(0, 100, 2):
+        store.add_employee(*employee(id))
+    before = store.snapshot()
+    store.remove_employee(10)
+    store.add_employees([dict(zip(("ID", "Name", "Date of Birth", "Place of Birth"), employee(id)))
+                         for id in (1, 3, 4)])
+    store.remove_employees([20, 21, 22])
+    after = store.snapshot()
+    assert list(before) == [employee(id) for id in range(0, 100, 2)] and before[5] == employee(10)
+    assert list(after) == [tuple(found.values()) for found in store.inorder()]
+    assert len(after) == len(before) - 1 and after[-1] == employee(98) and after[1:3] == [employee(1), employee(2)]
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from disk_tree import DiskTree
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_random_operations_and_reopen(tmp_path, policy):
+    """Random operations on small pages and a tiny page cache checked against a dictionary, then reopen"""
+    rng = random.Random(23)
+
+    def employee(id):
+        # Names of different lengths, so leaves hold different numbers of employees
+        return id, "Employee " + "x" * rng.randint(0, 60), f"{id % 28 + 1:02}/01/1990", f"P{id % 7}"
+
+    file_path = tmp_path / f"employees.{policy}.tree"
+    initial = rng.sample(range(1, 4000), 500)
+    expected = {id: employee(id) for id in initial}
+    tree = DiskTree.from_rows(file_path, expected.values(), page_size=256, cache_pages=4, cache_policy=policy)
+    assert tree.verify() == len(expected)
+    for step in range(6000):
+        id = rng.randint(1, 4000)
+        choice = rng.random()
+        if choice < 0.45:
+            row = employee(id)
+            assert tree.insert(tree.root, *row, quiet=True) == (id not in expected)
+            expected.setdefault(id, row)
+        elif choice < 0.9:
+            assert tree.remove_employee(id) == (expected.pop(id, None) is not None)
+        else:
+            found = tree.search(id, tree.root)
+            assert (found and (found.id, found.name, found.dob, found.pob)) == expected.get(id, False)
+        if step % 500 == 0:
+            assert tree.verify() == len(expected)
+            low = rng.randint(1, 4000)
+            assert [e.id for e in tree.iter_range(low, low + 300)] == \
+                   [i for i in sorted(expected) if low <= i <= low + 300]
+    tree.verify()
+    tree.close()
+
+    # Everything is read back from file
+    with DiskTree(file_path) as tree:
+        assert tree.verify() == len(expected)
+        assert [(e.id, e.name, e.dob, e.pob) for e in tree.iter_inorder(tree.root)] == \
+               [expected[i] for i in sorted(expected)]
+        # Remove all: pages go to the free list and are used again
+        for id in list(expected):
+            assert tree.remove_employee(id)
+        assert tree.root == 0 and tree.verify() == 0
+        for id in range(1, 300):
+            assert tree.add_employee(*employee(id))
+        assert tree.verify() == 299
+
+
+@pytest.mark.parametrize("page_size", [255, 2 ** 16, 2 ** 17])
+def test_page_size_out_of_header_range(tmp_path, page_size):
+    """Page sizes whose counts do not fit the page header are rejected before a file is created"""
+    file_path = tmp_path / "employees.tree"
+    with pytest.raises(ValueError):
+        DiskTree(file_path, page_size=page_size)
+    assert not file_path.exists()
+
+
+def test_largest_page_size(tmp_path):
+    """Pages of the largest size hold long texts and many employees"""
+    rows = [(id, "x" * 3000, "01/01/1990", "VT") for id in range(1, 200)]
+    with DiskTree.from_rows(tmp_path / "employees.tree", rows, page_size=2 ** 16 - 1) as tree:
+        assert tree.verify() == len(rows)
+        assert [(e.id, e.name) for e in tree.iter_inorder(tree.root)] == [row[:2] for row in rows]
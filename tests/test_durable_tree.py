@@ -0,0 +1,76 @@
+import random
+
+from durable_tree import LOG_FILE, MAX_TEXT_SIZE, DurableEmployeeTree
+
+
+def employees(store):
+    return {node.id: node.name for node in store.tree.iter_inorder(store.tree.root)}
+
+
+def test_recovery_after_crash(tmp_path):
+    """Changes without close() (like a crash after fsync) are recovered, a torn record at the end is cut"""
+    rng = random.Random(0)
+    expected = {}
+    store = DurableEmployeeTree(tmp_path, compact_bytes=4096)
+    for _ in range(3000):
+        id = rng.randint(1, 500)
+        if rng.random() < 0.6:
+            if id not in expected:
+                store.add_employee(id, f"Employee {id}", "01/01/2000", "VT")
+                expected[id] = f"Employee {id}"
+        elif store.remove_employee(id):
+            del expected[id]
+    store.compact(wait=True)
+    store.add_employee(1000, "After compaction", "01/01/2000", "VT")
+    expected[1000] = "After compaction"
+    store.sync()
+
+    # Simulate a torn record at the end of log
+    with open(store.path(f"wal.{store.generation}.log"), "ab") as f:
+        f.write(b"\x10\x00\x00")
+
+    recovered = DurableEmployeeTree(tmp_path)
+    assert employees(recovered) == expected
+    recovered.tree.verify()
+    recovered.close()
+    store.close()
+
+
+def test_changes_after_snapshot_without_log(tmp_path):
+    """Snapshot N with no log of generation >= N: new changes must go to a log which recovery replays"""
+    store = DurableEmployeeTree(tmp_path)
+    store.add_employee(1, "Before compaction", "01/01/2000", "VT")
+    store.compact(wait=True)
+    store.close()
+    for name in store.files(LOG_FILE).values():
+        (tmp_path / name).unlink()
+
+    store = DurableEmployeeTree(tmp_path)
+    assert store.add_employee(2, "After reopen", "01/01/2000", "VT")
+    store.close()
+
+    recovered = DurableEmployeeTree(tmp_path)
+    assert employees(recovered) == {1: "Before compaction", 2: "After reopen"}
+    recovered.close()
+
+
+def test_too_long_text_is_rejected(tmp_path):
+    """Text which does not fit its length field is rejected before tree and log are changed"""
+    store = DurableEmployeeTree(tmp_path)
+    assert not store.add_employee(1, "x" * (MAX_TEXT_SIZE + 1), "01/01/2000", "VT")
+    assert store.add_employee(2, "x" * MAX_TEXT_SIZE, "01/01/2000", "VT")
+    assert not store.tree.search(1, store.tree.root)
+    store.close()
+
+    recovered = DurableEmployeeTree(tmp_path)
+    assert employees(recovered) == {2: "x" * MAX_TEXT_SIZE}
+    recovered.close()
+
+
+def test_close_twice(tmp_path):
+    """Second close() does nothing, sync thread is stopped by the first"""
+    store = DurableEmployeeTree(tmp_path)
+    store.add_employee(1, "A", "01/01/2000", "VT")
+    store.close()
+    store.close()
+    assert not store.syncer.is_alive()
@@ -0,0 +1,74 @@
+import random
+from datetime import date
+
+import pytest
+
+import employee_aggregate
+from binary_search_tree import BinarySearchTree
+from employee_record import parse_dob
+
+TODAY = date(2024, 2, 29)
+PLACES = ["VT", "USA", "UK", "HCM", "Ha Noi"]
+QUERIES = [("pob", None), ("name", None), ("dob", None), ("dob", "day"), ("dob", "month"), ("dob", "decade"),
+           ("age", None), ("age", 10)]
+ENGINES = {"avl": {}, "rbtree": {}, "btree": {"page_size": 8}}
+
+
+def expected_count(nodes, field, by):
+    """Count groups from text of every node, as a report script would"""
+    counts = {}
+    for node in nodes:
+        if field in ("name", "pob"):
+            key = getattr(node, field)
+        else:
+            day = parse_dob(node.dob)
+            if day is None:
+                continue
+            born = date.fromordinal(day)
+            if field == "age":
+                age = TODAY.year - born.year - ((TODAY.month, TODAY.day) < (born.month, born.day))
+                key = age // (by or 1) * (by or 1)
+            else:
+                keys = {"day": born, "month": (born.year, born.month), "decade": born.year // 10 * 10}
+                key = keys.get(by, born.year)
+        counts[key] = counts.get(key, 0) + 1
+    return dict(sorted(counts.items()))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("typed", [False, True])
+@pytest.mark.parametrize("numpy", [True, False])
+def test_aggregates(monkeypatch, engine, typed, numpy):
+    """Streaming and columnar counts over the whole roster and ID ranges match counts from text"""
+    if not numpy:
+        monkeypatch.setattr(employee_aggregate, "np", None)
+    elif employee_aggregate.np is None:
+        pytest.skip("NumPy is not installed")
+    rng = random.Random(5)
+    records = [{"ID": id, "Name": rng.choice(["An", "Binh", "Chi"]), "Place of Birth": rng.choice(PLACES),
+                "Date of Birth": rng.choice([date.fromordinal(rng.randint(690000, 740000)).strftime("%d/%m/%Y"),
+                                             "29/02/2000", "01/03/1980", "31/02/1990", "sth"])}
+               for id in rng.sample(range(1, 5000), 1500)]
+    tree = BinarySearchTree.from_records(records, engine=engine, typed=typed, **ENGINES[engine])
+    for _ in range(3):
+        # Change tree between rounds: columns of the old employees must not be used
+        for id in rng.sample(range(1, 6000), 300):
+            if rng.random() < 0.5:
+                tree.remove_employee(id)
+            elif not tree.search(id, tree.root):
+                tree.add_employee(id, "Added", rng.choice(["01/01/1990", "bad"]), rng.choice(PLACES + ["New"]))
+        assert tree.columns is None
+        nodes = list(tree.iter_inorder(tree.root))
+        low, high = sorted(rng.sample(range(0, 6000), 2))
+        in_range = [node for node in nodes if low <= node.id <= high]
+        for field, by in QUERIES:
+            # Streaming over a range (columns not built yet), columns over all, then columns over a range
+            assert tree.group_by(field, by, low, high, TODAY).count() == expected_count(in_range, field, by)
+            assert tree.histogram(field, by, today=TODAY) == expected_count(nodes, field, by)
+            assert tree.group_by(field, by, low, high, TODAY).count() == expected_count(in_range, field, by)
+            groups = tree.group_by(field, by, low, high, TODAY).nodes()
+            assert {key: len(group) for key, group in groups.items()} == expected_count(in_range, field, by)
+            assert all([node.id for node in group] == sorted(node.id for node in group)
+                       for group in groups.values())
+            tree.columns = None
+        assert tree.age_distribution(today=TODAY) == expected_count(nodes, "age", 10)
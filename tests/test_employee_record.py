@@ -0,0 +1,65 @@
+import io
+import pickle
+from contextlib import redirect_stdout
+
+import pytest
+
+from binary_search_tree import BinarySearchTree
+from concurrent_tree import ConcurrentEmployeeTree
+from disk_tree import DiskTree
+from durable_tree import DurableEmployeeTree
+from employee_record import RecordParser, node_record, parse_id, record_row, row_record, unique_rows
+from persistent_tree import PersistentBinarySearchTree
+from sharded_store import ShardedEmployeeStore
+
+
+def test_parse_id():
+    assert [parse_id(value) for value in (5, "12", " 7\n", "", "abc", "1.5", None)] == [5, 12, 7] + [None] * 4
+    limits = [2 ** 63 - 1, -2 ** 63]
+    assert [parse_id(value) for value in limits + [2 ** 63, str(-2 ** 63 - 1)]] == limits + [None, None]
+    assert record_row({"ID": "3", "Name": "A", "Date of Birth": "01/01/1990", "Place of Birth": "VT"})[0] == 3
+    with pytest.raises(ValueError):
+        record_row({"ID": "x", "Name": "A", "Date of Birth": "01/01/1990", "Place of Birth": "VT"})
+
+
+def test_unique_rows_and_records():
+    rows = [(1, "A", "01/01/1990", "VT"), (1, "B", "01/01/1990", "VT"), (2, "C", "02/02/1990", "UK")]
+    with redirect_stdout(io.StringIO()) as output:
+        assert unique_rows(rows) == [rows[0], rows[2]]
+    assert output.getvalue() == "Invalid ID.\n"
+    record = row_record(rows[2])
+    assert record_row(record) == rows[2] and node_record(BinarySearchTree.from_rows(rows[2:]).root) == record
+
+
+def test_typed_values_are_shared_and_picklable():
+    parser = RecordParser()
+    dob, pob = parser.date("29/02/2000"), parser.place("VT")
+    assert parser.date("29/02/2000") is dob and parser.place("VT") is pob and parser.place("UK").code == 1
+    assert parser.date("31/02/2000").day is None
+    copy = pickle.loads(pickle.dumps((dob, pob)))
+    assert copy == ("29/02/2000", "VT") and copy[0].day == dob.day and copy[1].code == pob.code
+
+
+def stores(tmp_path):
+    yield BinarySearchTree()
+    yield ConcurrentEmployeeTree()
+    yield PersistentBinarySearchTree()
+    yield DurableEmployeeTree(tmp_path / "durable")
+    yield ShardedEmployeeStore(shards=2)
+    yield DiskTree(tmp_path / "employees.tree")
+
+
+def test_invalid_ids_are_rejected(tmp_path):
+    """An ID which is not a number or does not fit 64 bits is refused with a False status by every store"""
+    for store in stores(tmp_path):
+        with redirect_stdout(io.StringIO()):
+            assert store.add_employee("abc", "A", "01/01/1990", "VT") is False
+            assert store.add_employee(2 ** 70, "A", "01/01/1990", "VT") is False
+        assert store.add_employee("1", "A", "01/01/1990", "VT") is not False
+        assert store.remove_employee("abc") is False
+        if hasattr(store, "remove_employees"):
+            assert store.remove_employees(["abc", 1, "1"]) == [False, True, False]
+        if isinstance(store, (ConcurrentEmployeeTree, ShardedEmployeeStore)):
+            assert store.search("abc") is False
+        if hasattr(store, "close"):
+            store.close()
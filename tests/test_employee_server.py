@@ -0,0 +1,94 @@
+import asyncio
+import gc
+import json
+
+from binary_search_tree import BinarySearchTree
+from employee_server import EmployeeServer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def start(tmp_path, tree):
+    server = EmployeeServer(tree, chunk_size=10)
+    path = str(tmp_path / "server.sock")
+    listener = await server.start(unix_path=path)
+    reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 20)
+    return server, listener, reader, writer
+
+
+def test_search_batches(tmp_path):
+    """Searches sent together are answered in batches, each with the employee of its ID (repeated IDs too)"""
+    async def check():
+        tree = BinarySearchTree.from_rows([(id, f"Employee {id}", "01/01/2000", "VT") for id in range(0, 200, 2)],
+                                          maintain_id_array=True)
+        server, listener, reader, writer = await start(tmp_path, tree)
+        ids = [5, 4, 198, 4, 500, 0, 7, 100]
+        writer.write(b"".join(json.dumps({"id": n, "op": "search", "ID": id}).encode() + b"\n"
+                              for n, id in enumerate(ids)))
+        await writer.drain()
+        answers = {}
+        for _ in ids:
+            answer = json.loads(await reader.readline())
+            answers[answer["id"]] = answer["result"]
+        assert [answers[n] and answers[n]["ID"] for n in range(len(ids))] == \
+               [id if id % 2 == 0 and id < 200 else None for id in ids]
+        assert server.batched_searches == len(ids) and server.batches < len(ids)
+
+        # A change between batches is seen by the next batch
+        writer.write(json.dumps({"id": 0, "op": "remove", "ID": 4}).encode() + b"\n")
+        writer.write(json.dumps({"id": 1, "op": "search", "ID": 4}).encode() + b"\n")
+        await writer.drain()
+        answers = [json.loads(await reader.readline()) for _ in range(2)]
+        assert {answer["id"]: answer["result"] for answer in answers} == {0: True, 1: None}
+        writer.close()
+        listener.close()
+        server.batcher.cancel()
+    run(check())
+
+
+def test_lost_connection_cancels_requests(tmp_path):
+    """Client which goes away during a streamed answer leaves no running task and no unretrieved error"""
+    async def check():
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        tree = BinarySearchTree.from_rows([(id, "x" * 1000, "01/01/2000", "VT") for id in range(20000)])
+        server, listener, reader, writer = await start(tmp_path, tree)
+        writer.write(b"".join(json.dumps({"id": n, "op": "traverse"}).encode() + b"\n" for n in range(3)))
+        await writer.drain()
+        await reader.readline()
+        writer.transport.abort()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        assert tasks == [server.batcher]
+        gc.collect()
+        listener.close()
+        server.batcher.cancel()
+        assert not errors
+    run(check())
+
+
+def test_failed_search_batch(tmp_path):
+    """ID out of int64 is refused, a batch which fails answers its searches with errors and later ones still work"""
+    async def check():
+        tree = BinarySearchTree.from_rows([(id, f"Employee {id}", "01/01/2000", "VT") for id in range(10)])
+        server, listener, reader, writer = await start(tmp_path, tree)
+
+        async def search(id):
+            writer.write(json.dumps({"id": 0, "op": "search", "ID": id}).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        assert (await search(2 ** 70))["ok"] is False
+        search_many = tree.search_many
+        tree.search_many = lambda ids: 1 / 0
+        assert (await search(3))["ok"] is False
+        tree.search_many = search_many
+        assert (await search(3))["result"]["ID"] == 3
+        writer.close()
+        listener.close()
+        server.batcher.cancel()
+    run(check())
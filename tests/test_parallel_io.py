@@ -0,0 +1,61 @@
+import io
+import json
+import random
+from contextlib import redirect_stdout
+
+import pytest
+
+from binary_search_tree import BinarySearchTree
+from parallel_io import export_parallel, load_parallel
+from read_write_file import write_records, write_snapshot
+
+
+def rows_of(tree):
+    return [(node.id, node.name, node.dob, node.pob) for node in tree.iter_inorder(tree.root)]
+
+
+@pytest.mark.parametrize("n", [0, 1, 7, 1000, 5003])
+def test_load_and_export(tmp_path, n):
+    """Every file format loads to the same tree with any number of workers, export matches write_records"""
+    rng = random.Random(n)
+    ids = rng.sample(range(1, 10 * n + 2), n)
+    records = [{"ID": str(id), "Name": f"Employee {id}", "Date of Birth": f"0{id % 9 + 1}/01/1990",
+                "Place of Birth": rng.choice(["VT", "USA", "UK"])} for id in ids]
+    # Repeat some IDs: the first record of an ID wins
+    records += [dict(record, Name="Duplicate") for record in records[:n // 10]]
+    # Duplicated IDs print "Invalid ID." while loading
+    with redirect_stdout(io.StringIO()):
+        expected = BinarySearchTree.from_records(records)
+    expected_rows = rows_of(expected)
+
+    lines_path = tmp_path / "employees.jsonl"
+    lines_path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    snapshot_path = tmp_path / "employees.bin"
+    write_snapshot(snapshot_path, expected_rows)
+    json_path = tmp_path / "employees.json"
+    with open(json_path, "w") as f:
+        write_records(f, records)
+
+    for workers in (1, 2, 3):
+        for path in (lines_path, snapshot_path, json_path):
+            with redirect_stdout(io.StringIO()):
+                tree = load_parallel(path, workers)
+            assert tree.verify() == len(expected_rows)
+            assert rows_of(tree) == expected_rows
+
+        # Export is the same as write_records, JSON Lines load back to the same tree
+        for compact in (False, True):
+            text = io.StringIO()
+            write_records(text, expected.iter_records(expected.root), compact)
+            export_parallel(expected, json_path, workers, compact=compact, part_size=97)
+            assert json_path.read_text() == text.getvalue()
+        export_parallel(expected, lines_path, workers, json_lines=True, part_size=97)
+        assert rows_of(load_parallel(lines_path, workers)) == expected_rows
+
+
+def test_broken_record_offset(tmp_path):
+    """A broken record is reported with its byte offset"""
+    lines_path = tmp_path / "employees.jsonl"
+    lines_path.write_text('{"ID": 1, "Name": "A", "Date of Birth": "01/01/1990", "Place of Birth": "VT"}\n{"ID": 2}\n')
+    with pytest.raises(ValueError, match="at byte 78"):
+        load_parallel(lines_path, 2)
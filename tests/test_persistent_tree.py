@@ -0,0 +1,26 @@
+import random
+
+from persistent_tree import PersistentBinarySearchTree
+
+
+def test_versions_and_diff():
+    """Randomized updates: every retained version still reads as it was, diff matches the changed IDs"""
+    rng = random.Random(0)
+    tree = PersistentBinarySearchTree()
+    expected = [{}]
+    for _ in range(2000):
+        id = rng.randint(1, 500)
+        if rng.random() < 0.6:
+            if id not in expected[-1]:
+                tree.add_employee(id, f"Employee {id}", "01/01/2000", "VT")
+                expected.append({**expected[-1], id: f"Employee {id}"})
+        elif tree.remove_employee(id) is not False:
+            expected.append({key: value for key, value in expected[-1].items() if key != id})
+
+    assert tree.version == len(expected) - 1
+    for version, employees in enumerate(expected):
+        assert [node.id for node in tree.iter_inorder(version)] == sorted(employees)
+    for _ in range(200):
+        old, new = sorted(rng.sample(range(len(expected)), 2))
+        changed = [id for id, _, _ in tree.diff(old, new)]
+        assert changed == sorted(set(expected[old]) ^ set(expected[new]))
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from employee_record import row_record
+from sharded_store import ShardedEmployeeStore
+
+
+def employee(id):
+    return id, f"Employee {id}", f"{id % 28 + 1:02}/01/1990", f"P{id % 7}"
+
+
+@pytest.mark.parametrize("partition, processes, engine", [(partition, False, engine)
+                                                          for partition in ("range", "hash")
+                                                          for engine in ("avl", "rbtree", "btree")] +
+                         [("range", True, "avl"), ("hash", True, "avl")])
+def test_random_operations(partition, processes, engine):
+    """Random operations on a store checked against a dictionary of employees"""
+    rng = random.Random(11)
+    initial = rng.sample(range(1, 5000), 300)
+    store = ShardedEmployeeStore.from_records([row_record(employee(id)) for id in initial], 4, partition, processes,
+                                              engine=engine)
+    expected = {id: row_record(employee(id)) for id in initial}
+    with store:
+        for step in range(3000):
+            choice = rng.random()
+            # IDs grow over time, so new employees pile up in the last range shard
+            id = rng.randint(1, 5000 + 3 * step)
+            if choice < 0.5:
+                assert store.add_employee(*employee(id)) == (id not in expected)
+                expected.setdefault(id, row_record(employee(id)))
+            elif choice < 0.7:
+                assert store.remove_employee(id) == (expected.pop(id, None) is not None)
+            elif choice < 0.9:
+                assert store.search(id) == expected.get(id, False)
+            elif choice < 0.95:
+                low = rng.randint(1, 15000)
+                high = low + rng.randint(0, 3000)
+                assert store.range_query(low, high) == [expected[i] for i in sorted(expected) if low <= i <= high]
+            else:
+                ids = [rng.randint(1, 15000) for _ in range(50)]
+                if choice < 0.97:
+                    records = [row_record(employee(i)) for i in ids]
+                    status = [i not in expected and i not in ids[:position] for position, i in enumerate(ids)]
+                    assert store.add_employees(records) == status
+                    for i in ids:
+                        expected.setdefault(i, row_record(employee(i)))
+                elif choice < 0.99:
+                    status = [i in expected and i not in ids[:position] for position, i in enumerate(ids)]
+                    assert store.remove_employees(ids) == status
+                    for i in ids:
+                        expected.pop(i, None)
+                else:
+                    assert store.search_many(ids) == [expected.get(i, False) for i in ids]
+
+        assert store.verify() == len(expected)
+        assert store.inorder() == [expected[i] for i in sorted(expected)]
+        assert list(store.iter_range(chunk_size=7)) == store.inorder()
+        if partition == "range":
+            assert store.rebalances > 0
+            assert max(store.sizes) < store.rebalance_ratio * len(store) / len(store.shards)
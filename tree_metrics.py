@@ -0,0 +1,159 @@
+import math
+import time
+from functools import wraps
+
+# Upper bounds of latency buckets in seconds, and of node visit buckets per search
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2, 0.1, 1.0, math.inf)
+VISIT_BUCKETS = (1, 2, 4, 8, 12, 16, 20, 24, 32, 48, 64, math.inf)
+
+
+class Histogram:
+    """Counts of values per bucket (bucket i holds values <= bounds[i] and > bounds[i - 1]), with sum and count"""
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        position = 0
+        while value > self.bounds[position]:
+            position += 1
+        self.counts[position] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        return {"buckets": {str(bound): count for bound, count in zip(self.bounds, self.counts)},
+                "sum": self.sum, "count": self.count}
+
+    def cumulative(self):
+        """Yield (bound, number of values <= bound) as Prometheus histograms count"""
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            yield bound, total
+
+
+class TreeMetrics:
+    """
+    Opt-in metrics of a tree: operation counts and latency histograms, node visits per search,
+    rotations (single/double, or page splits/merges of BTree), how far re-balancing walks up after
+    insert/delete, and tree height against the AVL height bound.
+    Turned on by BinarySearchTree(metrics=True) or tree.enable_metrics(). Timed operations are wrapped
+    on that tree object only, so a tree without metrics runs the plain methods; the few counters inside
+    re-balancing code cost one None check when metrics are off
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        # Event counters (i.e. rotations_single, search_hits)
+        self.counters = {}
+        # Latency histogram per operation
+        self.latency = {}
+        self.search_visits = Histogram(VISIT_BUCKETS)
+
+    def count(self, name, amount=1):
+        """Add amount to an event counter"""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timed(self, operation, method):
+        """Return method wrapped to record each call of operation and its latency"""
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.observe(operation, time.perf_counter() - start)
+            return result
+        return wrapper
+
+    def observe(self, operation, seconds):
+        """Record one call of an operation and its latency"""
+        histogram = self.latency.get(operation)
+        if histogram is None:
+            histogram = self.latency[operation] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def observe_search(self, visits, seconds, found):
+        """Record one search: number of nodes (pages for BTree) visited, latency and whether ID was found"""
+        self.search_visits.observe(visits)
+        self.observe("search", seconds)
+        self.count("search_hits" if found else "search_misses")
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        self.counters.clear()
+        self.latency.clear()
+        self.search_visits = Histogram(VISIT_BUCKETS)
+
+    def height(self):
+        """Return (height of tree, AVL bound of height for its size). BTree height counts pages"""
+        tree = self.tree
+        size = tree.get_size(tree.root)
+        # Worst AVL tree of n nodes is a Fibonacci tree: height < 1.4405 log2(n + 2) - 0.3277
+        bound = 1.4405 * math.log2(size + 2) - 0.3277
+        if tree.root is None:
+            return 0, bound
+        if tree.engine == "avl":
+            return tree.get_height(tree.root), bound
+        if tree.engine == "btree":
+            height, page = 1, tree.root
+            while not page.leaf:
+                height, page = height + 1, page.children[0]
+            return height, bound
+        # Red-black tree does not keep heights, count levels
+        height, level = 0, [tree.root]
+        while level:
+            height += 1
+            level = [child for node in level for child in (node.left, node.right) if child]
+        return height, bound
+
+    def as_dict(self):
+        """Return all metrics as a dictionary (json friendly)"""
+        height, bound = self.height()
+        return {
+            "engine": self.tree.engine,
+            "size": self.tree.get_size(self.tree.root),
+            "height": height,
+            "height_bound": bound,
+            "operations": {operation: histogram.count for operation, histogram in self.latency.items()},
+            "counters": dict(self.counters),
+            "latency_seconds": {operation: histogram.as_dict() for operation, histogram in self.latency.items()},
+            "search_visits": self.search_visits.as_dict(),
+        }
+
+    def prometheus(self, prefix="employee_tree"):
+        """Return all metrics in Prometheus text exposition format"""
+        height, bound = self.height()
+        lines = [
+            f"# HELP {prefix}_size Number of employees in tree.",
+            f"# TYPE {prefix}_size gauge",
+            f"{prefix}_size {self.tree.get_size(self.tree.root)}",
+            f"# HELP {prefix}_height Height of tree.",
+            f"# TYPE {prefix}_height gauge",
+            f'{prefix}_height{{engine="{self.tree.engine}"}} {height}',
+            f"# HELP {prefix}_height_bound Largest possible AVL tree height for this size.",
+            f"# TYPE {prefix}_height_bound gauge",
+            f"{prefix}_height_bound {bound:.3f}",
+            f"# HELP {prefix}_events_total Counted tree events (rotations, re-balancing walks, search hits).",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+
+        lines += [f"# HELP {prefix}_operation_seconds Latency of tree operations.",
+                  f"# TYPE {prefix}_operation_seconds histogram"]
+        for operation, histogram in sorted(self.latency.items()):
+            for bound, total in histogram.cumulative():
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f'{prefix}_operation_seconds_bucket{{operation="{operation}",le="{le}"}} {total}')
+            lines.append(f'{prefix}_operation_seconds_sum{{operation="{operation}"}} {histogram.sum}')
+            lines.append(f'{prefix}_operation_seconds_count{{operation="{operation}"}} {histogram.count}')
+
+        lines += [f"# HELP {prefix}_search_visits Nodes visited per search.",
+                  f"# TYPE {prefix}_search_visits histogram"]
+        for bound, total in self.search_visits.cumulative():
+            le = "+Inf" if bound == math.inf else str(bound)
+            lines.append(f'{prefix}_search_visits_bucket{{le="{le}"}} {total}')
+        lines.append(f"{prefix}_search_visits_sum {self.search_visits.sum}")
+        lines.append(f"{prefix}_search_visits_count {self.search_visits.count}")
+        return "\n".join(lines) + "\n"